@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import logging
+import threading
+from types import SimpleNamespace
+
+# Runs entirely locally against a stand-in model; no provider calls are made
+os.environ["AGRIVANNA_BACKEND"] = "fake"
+
+# Add parent directory to path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generation_gateway import GenerationGateway, TokenBucket
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class SlowModel:
+    """Answers with the prompt after a fixed delay and records the order of calls."""
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, content):
+        with self._lock:
+            self.calls.append(content)
+        time.sleep(self.latency)
+        return SimpleNamespace(text=f"answer to {content}")
+
+class GatewayTester:
+    def run_concurrently(self, fns) -> list:
+        """Call each function on its own thread and return their results in order."""
+        results = [None] * len(fns)
+
+        def run(i, fn):
+            try:
+                results[i] = fn()
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=run, args=(i, fn)) for i, fn in enumerate(fns)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.01)  # Keep the submission order stable
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalescing(self):
+        """Identical prompts in flight at the same time share one provider call."""
+        logger.info("\n📌 Testing coalescing of identical prompts...")
+        model = SlowModel()
+        gateway = GenerationGateway(model, max_concurrency=2)
+        try:
+            results = self.run_concurrently([lambda: gateway.generate("same prompt").text] * 5)
+            metrics = gateway.metrics()
+        finally:
+            gateway.close()
+        if len(model.calls) != 1 or metrics["coalesced"] != 4:
+            logger.error(f"❌ {len(model.calls)} provider calls, {metrics['coalesced']} coalesced")
+            return False
+        if any(result != "answer to same prompt" for result in results):
+            logger.error(f"❌ Callers got different answers: {results}")
+            return False
+        logger.info("✅ 5 callers, 1 provider call")
+        return True
+
+    def test_token_bucket(self):
+        """A bucket allows a minute's worth at once, then refills at the per-minute rate."""
+        logger.info("\n📌 Testing token bucket refill...")
+        bucket = TokenBucket(per_minute=60)
+        if bucket.wait_time(60) != 0.0:
+            logger.error("❌ A full bucket made the caller wait")
+            return False
+        bucket.consume(60)
+        wait = bucket.wait_time(1)
+        if not 0.9 <= wait <= 1.0:
+            logger.error(f"❌ Expected about 1s for one token at 60/min, got {wait:.3f}s")
+            return False
+        if bucket.wait_time(1000) > 60.0:
+            logger.error("❌ A request larger than the bucket waits longer than a full refill")
+            return False
+        logger.info(f"✅ Empty bucket: {wait:.2f}s until the next token")
+        return True
+
+    def test_rate_limit(self):
+        """Requests beyond the per-minute limit wait for the bucket instead of being sent."""
+        logger.info("\n📌 Testing the request rate limit...")
+        model = SlowModel(latency=0.0)
+        gateway = GenerationGateway(model, requests_per_minute=120, max_concurrency=4)
+        try:
+            gateway.request_bucket.consume(120)  # Start from an empty bucket: one request per 0.5s
+            start = time.monotonic()
+            for i in range(3):
+                gateway.generate(f"prompt {i}")
+            elapsed = time.monotonic() - start
+            metrics = gateway.metrics()
+        finally:
+            gateway.close()
+        if elapsed < 1.2 or metrics["throttled_sec"] <= 0.0:
+            logger.error(f"❌ 3 requests at 120/min took {elapsed:.2f}s, throttled {metrics['throttled_sec']:.2f}s")
+            return False
+        logger.info(f"✅ 3 requests at 120/min took {elapsed:.2f}s")
+        return True
+
+    def test_round_robin(self):
+        """A busy session cannot starve another one queued behind it."""
+        logger.info("\n📌 Testing round-robin across sessions...")
+        model = SlowModel(latency=0.05)
+        gateway = GenerationGateway(model, max_concurrency=1)
+        try:
+            fns = [lambda i=i: gateway.generate(f"busy {i}", session_id="busy") for i in range(4)]
+            fns.append(lambda: gateway.generate("quiet 0", session_id="quiet"))
+            self.run_concurrently(fns)
+        finally:
+            gateway.close()
+        position = model.calls.index("quiet 0")
+        if position == len(model.calls) - 1:
+            logger.error(f"❌ The quiet session was served at position {position}: {model.calls}")
+            return False
+        logger.info(f"✅ Quiet session served at position {position} of {len(model.calls)}")
+        return True
+
+    def test_queue_timeout(self):
+        """A request still queued when its timeout passes is withdrawn and never sent."""
+        logger.info("\n📌 Testing timeouts while queued...")
+        model = SlowModel(latency=0.5)
+        gateway = GenerationGateway(model, max_concurrency=1)
+        try:
+            results = self.run_concurrently([
+                lambda: gateway.generate("blocker", timeout=2.0).text,
+                lambda: gateway.generate("late", session_id="other", timeout=0.1).text,
+            ])
+            metrics = gateway.metrics()
+        finally:
+            gateway.close()
+        if not isinstance(results[1], TimeoutError) or results[0] != "answer to blocker":
+            logger.error(f"❌ Unexpected results: {results}")
+            return False
+        if "late" in model.calls or metrics["expired"] != 1 or metrics["in_flight"] != 0:
+            logger.error(f"❌ Expired request was sent or left behind: {model.calls}, {metrics}")
+            return False
+        logger.info("✅ Queued request timed out and was withdrawn")
+        return True
+
+def main():
+    """Run the generation gateway tests."""
+    logger.info("🚀 Starting Generation Gateway Test\n")
+
+    tester = GatewayTester()
+    tests = [
+        ("Coalescing", tester.test_coalescing),
+        ("Token bucket", tester.test_token_bucket),
+        ("Rate limit", tester.test_rate_limit),
+        ("Round-robin", tester.test_round_robin),
+        ("Queue timeout", tester.test_queue_timeout),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            success = test_func()
+            results.append((test_name, success))
+        except Exception as e:
+            logger.error(f"Test '{test_name}' failed with error: {e}")
+            results.append((test_name, False))
+
+    # Print summary
+    logger.info("\n📊 Test Summary:")
+    all_passed = True
+    for test_name, success in results:
+        status = "✅ PASSED" if success else "❌ FAILED"
+        logger.info(f"{status} - {test_name}")
+        if not success:
+            all_passed = False
+
+    if all_passed:
+        logger.info("\n🎉 All tests passed! The generation gateway is working correctly.")
+    else:
+        logger.error("\n⚠️ Some tests failed. Please check the logs above for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
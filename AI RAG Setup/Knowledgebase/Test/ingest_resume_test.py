@@ -0,0 +1,154 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+
+# Runs entirely locally: fake embedder, local index, scratch docstore and journal
+WORK_DIR = tempfile.mkdtemp(prefix="ingest_resume_")
+os.environ["AGRIVANNA_BACKEND"] = "fake"
+os.environ["INDEX_ALIAS_PATH"] = os.path.join(WORK_DIR, "index_alias.json")
+os.environ["INGEST_CHECKPOINT_SECONDS"] = "0"  # Checkpoint every batch, so a crash can land between them
+os.environ["FAKE_EMBED_LATENCY_MS"] = "0"
+
+# Add parent directory to path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_loader import DocumentProcessor
+from docstore import DocStore
+from local_index import LocalIndex
+from embedding_models import EMBEDDING_DIMENSION
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class SimulatedCrash(Exception):
+    pass
+
+class IngestResumeTester:
+    def __init__(self):
+        """Initialize the tester with a small PDF and a clean reference run."""
+        self.pdf_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "PDFs",
+                                     "2023-Producer-Policy-Handbook.pdf")
+        self.processor("clean").process_pdf(self.pdf_path)
+        self.reference = self.contents(self.processor("clean"))
+
+    def processor(self, name: str, **kwargs) -> DocumentProcessor:
+        """A processor over the index and docstore saved under `name`, as a fresh process would open them."""
+        path = os.path.join(WORK_DIR, name)
+        os.makedirs(path, exist_ok=True)
+        return DocumentProcessor(index=LocalIndex(EMBEDDING_DIMENSION, os.path.join(path, "index")),
+                                 docstore=DocStore(os.path.join(path, "docstore.db")), **kwargs)
+
+    @staticmethod
+    def contents(processor: DocumentProcessor) -> dict:
+        """Chunk id -> (text, page) in the docstore, checked against the ids in the index."""
+        records = {record["id"]: (record["text"], record.get("page"))
+                   for record in processor.docstore.iter_records("")}
+        ids = {vector_id for page in processor.index.list(namespace="") for vector_id in page}
+        if ids != set(records):
+            raise AssertionError(f"Index holds {len(ids)} ids, docstore {len(records)} chunks")
+        return records
+
+    @staticmethod
+    def crash_at(processor: DocumentProcessor, batch: int) -> None:
+        """Write half of the given batch, then fail, like a process dying mid-upsert."""
+        calls = {"count": 0}
+        process_chunks = processor.process_chunks
+
+        def flaky(chunks, *args, **kwargs):
+            calls["count"] += 1
+            if calls["count"] == batch:
+                half = len(chunks) // 2
+                process_chunks(chunks[:half], *args, **{**kwargs, "pages": kwargs["pages"][:half]})
+                raise SimulatedCrash(f"crash in batch {batch}")
+            return process_chunks(chunks, *args, **kwargs)
+        processor.process_chunks = flaky
+
+    def check(self, name: str, processor: DocumentProcessor) -> bool:
+        contents = self.contents(processor)
+        if contents != self.reference:
+            logger.error(f"❌ {name}: {len(contents)} chunks, expected {len(self.reference)}")
+            return False
+        logger.info(f"✅ {name}: {len(contents)} chunks, same as a clean run")
+        return True
+
+    def test_crash_resume(self):
+        """Crash mid-batch, then resume from the journal in a new processor."""
+        logger.info("\n📌 Testing crash and resume...")
+        processor = self.processor("resume")
+        self.crash_at(processor, 2)
+        try:
+            processor.process_pdf(self.pdf_path)
+        except SimulatedCrash:
+            pass
+        doc_id = os.path.splitext(os.path.basename(self.pdf_path))[0]
+        if len(processor.journal.state(doc_id)["batches"]) != 1:
+            logger.error("❌ The batch before the crash was not committed")
+            return False
+        # Drop everything held in memory; only what was saved survives
+        resumed = self.processor("resume")
+        resumed.process_pdf(self.pdf_path)
+        return self.check("Resume after crash", resumed)
+
+    def test_restart(self):
+        """Restart a finished document in the same processor."""
+        logger.info("\n📌 Testing restart in the same processor...")
+        processor = self.processor("restart")
+        processor.process_pdf(self.pdf_path)
+        processor.process_pdf(self.pdf_path, restart=True)
+        return self.check("Restart", processor)
+
+    def test_retry_without_resume(self):
+        """Retry a failed document in the same processor with resuming turned off."""
+        logger.info("\n📌 Testing retry of a failed batch...")
+        processor = self.processor("retry", resume=False)
+        self.crash_at(processor, 2)
+        try:
+            processor.process_pdf(self.pdf_path)
+        except SimulatedCrash:
+            pass
+        processor.process_pdf(self.pdf_path)
+        return self.check("Retry without resume", processor)
+
+def main():
+    """Run the ingestion resume tests."""
+    logger.info("🚀 Starting Ingestion Resume Test\n")
+
+    try:
+        tester = IngestResumeTester()
+        tests = [
+            ("Crash and resume", tester.test_crash_resume),
+            ("Restart", tester.test_restart),
+            ("Retry without resume", tester.test_retry_without_resume),
+        ]
+
+        results = []
+        for test_name, test_func in tests:
+            try:
+                success = test_func()
+                results.append((test_name, success))
+            except Exception as e:
+                logger.error(f"Test '{test_name}' failed with error: {e}")
+                results.append((test_name, False))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    # Print summary
+    logger.info("\n📊 Test Summary:")
+    all_passed = True
+    for test_name, success in results:
+        status = "✅ PASSED" if success else "❌ FAILED"
+        logger.info(f"{status} - {test_name}")
+        if not success:
+            all_passed = False
+
+    if all_passed:
+        logger.info("\n🎉 All tests passed! Interrupted ingestion recovers correctly.")
+    else:
+        logger.error("\n⚠️ Some tests failed. Please check the logs above for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,12 @@ from dotenv import load_dotenv
 from pinecone import Pinecone
 from sentence_transformers import SentenceTransformer
 import logging
+import sys
+
+# Add parent directory to path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docstore import DocStore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -46,12 +52,16 @@ def test_simple_query():
         results = index.query(
             vector=query_vector,
             top_k=1,
-            include_metadata=True
+            include_metadata=False
         )
         
         if results.matches:
             logger.info("Query test successful!")
-            logger.info(f"Sample result: {results.matches[0].metadata['text'][:100]}...")
+            record = DocStore().get_many([results.matches[0].id]).get(results.matches[0].id)
+            if record is None:
+                logger.warning("Top match has no docstore entry")
+                return False
+            logger.info(f"Sample result: {record['text'][:100]}...")
             return True
         else:
             logger.warning("Query returned no results")
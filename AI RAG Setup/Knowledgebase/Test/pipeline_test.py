@@ -51,7 +51,8 @@ class PipelineTester:
         processor = DocumentProcessor(
             chunk_size=500,    # 500 characters per chunk
             overlap=50,        # 50 character overlap
-            batch_size=32      # Process 32 chunks at a time
+            batch_size=32,     # Process 32 chunks at a time
+            live=True          # Write into the index the other tests query
         )
         success = True
         
@@ -114,7 +115,9 @@ class PipelineTester:
             symptoms = ["reduced milk production", "warm udder", "abnormal milk"]
             logger.info(f"Testing symptom analysis: {', '.join(symptoms)}")
             
-            analysis = ai.analyze_livestock(symptoms, "First lactation cow")
+            photo_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.abspath(__file__)))), "cow_image.jpg")
+            analysis = ai.analyze_livestock(symptoms, photo_path)
             if analysis and "Error" not in analysis:
                 logger.info("✅ Symptom analysis successful")
                 logger.info("Sample analysis:")
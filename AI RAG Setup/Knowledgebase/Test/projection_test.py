@@ -0,0 +1,166 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import numpy as np
+
+# Runs entirely locally: fake embedder, local indexes, scratch docstores and alias file
+WORK_DIR = tempfile.mkdtemp(prefix="projection_")
+os.environ["AGRIVANNA_BACKEND"] = "fake"
+os.environ["INDEX_ALIAS_PATH"] = os.path.join(WORK_DIR, "index_alias.json")
+os.environ["LOCAL_INDEX_DIR"] = os.path.join(WORK_DIR, "indexes")
+os.environ["DOCSTORE_PATH"] = os.path.join(WORK_DIR, "docstore.db")
+os.environ["WARM_CACHE_DIR"] = os.path.join(WORK_DIR, "warm_cache")
+os.environ["FAKE_EMBED_LATENCY_MS"] = "0"
+
+# Add parent directory to path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projection import Projection, benchmark, rescore, build_projected_index
+from index_versions import build_version, rollback
+from query_knowledge import KnowledgeBase, PINECONE_INDEX_NAME
+from local_index import Match
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+QUERIES = ["withdrawal period for milk", "lameness in dairy cows", "vaccination schedule for calves"]
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+class ProjectionTester:
+    def __init__(self):
+        """Initialize the tester with a corpus that, like text embeddings, varies along few directions."""
+        rng = np.random.default_rng(0)
+        basis = rng.standard_normal((48, 384))
+        self.vectors = normalized(rng.standard_normal((3000, 48)) @ basis
+                                  + 0.05 * rng.standard_normal((3000, 384))).astype(np.float32)
+        self.queries = normalized(rng.standard_normal((50, 48)) @ basis).astype(np.float32)
+
+    def test_fit(self):
+        """A fitted projection has the requested dimension, unit-length output and survives a save."""
+        logger.info("\n📌 Testing fit, transform and save...")
+        projection = Projection.fit(self.vectors, 64)
+        reduced = projection.transform(self.vectors)
+        if projection.dimension != 64 or reduced.shape != (len(self.vectors), 64):
+            logger.error(f"❌ Projected to {reduced.shape}, expected 64 dimensions")
+            return False
+        if not np.allclose(np.linalg.norm(reduced, axis=1), 1.0, atol=1e-4):
+            logger.error("❌ Projected vectors are not unit length")
+            return False
+        path = os.path.join(WORK_DIR, "projection.npz")
+        projection.save(path)
+        loaded = Projection.load(path)
+        if loaded.model != projection.model or not np.allclose(loaded.transform(self.queries),
+                                                               projection.transform(self.queries)):
+            logger.error("❌ The loaded projection differs from the saved one")
+            return False
+        logger.info("✅ 384 -> 64 dimensions, unit length, identical after a save")
+        return True
+
+    def test_recall(self):
+        """Rescoring a shortlist recovers the exact top-k that the projected ranking alone misses."""
+        logger.info("\n📌 Testing recall with and without rescoring...")
+        rows = benchmark(self.vectors, self.queries, [64], top_k=10)
+        full, projected = rows[0], rows[1]
+        if projected["recall_rescored"] < 0.95 or projected["recall_rescored"] < projected["recall"]:
+            logger.error(f"❌ Recall {projected['recall']}, rescored {projected['recall_rescored']}")
+            return False
+        if projected["index_mib"] >= full["index_mib"]:
+            logger.error("❌ The projected index is not smaller")
+            return False
+        logger.info(f"✅ Recall@10 {projected['recall']} projected, {projected['recall_rescored']} rescored; "
+                    f"{full['index_mib']} -> {projected['index_mib']} MiB")
+        return True
+
+    def test_rescore(self):
+        """Rescoring replaces projected scores with exact ones and re-ranks the shortlist."""
+        logger.info("\n📌 Testing rescoring...")
+        embeddings = {f"chunk{i}": self.vectors[i] for i in range(20)}
+        query = self.vectors[7] * 3.0  # Queries need not be normalized
+        matches = [Match(f"chunk{i}", 1.0 - i / 100) for i in range(20)]
+        matches.append(Match("missing", 0.5))
+        rescored = rescore(matches, query, embeddings, top_k=5)
+        if rescored[0].id != "chunk7" or abs(rescored[0].score - 1.0) > 1e-4:
+            logger.error(f"❌ Expected chunk7 with score 1.0 first, got {rescored[0].id} {rescored[0].score:.4f}")
+            return False
+        if any(a.score < b.score for a, b in zip(rescored, rescored[1:])) or len(rescored) != 5:
+            logger.error("❌ Rescored matches are not the best 5 in order")
+            return False
+        logger.info("✅ Exact scores, best first")
+        return True
+
+    def test_projected_version(self):
+        """A projected index version serves the same top results as full dimension, and rolls back."""
+        logger.info("\n📌 Testing a projected index version...")
+        pdf_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "PDFs",
+                                "2023-Producer-Policy-Handbook.pdf")
+        build_version([pdf_path], PINECONE_INDEX_NAME)
+        kb = KnowledgeBase()
+        expected = {query: kb.query(query, top_k=3) for query in QUERIES}
+
+        build_projected_index(PINECONE_INDEX_NAME, 256)
+        kb.query(QUERIES[0], top_k=1)  # Picks up the alias switch
+        if kb.projection is None or kb.projection.dimension != 256:
+            logger.error("❌ The knowledge base did not follow the alias to the projected version")
+            return False
+        for query in QUERIES:
+            actual = kb.query(query, top_k=3)
+            if actual[0].id != expected[query][0].id or abs(actual[0].score - expected[query][0].score) > 1e-4:
+                logger.error(f"❌ '{query}': {actual[0].id} {actual[0].score:.4f}, "
+                             f"expected {expected[query][0].id} {expected[query][0].score:.4f}")
+                return False
+        logger.info(f"✅ Same best match and exact score for {len(QUERIES)} queries at 256 dimensions")
+
+        rollback(PINECONE_INDEX_NAME)
+        kb.query(QUERIES[0], top_k=1)
+        if kb.projection is not None:
+            logger.error("❌ The projection was kept after rolling back to the full-dimension version")
+            return False
+        logger.info("✅ Rolled back to full dimension")
+        return True
+
+def main():
+    """Run the projection tests."""
+    logger.info("🚀 Starting Projection Test\n")
+
+    try:
+        tester = ProjectionTester()
+        tests = [
+            ("Fit and save", tester.test_fit),
+            ("Recall", tester.test_recall),
+            ("Rescoring", tester.test_rescore),
+            ("Projected version", tester.test_projected_version),
+        ]
+
+        results = []
+        for test_name, test_func in tests:
+            try:
+                success = test_func()
+                results.append((test_name, success))
+            except Exception as e:
+                logger.error(f"Test '{test_name}' failed with error: {e}")
+                results.append((test_name, False))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    # Print summary
+    logger.info("\n📊 Test Summary:")
+    all_passed = True
+    for test_name, success in results:
+        status = "✅ PASSED" if success else "❌ FAILED"
+        logger.info(f"{status} - {test_name}")
+        if not success:
+            all_passed = False
+
+    if all_passed:
+        logger.info("\n🎉 All tests passed! Projected search and rescoring are working correctly.")
+    else:
+        logger.error("\n⚠️ Some tests failed. Please check the logs above for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import logging
+from types import SimpleNamespace
+
+# Runs entirely locally: the dependencies wrap stand-in calls, never a real service
+os.environ["AGRIVANNA_BACKEND"] = "fake"
+
+# Add parent directory to path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import (CircuitBreaker, Dependency, CircuitOpenError, DeadlineExceeded,
+                        HEDGE_MIN_SAMPLES)
+from model_router import ModelRouter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class ScriptedGateway:
+    """Returns a fixed answer after a delay and records the timeout of each call."""
+
+    def __init__(self, text: str, latency: float):
+        self.text = text
+        self.latency = latency
+        self.timeouts = []
+
+    def generate(self, content, session_id: str = "default", timeout: float = None):
+        self.timeouts.append(timeout)
+        if timeout is not None and self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("scripted gateway timed out")
+        time.sleep(self.latency)
+        return SimpleNamespace(text=self.text)
+
+def fail():
+    raise ConnectionError("service unavailable")
+
+class ResilienceTester:
+    def check_state(self, name: str, breaker: CircuitBreaker, expected: str) -> bool:
+        if breaker.state != expected:
+            logger.error(f"❌ {name}: breaker is {breaker.state}, expected {expected}")
+            return False
+        logger.info(f"✅ {name}: {expected}")
+        return True
+
+    def test_breaker_opens(self):
+        """Consecutive service failures open the breaker, which then rejects calls."""
+        logger.info("\n📌 Testing the breaker opening...")
+        dependency = Dependency("test", deadline=1.0, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+        for _ in range(3):
+            try:
+                dependency.call(fail)
+            except ConnectionError:
+                pass
+        if not self.check_state("After 3 failures", dependency.breaker, "open"):
+            return False
+        try:
+            dependency.call(lambda: "ok")
+        except CircuitOpenError:
+            logger.info("✅ Open breaker rejected the call")
+            return dependency.breaker.counts["rejected"] == 1
+        logger.error("❌ Open breaker let a call through")
+        return False
+
+    def test_caller_errors(self):
+        """Bugs in the calling code do not count against the service."""
+        logger.info("\n📌 Testing caller errors...")
+        dependency = Dependency("test", deadline=1.0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        for _ in range(3):
+            try:
+                dependency.call(lambda: {}["missing"])
+            except KeyError:
+                pass
+        return self.check_state("After 3 caller errors", dependency.breaker, "closed") \
+            and dependency.metrics()["caller_errors"] == 3
+
+    def test_half_open(self):
+        """After the cool-down one trial is let through; it closes or reopens the breaker."""
+        logger.info("\n📌 Testing half-open trials...")
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        dependency = Dependency("test", deadline=1.0, breaker=breaker)
+        try:
+            dependency.call(fail)
+        except ConnectionError:
+            pass
+        time.sleep(0.15)
+        if not breaker.allow() or not self.check_state("After the cool-down", breaker, "half_open"):
+            return False
+        if breaker.allow():
+            logger.error("❌ A second call got through while the trial was running")
+            return False
+        breaker.record_failure()
+        if not self.check_state("Failed trial", breaker, "open"):
+            return False
+        time.sleep(0.15)
+        dependency.call(lambda: "ok")
+        return self.check_state("Successful trial", breaker, "closed")
+
+    def test_deadline(self):
+        """A call that runs past its deadline is abandoned and counted as a failure."""
+        logger.info("\n📌 Testing the call deadline...")
+        dependency = Dependency("test", deadline=0.1)
+        start = time.monotonic()
+        try:
+            dependency.call(lambda: time.sleep(0.5))
+        except DeadlineExceeded:
+            elapsed = time.monotonic() - start
+            if elapsed > 0.3 or dependency.breaker.failures != 1:
+                logger.error(f"❌ Abandoned after {elapsed:.2f}s with {dependency.breaker.failures} failures")
+                return False
+            logger.info(f"✅ Abandoned after {elapsed:.2f}s")
+            return True
+        logger.error("❌ The slow call was not abandoned")
+        return False
+
+    def test_hedge(self):
+        """Once there is latency history, a call slower than the p95 is hedged and the hedge wins."""
+        logger.info("\n📌 Testing hedged calls...")
+        dependency = Dependency("test", deadline=2.0, hedge=True)
+        if dependency.hedge_delay() is not None:
+            logger.error("❌ Hedging started without latency history")
+            return False
+        for _ in range(HEDGE_MIN_SAMPLES):
+            dependency.call(lambda: time.sleep(0.01))
+        calls = {"count": 0}
+
+        def slow_first():
+            calls["count"] += 1
+            time.sleep(1.0 if calls["count"] == 1 else 0.01)
+            return calls["count"]
+
+        start = time.monotonic()
+        result = dependency.call(slow_first)
+        elapsed = time.monotonic() - start
+        metrics = dependency.metrics()
+        if result != 2 or metrics["hedges_sent"] != 1 or metrics["hedges_won"] != 1 or elapsed > 0.5:
+            logger.error(f"❌ Result {result} after {elapsed:.2f}s, metrics {metrics}")
+            return False
+        logger.info(f"✅ Hedge answered after {elapsed:.2f}s (delay {metrics['hedge_delay_sec']}s)")
+        return True
+
+    def test_shared_deadline(self):
+        """An escalated generation gets what is left of the request's budget, not a fresh one."""
+        logger.info("\n📌 Testing the per-request generation deadline...")
+        fast, strong = ScriptedGateway("I'm not sure.", latency=0.3), ScriptedGateway("strong answer", latency=1.0)
+        router = ModelRouter(fast, strong)
+        start = time.monotonic()
+        answer = router.generate("prompt", top_score=0.95, timeout=1.0)
+        elapsed = time.monotonic() - start
+        if strong.timeouts[0] is None or strong.timeouts[0] > 0.75:
+            logger.error(f"❌ Escalation got {strong.timeouts[0]}s after 0.3s of a 1s budget")
+            return False
+        if answer != "I'm not sure." or elapsed > 1.2:
+            logger.error(f"❌ Expected the fast answer within the budget, got {answer!r} after {elapsed:.2f}s")
+            return False
+        logger.info(f"✅ Escalation got {strong.timeouts[0]:.2f}s; fast answer kept after {elapsed:.2f}s")
+        return True
+
+def main():
+    """Run the resilience tests."""
+    logger.info("🚀 Starting Resilience Test\n")
+
+    tester = ResilienceTester()
+    tests = [
+        ("Breaker opens", tester.test_breaker_opens),
+        ("Caller errors", tester.test_caller_errors),
+        ("Half-open trials", tester.test_half_open),
+        ("Deadline", tester.test_deadline),
+        ("Hedge", tester.test_hedge),
+        ("Shared generation deadline", tester.test_shared_deadline),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            success = test_func()
+            results.append((test_name, success))
+        except Exception as e:
+            logger.error(f"Test '{test_name}' failed with error: {e}")
+            results.append((test_name, False))
+
+    # Print summary
+    logger.info("\n📊 Test Summary:")
+    all_passed = True
+    for test_name, success in results:
+        status = "✅ PASSED" if success else "❌ FAILED"
+        logger.info(f"{status} - {test_name}")
+        if not success:
+            all_passed = False
+
+    if all_passed:
+        logger.info("\n🎉 All tests passed! Deadlines, hedging and circuit breakers are working correctly.")
+    else:
+        logger.error("\n⚠️ Some tests failed. Please check the logs above for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import numpy as np
+
+# Runs entirely locally: shard worker processes over a scratch directory
+WORK_DIR = tempfile.mkdtemp(prefix="sharded_index_")
+os.environ["AGRIVANNA_BACKEND"] = "fake"
+
+# Add parent directory to path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharded_index import ShardedIndex, document_of, REBALANCE_TOLERANCE
+from local_index import LocalIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DIMENSION = 32
+DOCUMENTS = 12
+CHUNKS_PER_DOCUMENT = 20
+
+class ShardedIndexTester:
+    def __init__(self):
+        """Initialize the tester with random chunk vectors spread over a few documents."""
+        rng = np.random.default_rng(0)
+        self.vectors = [(f"doc{d}_chunk_{c}", rng.standard_normal(DIMENSION).astype(np.float32),
+                         {"doc_id": f"doc{d}", "section": "health" if c % 2 else "policy"})
+                        for d in range(DOCUMENTS) for c in range(CHUNKS_PER_DOCUMENT)]
+        self.queries = rng.standard_normal((20, DIMENSION)).astype(np.float32)
+        self.reference = LocalIndex(DIMENSION)
+        self.reference.upsert(self.vectors)
+
+    def compare(self, name: str, index, filter: dict = None) -> bool:
+        """Whether `index` returns the same top 10 as the single reference index."""
+        for query in self.queries:
+            expected = self.reference.query(vector=query, top_k=10, filter=filter)
+            actual = index.query(vector=query, top_k=10, filter=filter)
+            if [m.id for m in actual.matches] != [m.id for m in expected.matches] or \
+                    not np.allclose([m.score for m in actual.matches], [m.score for m in expected.matches]):
+                logger.error(f"❌ {name}: {[m.id for m in actual.matches]} != {[m.id for m in expected.matches]}")
+                return False
+        logger.info(f"✅ {name}: same top 10 as one index for {len(self.queries)} queries")
+        return True
+
+    @staticmethod
+    def shards_of_documents(index: ShardedIndex) -> dict:
+        """Document -> set of shards holding any of its vectors."""
+        shards = {}
+        for shard, documents in enumerate(index._broadcast("documents")):
+            for (_, doc_id) in documents:
+                shards.setdefault(doc_id, set()).add(shard)
+        return shards
+
+    def test_scatter_gather(self):
+        """Merged per-shard top-k results match a single index, with and without a filter."""
+        logger.info("\n📌 Testing scatter-gather queries...")
+        index = ShardedIndex(DIMENSION, os.path.join(WORK_DIR, "query"), shards=3)
+        try:
+            index.upsert(self.vectors)
+            return self.compare("Unfiltered", index) and \
+                self.compare("Filtered", index, filter={"section": {"$eq": "health"}})
+        finally:
+            index.close()
+
+    def test_documents_stay_whole(self):
+        """Every chunk of a document lands on the same shard, and new documents spread out."""
+        logger.info("\n📌 Testing document placement...")
+        index = ShardedIndex(DIMENSION, os.path.join(WORK_DIR, "placement"), shards=3)
+        try:
+            index.upsert(self.vectors)
+            split = {doc: shards for doc, shards in self.shards_of_documents(index).items() if len(shards) > 1}
+            if split or document_of("doc3_chunk_7", None) != "doc3":
+                logger.error(f"❌ Documents split across shards: {split}")
+                return False
+            if max(index.counts) - min(index.counts) > CHUNKS_PER_DOCUMENT:
+                logger.error(f"❌ One batch of new documents was not spread over the shards: {index.counts}")
+                return False
+            logger.info(f"✅ {DOCUMENTS} documents, each on one shard; counts {index.counts}")
+            return True
+        finally:
+            index.close()
+
+    def test_rebalance(self):
+        """After growing the shard count, rebalancing evens out the shards without changing results."""
+        logger.info("\n📌 Testing rebalance after adding shards...")
+        path = os.path.join(WORK_DIR, "rebalance")
+        index = ShardedIndex(DIMENSION, path, shards=2)
+        index.upsert(self.vectors)
+        index.save()
+        index.close()
+
+        index = ShardedIndex(DIMENSION, path, shards=4)
+        try:
+            if index.counts[2] or index.counts[3]:
+                logger.error(f"❌ New shards were not empty: {index.counts}")
+                return False
+            moves = index.rebalance()
+            average = sum(index.counts) / index.shards
+            if not moves or max(index.counts) > average * (1 + REBALANCE_TOLERANCE):
+                logger.error(f"❌ Still unbalanced after {len(moves)} moves: {index.counts}")
+                return False
+            split = {doc: shards for doc, shards in self.shards_of_documents(index).items() if len(shards) > 1}
+            if split or sum(index.counts) != len(self.vectors):
+                logger.error(f"❌ Rebalance split or lost documents: {split}, {index.counts}")
+                return False
+            logger.info(f"✅ {len(moves)} documents moved; counts {index.counts}")
+            if not self.compare("After rebalance", index):
+                return False
+            index.save()
+        finally:
+            index.close()
+
+        reopened = ShardedIndex(DIMENSION, path, shards=4)
+        try:
+            if reopened.placement != index.placement:
+                logger.error("❌ Placement was not saved")
+                return False
+            return self.compare("Reopened", reopened)
+        finally:
+            reopened.close()
+
+def main():
+    """Run the sharded index tests."""
+    logger.info("🚀 Starting Sharded Index Test\n")
+
+    try:
+        tester = ShardedIndexTester()
+        tests = [
+            ("Scatter-gather", tester.test_scatter_gather),
+            ("Documents stay whole", tester.test_documents_stay_whole),
+            ("Rebalance", tester.test_rebalance),
+        ]
+
+        results = []
+        for test_name, test_func in tests:
+            try:
+                success = test_func()
+                results.append((test_name, success))
+            except Exception as e:
+                logger.error(f"Test '{test_name}' failed with error: {e}")
+                results.append((test_name, False))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    # Print summary
+    logger.info("\n📊 Test Summary:")
+    all_passed = True
+    for test_name, success in results:
+        status = "✅ PASSED" if success else "❌ FAILED"
+        logger.info(f"{status} - {test_name}")
+        if not success:
+            all_passed = False
+
+    if all_passed:
+        logger.info("\n🎉 All tests passed! The sharded index is working correctly.")
+    else:
+        logger.error("\n⚠️ Some tests failed. Please check the logs above for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
 import os
+import time
 from dotenv import load_dotenv
 import google.generativeai as genai
 from query_knowledge import KnowledgeBase
+from generation_gateway import get_gateway
+from backends import create_generative_model
+from extractive_answers import format_passages, is_factual_lookup, load_threshold, fast_path_stats
+from model_router import ModelRouter, GEMINI_FAST_MODEL, GEMINI_STRONG_MODEL
+from profiling import profile_run, profile_stage
+from prompt_cache import CachedPrompt, get_context_cache
+from resilience import get_dependency
 import logging
 
 # Configure logging
@@ -13,77 +21,307 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 genai.configure(api_key=GEMINI_API_KEY)
 
+# Symptom analysis only draws on veterinary material, not policy documents
+ANALYSIS_FILTER = {"source_type": {"$eq": "veterinary_guide"}}
+# Headings a complete analysis must contain; otherwise the fast model's answer is escalated
+ANALYSIS_SECTIONS = ["Diagnos", "Recommended Actions", "Prevention", "Veterinarian"]
+# Minimum image similarity for a reference condition to be mentioned
+IMAGE_MATCH_THRESHOLD = float(os.getenv('IMAGE_MATCH_THRESHOLD', '0.8'))
+
+# Prompts open with everything that repeats across requests (role, instructions, shared context),
+# so it forms one prefix that can be cached; only the request's own details follow
+ANALYSIS_ROLE = """You are an expert livestock consultant specializing in dairy cattle health. 
+Analyze the following symptoms and provide a detailed assessment based on verified information."""
+
+ANALYSIS_INSTRUCTIONS = """Please provide:
+1. Possible Diagnoses (with confidence levels)
+2. Recommended Actions
+3. Prevention Measures
+4. When to Contact a Veterinarian
+
+Base your analysis strictly on the provided context and verified veterinary knowledge."""
+
+FOLLOWUP_ROLE = """You are an expert livestock consultant. Answer the follow-up question based on 
+the previous analysis and verified information."""
+
+FOLLOWUP_INSTRUCTIONS = """+ Focus on all problems that are mentioned in the content
++ Never talk about any other topic other than any livestock problem
++ Strictly avoid any irrelevant information
++ Don't give any information back if its not domain specific
++ Output should be to try again if the content is not related to livestock problem
+
+Provide a clear, detailed answer based on the context and veterinary knowledge."""
+
+# Prepended to retrieved guidance when generation is failing or its circuit is open
+DEGRADED_NOTICE = ("The analysis service is not responding right now. Below is the most relevant guidance "
+                   "from the knowledge base; contact a veterinarian if the animal's condition is serious.")
+
+def analysis_query(symptoms: list) -> str:
+    """Retrieval query used for a symptom analysis."""
+    return f"livestock symptoms: {', '.join(symptoms)}"
+
+def symptom_key(symptoms: list) -> str:
+    """Canonical key for a symptom set, ignoring case, order and repeats."""
+    return "|".join(sorted({s.strip().lower() for s in symptoms if s.strip()}))
+
 class AgrivannaAI:
-    def __init__(self):
-        """Initialize the AI assistant with RAG capabilities."""
-        self.knowledge_base = KnowledgeBase()
-        self.model = genai.GenerativeModel("gemini-1.5-pro")
+    def __init__(self, session_id: str = "default", knowledge_base: KnowledgeBase = None,
+                 router: ModelRouter = None, warm_cache=None):
+        """Initialize the AI assistant with RAG capabilities.
+        
+        Args:
+            session_id (str): Identifies this conversation for fair request queueing
+            knowledge_base (KnowledgeBase): Shared knowledge base (default: a new one)
+            router (ModelRouter): Shared model router (default: a new one)
+            warm_cache (WarmCache): Precomputed results for common symptom sets, if loaded
+        """
+        self.session_id = session_id
+        self.knowledge_base = knowledge_base or KnowledgeBase()
+        self.model = create_generative_model(GEMINI_STRONG_MODEL)
+        self.fast_model = create_generative_model(GEMINI_FAST_MODEL)
+        # Shared per-model gateways give rate limiting and request coalescing
+        self.router = router or ModelRouter(get_gateway(self.fast_model), get_gateway(self.model))
+        # Deadline and circuit breaker shared by every conversation in the process
+        self.generation = get_dependency("generation")
+        self.warm_cache = warm_cache
         self.previous_analysis = None
+        self.followup_count = 0
+        self.extractive_threshold = load_threshold()
         self.context_window = 5  # Store last 5 interactions
+        self.image_pipeline = None  # Loaded on the first photo
+
+    def get_image_pipeline(self):
+        """Return the shared image pipeline, creating it on first use."""
+        if self.image_pipeline is None:
+            from image_pipeline import get_image_pipeline
+            self.image_pipeline = get_image_pipeline()
+        return self.image_pipeline
 
-    def get_context(self, query: str, top_k: int = 3) -> str:
+    def get_context(self, query: str, top_k: int = 3, filter: dict = None, namespaces: list = None) -> str:
         """Retrieve relevant context from the knowledge base.
         
         Args:
             query (str): The query to search for
             top_k (int): Number of results to retrieve
+            filter (dict): Metadata filter applied by the index
+            namespaces (list): Namespaces to search
             
         Returns:
             str: Combined context from relevant documents
         """
         try:
-            results = self.knowledge_base.query(query, top_k=top_k)
-            if not results:
-                logger.warning("No relevant context found")
-                return "No relevant information found in knowledge base."
-            
-            context = "\n\n".join([
-                f"Source {i+1}:\n{match.metadata['text']}"
-                for i, match in enumerate(results)
-            ])
-            return context
+            return self.format_context(self.retrieve(query, top_k=top_k, filter=filter, namespaces=namespaces))
         except Exception as e:
             logger.error(f"Error getting context: {e}")
             return "Error retrieving context from knowledge base."
 
-    def analyze_livestock(self, symptoms: list) -> str:
+    def retrieve(self, query: str, top_k: int = 3, filter: dict = None, namespaces: list = None) -> list:
+        """Retrieve matches from the knowledge base, relaxing the filter if nothing matches.
+        
+        Args:
+            query (str): The query to search for
+            top_k (int): Number of results to retrieve
+            filter (dict): Metadata filter applied by the index
+            namespaces (list): Namespaces to search
+            
+        Returns:
+            list: Matches sorted by score
+        """
+        results = self.knowledge_base.query(query, top_k=top_k, filter=filter, namespaces=namespaces)
+        if not results and filter:
+            # Chunks ingested before tagging carry no filter fields
+            logger.warning("No tagged context matched the filter, retrying unfiltered")
+            results = self.knowledge_base.query(query, top_k=top_k, namespaces=namespaces)
+        return results
+
+    def retrieve_context(self, query: str, filter: dict = None, results: list = None) -> tuple:
+        """Retrieve context and the best match score (None if retrieval failed).
+        
+        Args:
+            query (str): The query to search for
+            filter (dict): Metadata filter applied by the index
+            results (list): Matches already retrieved for the query, if any
+            
+        Returns:
+            tuple: (context string, top score)
+        """
+        if results is None:
+            try:
+                results = self.retrieve(query, filter=filter)
+            except Exception as e:
+                logger.error(f"Error getting context: {e}")
+                return "Error retrieving context from knowledge base.", None
+        return self.format_context(results), (results[0].score if results else 0.0)
+
+    def get_contexts(self, queries: list, top_k: int = 3, filter: dict = None) -> list:
+        """Retrieve context for many queries with one batched retrieval step.
+        
+        Args:
+            queries (list): Queries to search for
+            top_k (int): Number of results per query
+            filter (dict): Metadata filter applied by the index
+            
+        Returns:
+            list: Context string per query, in input order
+        """
+        batches = self.knowledge_base.query_batch(queries, top_k=top_k, filter=filter)
+        contexts = []
+        for query, results in zip(queries, batches):
+            if not results and filter:
+                results = self.knowledge_base.query(query, top_k=top_k)
+            contexts.append(self.format_context(results))
+        return contexts
+
+    @staticmethod
+    def format_context(results: list) -> str:
+        """Join retrieved matches into a numbered context block."""
+        if not results:
+            logger.warning("No relevant context found")
+            return "No relevant information found in knowledge base."
+        
+        return "\n\n".join([
+            f"Source {i+1}:\n{match.metadata['text']}"
+            for i, match in enumerate(results)
+        ])
+
+    def analyze_livestock(self, symptoms: list, photo_path: str = None) -> str:
         """Generate livestock analysis using RAG and Gemini.
         
         Args:
             symptoms (list): List of observed symptoms
+            photo_path (str): Optional photo of the animal
             
         Returns:
             str: AI-generated analysis
         """
-        # Get relevant context from knowledge base
-        query = f"livestock symptoms: {', '.join(symptoms)}"
-        context = self.get_context(query)
+        image_part = None
+        visual_findings = "No photo provided."
+        if photo_path:
+            try:
+                with profile_stage("image"):
+                    prepared = self.get_image_pipeline().prepare(photo_path)
+                image_part = {"mime_type": "image/jpeg", "data": prepared["jpeg"]}
+                matches = [
+                    label for label, score in self.image_pipeline.similar(prepared["embedding"])
+                    if score >= IMAGE_MATCH_THRESHOLD
+                ]
+                visual_findings = (f"Photo resembles reference cases of: {', '.join(matches)}"
+                                   if matches else "Photo attached; no close reference match.")
+            except Exception as e:
+                logger.error(f"Error processing photo {photo_path}: {e}")
+
+        # Common presentations without a photo were answered ahead of time
+        cached = self.warm_cache.lookup(symptoms) if self.warm_cache and image_part is None else None
+        if cached and "analysis" in cached:
+            self.previous_analysis = cached["analysis"]
+            self.followup_count = 0
+            return cached["analysis"]
 
-        prompt = f"""You are an expert livestock consultant specializing in dairy cattle health. 
-        Analyze the following symptoms and provide a detailed assessment based on verified information.
+        # Get relevant context from knowledge base
+        if cached:
+            context, top_score = cached["context"], cached["top_score"]
+        else:
+            query = analysis_query(symptoms)
+            if image_part is not None and "resembles" in visual_findings:
+                query += f"; {visual_findings}"
+            with profile_stage("retrieve"):
+                context, top_score = self.retrieve_context(query, filter=ANALYSIS_FILTER)
 
-        Symptoms Observed:
-        {', '.join(symptoms)}
+        try:
+            with profile_stage("generate"):
+                analysis = self.generation.call(
+                    lambda: self.generate_analysis(symptoms, context, visual_findings, image_part, top_score,
+                                                   timeout=self.generation.deadline)
+                )
+            self.previous_analysis = analysis
+            self.followup_count = 0
+            return analysis
+        except Exception as e:
+            logger.error(f"Error generating analysis: {e}")
+            return self.degraded_answer(context, top_score) or "Error in generating analysis. Please try again."
 
-        Relevant Knowledge Base Context:
-        {context}
+    def degraded_answer(self, context: str, top_score: float) -> str:
+        """Retrieved guidance without generation, for when the generation model is unavailable.
+        
+        Args:
+            context (str): Context retrieved for the request
+            top_score (float): Best retrieval score (None if retrieval failed)
+            
+        Returns:
+            str: The guidance with a notice, or "" if retrieval found nothing either
+        """
+        if not top_score:
+            return ""
+        self.generation.record_fallback()
+        return f"{DEGRADED_NOTICE}\n\n{context}"
 
-        Please provide:
-        1. Possible Diagnoses (with confidence levels)
-        2. Recommended Actions
-        3. Prevention Measures
-        4. When to Contact a Veterinarian
+    def build_analysis_prompt(self, symptoms: list, context: str, visual_findings: str = "No photo provided.",
+                              image_part: dict = None) -> CachedPrompt:
+        """Build the symptom analysis prompt.
+        
+        Args:
+            symptoms (list): List of observed symptoms
+            context (str): Retrieved knowledge base context
+            visual_findings (str): Summary of the photo, if any
+            image_part (dict): Inline image to send with the prompt
+            
+        Returns:
+            CachedPrompt: Role, instructions and context (shared by every case with these
+                symptoms) as the prefix; the case itself as the suffix
+        """
+        prefix = [ANALYSIS_ROLE, ANALYSIS_INSTRUCTIONS, f"Relevant Knowledge Base Context:\n{context}"]
+        suffix = [
+            f"Symptoms Observed:\n{', '.join(symptoms)}",
+            f"Visual Findings:\n{visual_findings}",
+        ]
+        return CachedPrompt(prefix, suffix + ([image_part] if image_part else []))
 
-        Base your analysis strictly on the provided context and verified veterinary knowledge.
+    def build_followup_prompt(self, question: str, context: str) -> CachedPrompt:
+        """Build a follow-up prompt.
+        
+        The role, instructions and previous analysis stay the same for every
+        follow-up in a conversation, so they form the prefix; the question
+        and its context follow.
+        
+        Args:
+            question (str): Follow-up question
+            context (str): Context retrieved for this question
+            
+        Returns:
+            CachedPrompt: Prompt for the generation model
         """
+        previous = self.previous_analysis if self.previous_analysis else 'No previous analysis available.'
+        return CachedPrompt(
+            [FOLLOWUP_ROLE, FOLLOWUP_INSTRUCTIONS, f"Previous Analysis:\n{previous}"],
+            [f"Follow-up Question:\n{question}", f"Relevant Knowledge Base Context:\n{context}"]
+        )
 
-        try:
-            response = self.model.generate_content(prompt)
-            self.previous_analysis = response.text
-            return response.text
-        except Exception as e:
-            logger.error(f"Error generating analysis: {e}")
-            return "Error in generating analysis. Please try again."
+    def generate_analysis(self, symptoms: list, context: str, visual_findings: str = "No photo provided.",
+                          image_part: dict = None, top_score: float = None, timeout: float = None) -> str:
+        """Generate an analysis from already retrieved context.
+        
+        Unlike `analyze_livestock` this keeps no conversation state and lets
+        generation errors propagate, so it is safe to call from batch jobs.
+        
+        Args:
+            symptoms (list): List of observed symptoms
+            context (str): Retrieved knowledge base context
+            visual_findings (str): Summary of the photo, if any
+            image_part (dict): Inline image to send with the prompt
+            top_score (float): Best retrieval score, used for model routing
+            timeout (float): Seconds the whole generation may take, escalation included (default: no limit)
+            
+        Returns:
+            str: AI-generated analysis
+        """
+        return self.router.generate(
+            self.build_analysis_prompt(symptoms, context, visual_findings, image_part),
+            top_score=top_score,
+            symptom_count=len(symptoms),
+            session_id=self.session_id,
+            required_sections=ANALYSIS_SECTIONS,
+            timeout=timeout
+        )
 
     def ask_followup(self, question: str) -> str:
         """Handle follow-up questions about previous analysis.
@@ -92,38 +330,45 @@ class AgrivannaAI:
             question (str): Follow-up question
             
         Returns:
-            str: AI-generated response
+            str: AI-generated response, or quoted passages when retrieval is confident
         """
-        # Get relevant context
-        context = self.get_context(question)
-
-        prompt = f"""You are an expert livestock consultant. Answer the follow-up question based on 
-        the previous analysis and verified information.
-
-        Previous Analysis:
-        {self.previous_analysis if self.previous_analysis else 'No previous analysis available.'}
-
-        Follow-up Question:
-        {question}
+        start = time.perf_counter()
+        try:
+            with profile_stage("retrieve"):
+                results = self.retrieve(question)
+        except Exception as e:
+            logger.error(f"Error getting context: {e}")
+            results = None
 
-        Relevant Knowledge Base Context:
-        {context}
+        # Confident factual lookups are answered from the passages themselves; questions
+        # about the previous analysis or asking for explanations always go to the model
+        answer = format_passages(results, self.extractive_threshold) \
+            if results and is_factual_lookup(question) else ""
+        if answer:
+            self.followup_count += 1
+            fast_path_stats.record(True, time.perf_counter() - start)
+            return answer
 
-        + Focus on all problems that are mentioned in the content
-        + Never talk about any other topic other than any livestock problem
-        + Strictly avoid any irrelevant information
-        + Don't give any information back if its not domain specific
-        + Output should be to try again if the content is not related to livestock problem
+        # Get relevant context
+        context, top_score = self.retrieve_context(question, results=results)
 
-        Provide a clear, detailed answer based on the context and veterinary knowledge.
-        """
+        prompt = self.build_followup_prompt(question, context)
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            with profile_stage("generate"):
+                response = self.generation.call(lambda: self.router.generate(
+                    prompt,
+                    top_score=top_score,
+                    depth=self.followup_count,
+                    session_id=self.session_id,
+                    timeout=self.generation.deadline
+                ))
+            self.followup_count += 1
+            fast_path_stats.record(False, time.perf_counter() - start)
+            return response
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return "Error in generating response. Please try again."
+            return self.degraded_answer(context, top_score) or "Error in generating response. Please try again."
 
 def main():
     """Interactive demo of the AI system."""
@@ -132,31 +377,36 @@ def main():
     print("\n🐄 Agrivanna AI Livestock Consultant")
     print("Type 'exit' to quit or 'new' for a new analysis\n")
     
-    while True:
-        # Get symptoms
-        print("\nEnter symptoms (separated by commas) or command:")
-        user_input = input("> ").strip()
+    with profile_run("assistant"):
+        while True:
+            # Get symptoms
+            print("\nEnter symptoms (separated by commas) or command:")
+            user_input = input("> ").strip()
         
-        if user_input.lower() == 'exit':
-            break
-        elif user_input.lower() == 'new':
-            continue
+            if user_input.lower() == 'exit':
+                logger.info(f"Model routing stats: {ai.router.stats()}")
+                logger.info(f"Extractive fast path: {fast_path_stats.report()}")
+                logger.info(f"Prompt prefix cache: {get_context_cache().stats.report()}")
+                break
+            elif user_input.lower() == 'new':
+                continue
             
-        if not ai.previous_analysis:
-            # New analysis
-            symptoms = [s.strip() for s in user_input.split(',')]
-            print("\nAnalyzing...")
-            analysis = ai.analyze_livestock(symptoms)
-            print("\nAnalysis Results:")
-            print(analysis)
-        else:
-            # Follow-up question
-            print("\nGenerating response...")
-            response = ai.ask_followup(user_input)
-            print("\nResponse:")
-            print(response)
+            if not ai.previous_analysis:
+                # New analysis
+                symptoms = [s.strip() for s in user_input.split(',')]
+                print("\nAnalyzing...")
+                analysis = ai.analyze_livestock(symptoms)
+                print("\nAnalysis Results:")
+                print(analysis)
+            else:
+                # Follow-up question
+                print("\nGenerating response...")
+                response = ai.ask_followup(user_input)
+                print("\nResponse:")
+                print(response)
             
-        print("\nAsk a follow-up question, type 'new' for a new analysis, or 'exit' to quit")
+            print("\nAsk a follow-up question, type 'new' for a new analysis, or 'exit' to quit")
+
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
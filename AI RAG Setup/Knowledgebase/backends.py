@@ -0,0 +1,95 @@
+import os
+import threading
+import logging
+from dotenv import load_dotenv
+from embedding_models import EMBEDDING_MODEL, EMBEDDING_DIMENSION, dimension_of
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
+PINECONE_INDEX_NAME = os.getenv('PINECONE_INDEX_NAME', 'agrivanna-knowledge')
+# "production" uses the real models and services; "fake" runs entirely locally
+AGRIVANNA_BACKEND = os.getenv('AGRIVANNA_BACKEND', 'production')
+# "pinecone" or "local" (always local with fake backends)
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'pinecone')
+# Worker processes a local index is split across (1: a single in-process index)
+INDEX_SHARDS = int(os.getenv('INDEX_SHARDS', '1'))
+
+_embedders = {}
+_indexes = {}
+_lock = threading.Lock()
+
+def use_fakes() -> bool:
+    return AGRIVANNA_BACKEND == "fake"
+
+def load_embedder(model_name: str = EMBEDDING_MODEL):
+    """Return the process-wide embedder for a model, loading it on first use.
+
+    Every KnowledgeBase and DocumentProcessor in a process shares one copy
+    of the model weights. A model whose output does not match its
+    registered dimension is refused.
+    """
+    with _lock:
+        if model_name not in _embedders:
+            if use_fakes():
+                from fake_backends import FakeEmbedder
+                _embedders[model_name] = FakeEmbedder(model_name, dimension_of(model_name) or EMBEDDING_DIMENSION)
+            else:
+                import torch
+                from sentence_transformers import SentenceTransformer
+                logger.info(f"Loading embedding model: {model_name}")
+                embedder = SentenceTransformer(model_name)
+                embedder.to('cuda' if torch.cuda.is_available() else 'cpu')
+                expected = dimension_of(model_name)
+                if expected and embedder.get_sentence_embedding_dimension() != expected:
+                    raise ValueError(f"{model_name} produces {embedder.get_sentence_embedding_dimension()}-dim "
+                                     f"vectors, but is registered with {expected}")
+                _embedders[model_name] = embedder
+        return _embedders[model_name]
+
+def open_index(index_name: str = PINECONE_INDEX_NAME, dimension: int = None):
+    """Return the vector index client for `index_name` (Pinecone or local).
+
+    `dimension` only matters when a new local index is created; it defaults
+    to EMBEDDING_DIMENSION (smaller for a projected index).
+    """
+    with _lock:
+        if index_name not in _indexes:
+            if use_fakes() or VECTOR_BACKEND == "local":
+                from local_index import LocalIndex, LOCAL_INDEX_DIR
+                path = os.path.join(LOCAL_INDEX_DIR, index_name)
+                if INDEX_SHARDS > 1:
+                    from sharded_index import ShardedIndex
+                    _indexes[index_name] = ShardedIndex(dimension or EMBEDDING_DIMENSION, path, INDEX_SHARDS)
+                else:
+                    _indexes[index_name] = LocalIndex(dimension or EMBEDDING_DIMENSION, path)
+            else:
+                from pinecone import Pinecone
+                _indexes[index_name] = Pinecone(api_key=PINECONE_API_KEY).Index(index_name)
+        return _indexes[index_name]
+
+def release_index(index_name: str) -> None:
+    """Drop the cached client for an index that is no longer served."""
+    with _lock:
+        _indexes.pop(index_name, None)
+
+def load_image_embedder(model_name: str):
+    """Return an image embedding model (CLIP, or a fake with fake backends)."""
+    if use_fakes():
+        from fake_backends import FakeImageEmbedder
+        return FakeImageEmbedder(model_name)
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Loading image embedding model: {model_name}")
+    return SentenceTransformer(model_name)
+
+def create_generative_model(model_name: str):
+    """Return a generation model client (Gemini, or a fake with fake backends)."""
+    if use_fakes():
+        from fake_backends import FakeGenerativeModel
+        return FakeGenerativeModel(model_name)
+    import google.generativeai as genai
+    return genai.GenerativeModel(model_name)
@@ -0,0 +1,214 @@
+import os
+import csv
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Tuple
+from tqdm import tqdm
+from ai_response import AgrivannaAI, ANALYSIS_FILTER, analysis_query, symptom_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def load_animals(input_path: str) -> List[Dict]:
+    """Read animal ids and symptom lists from CSV or JSONL.
+
+    CSV files need `animal_id` and `symptoms` columns, with symptoms
+    separated by semicolons. JSONL lines look like
+    {"animal_id": "Cow #2466", "symptoms": ["fever", "loss of appetite"]}.
+
+    Args:
+        input_path (str): Path to a .csv or .jsonl file
+
+    Returns:
+        List[Dict]: Records with 'animal_id' and 'symptoms'
+    """
+    animals = []
+    if input_path.lower().endswith(".csv"):
+        with open(input_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                symptoms = [s.strip() for s in row["symptoms"].split(";") if s.strip()]
+                animals.append({"animal_id": row["animal_id"].strip(), "symptoms": symptoms})
+    else:
+        with open(input_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    animals.append({"animal_id": str(record["animal_id"]), "symptoms": record["symptoms"]})
+    return animals
+
+def load_checkpoint(output_path: str) -> Tuple[set, Dict[str, str]]:
+    """Read finished animals and analyses back from a previous run's output.
+
+    A line cut short by a crash is truncated away so appending stays valid.
+
+    Args:
+        output_path (str): Results JSONL file
+
+    Returns:
+        Tuple[set, Dict[str, str]]: Finished animal ids and analyses by symptom key
+    """
+    done, analyses = set(), {}
+    if not os.path.exists(output_path):
+        return done, analyses
+
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            if not raw.endswith(b"\n"):
+                break
+            valid_bytes += len(raw)
+            if record.get("error"):
+                continue  # Retry failures on resume
+            done.add(record["animal_id"])
+            analyses[record["symptom_key"]] = record["analysis"]
+
+    if valid_bytes < os.path.getsize(output_path):
+        logger.warning(f"Truncating partial line at byte {valid_bytes} of {output_path}")
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done, analyses
+
+class HerdAnalysisJob:
+    def __init__(self, ai: AgrivannaAI = None, concurrency: int = 4, retrieval_batch_size: int = 32):
+        """Initialize the batch job.
+
+        Args:
+            ai (AgrivannaAI): Assistant to use (default: a new instance)
+            concurrency (int): Maximum concurrent generation calls
+            retrieval_batch_size (int): Symptom sets per batched retrieval
+        """
+        self.ai = ai or AgrivannaAI()
+        self.concurrency = concurrency
+        self.retrieval_batch_size = retrieval_batch_size
+
+    def run(self, input_path: str, output_path: str, resume: bool = True) -> Dict:
+        """Analyze every animal in the input file and append results as JSONL.
+
+        Identical symptom sets are analyzed once. Results are flushed as each
+        symptom set finishes, so the output file doubles as the checkpoint.
+
+        Args:
+            input_path (str): CSV or JSONL input
+            output_path (str): JSONL results file
+            resume (bool): Skip animals already present in the output
+
+        Returns:
+            Dict: Run statistics
+        """
+        start_time = time.time()
+        animals = load_animals(input_path)
+        if resume:
+            done, analyses = load_checkpoint(output_path)
+        else:
+            done, analyses = set(), {}
+            open(output_path, "w").close()
+
+        # Group pending animals by symptom set
+        groups = {}
+        for animal in animals:
+            if animal["animal_id"] in done:
+                continue
+            key = symptom_key(animal["symptoms"])
+            groups.setdefault(key, []).append(animal)
+
+        pending = sum(len(members) for members in groups.values())
+        # The checkpoint may hold animals that are not in this input
+        skipped = len(animals) - pending
+        logger.info(f"🐄 {len(animals)} animals, {skipped} already done, "
+                    f"{pending} pending across {len(groups)} unique symptom sets")
+
+        stats = {"animals": len(animals), "skipped": skipped, "written": 0,
+                 "unique_sets": len(groups), "generated": 0, "reused": 0, "failed": 0}
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            def write_group(key: str, analysis: str = None, error: str = None) -> None:
+                for animal in groups[key]:
+                    record = {"animal_id": animal["animal_id"], "symptoms": animal["symptoms"],
+                              "symptom_key": key, "analysis": analysis}
+                    if error:
+                        record["error"] = error
+                    out.write(json.dumps(record) + "\n")
+                    stats["written"] += 1
+                out.flush()
+                os.fsync(out.fileno())
+
+            # Symptom sets already analyzed in an earlier run
+            for key in [k for k in groups if k in analyses]:
+                write_group(key, analysis=analyses[key])
+                stats["reused"] += 1
+
+            keys = [k for k in groups if k not in analyses]
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor, \
+                    tqdm(total=len(keys), desc="🩺 Analyzing", unit="set") as pbar:
+                futures = {}
+                for i in range(0, len(keys), self.retrieval_batch_size):
+                    batch_keys = keys[i:i + self.retrieval_batch_size]
+                    symptom_lists = [groups[key][0]["symptoms"] for key in batch_keys]
+                    try:
+                        contexts = self.ai.get_contexts(
+                            [analysis_query(symptoms) for symptoms in symptom_lists],
+                            filter=ANALYSIS_FILTER
+                        )
+                    except Exception as e:
+                        # Only this batch fails; it is retried on resume like any failed analysis
+                        logger.error(f"Retrieval failed for {len(batch_keys)} symptom sets: {e}")
+                        for key in batch_keys:
+                            write_group(key, error=f"Retrieval failed: {e}")
+                            stats["failed"] += 1
+                        pbar.update(len(batch_keys))
+                        continue
+                    for key, symptoms, context in zip(batch_keys, symptom_lists, contexts):
+                        future = executor.submit(self.ai.generate_analysis, symptoms, context)
+                        futures[future] = key
+
+                    # Write whatever finished while this batch was retrieved
+                    for future in [f for f in futures if f.done()]:
+                        self._collect(future, futures.pop(future), write_group, stats, pbar)
+
+                for future in as_completed(list(futures)):
+                    self._collect(future, futures.pop(future), write_group, stats, pbar)
+
+        elapsed = time.time() - start_time
+        stats["elapsed_sec"] = round(elapsed, 2)
+        stats["animals_per_sec"] = round(stats["written"] / elapsed, 2) if elapsed else 0.0
+        stats["generations_per_sec"] = round(stats["generated"] / elapsed, 2) if elapsed else 0.0
+        logger.info(f"✅ Wrote {stats['written']} results in {elapsed:.2f} seconds "
+                    f"({stats['animals_per_sec']} animals/sec, {stats['generated']} generations, "
+                    f"{stats['failed']} failed)")
+        return stats
+
+    @staticmethod
+    def _collect(future, key: str, write_group, stats: Dict, pbar) -> None:
+        try:
+            write_group(key, analysis=future.result())
+            stats["generated"] += 1
+        except Exception as e:
+            logger.error(f"Analysis failed for symptom set '{key}': {e}")
+            write_group(key, error=str(e))
+            stats["failed"] += 1
+        pbar.update(1)
+
+def main():
+    """Run a herd health sweep from the command line."""
+    parser = argparse.ArgumentParser(description="Bulk herd analysis")
+    parser.add_argument("input", help="CSV (animal_id, symptoms) or JSONL input file")
+    parser.add_argument("output", help="JSONL results file (also used as the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent generation calls")
+    parser.add_argument("--retrieval-batch-size", type=int, default=32, help="Symptom sets per retrieval batch")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing output and start over")
+    args = parser.parse_args()
+
+    job = HerdAnalysisJob(concurrency=args.concurrency, retrieval_batch_size=args.retrieval_batch_size)
+    stats = job.run(args.input, args.output, resume=not args.restart)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import os
+import re
+import zlib
+import logging
+from collections import Counter
+from typing import Iterable, List, Set
+import numpy as np
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Drop header, footer and table-of-contents lines before chunking
+BOILERPLATE_FILTER = os.getenv('BOILERPLATE_FILTER', '1') == '1'
+# Pages sampled to learn a document's headers and footers
+BOILERPLATE_SAMPLE_PAGES = int(os.getenv('BOILERPLATE_SAMPLE_PAGES', '40'))
+# Share of sampled pages an edge line must appear on to count as a header or footer
+BOILERPLATE_MIN_SHARE = float(os.getenv('BOILERPLATE_MIN_SHARE', '0.3'))
+# Estimated Jaccard similarity above which a chunk is dropped as a near-duplicate (0 disables)
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.7'))
+
+EDGE_LINES = 3  # Lines at the top and bottom of a page that may be a header or footer
+# Table-of-contents entries end in dot leaders and a page number
+TOC_LINE = re.compile(r"(\.\s?){4,}\s*(\d+)\s*$")
+TOC_MIN_ENTRIES = 3  # Dot-leader lines a page needs before it can be a contents page
+TOC_MIN_SHARE = 0.5  # Share of a contents page's lines that are dot-leader entries
+# Bare page numbers; only removed near the page edges, since table cells look the same
+PAGE_NUMBER_LINE = re.compile(r"^\s*(page\s+)?\d+\s*(of\s+\d+)?\s*$", re.IGNORECASE)
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+def normalize_line(line: str) -> str:
+    """Line form used to recognise repeats: page numbers and dates differ from page to page."""
+    return re.sub(r"\s+", " ", re.sub(r"\d+", "#", line.lower())).strip()
+
+def find_boilerplate_lines(pages: List[str], min_share: float = BOILERPLATE_MIN_SHARE,
+                           edge_lines: int = EDGE_LINES) -> Set[str]:
+    """Learn the running headers and footers of a document from a sample of its pages.
+
+    Args:
+        pages (List[str]): Text of the sampled pages
+        min_share (float): Share of pages a line must recur on
+        edge_lines (int): Lines at each end of a page to consider
+
+    Returns:
+        Set[str]: Normalized header and footer lines
+    """
+    counts = Counter()
+    for text in pages:
+        lines = [normalize_line(line) for line in text.splitlines() if line.strip()]
+        counts.update(set(lines[:edge_lines] + lines[-edge_lines:]))
+    needed = max(2, int(len(pages) * min_share))
+    return {line for line, count in counts.items() if count >= needed and len(line) > 1}
+
+def sample_page_numbers(total_pages: int, sample_size: int = BOILERPLATE_SAMPLE_PAGES) -> List[int]:
+    """Evenly spaced page numbers, so headers that change between chapters are still seen."""
+    if total_pages <= sample_size:
+        return list(range(total_pages))
+    return sorted({round(i * (total_pages - 1) / (sample_size - 1)) for i in range(sample_size)})
+
+def is_contents_page(lines: List[str]) -> bool:
+    """Whether a page is mostly dot-leader entries whose page numbers run in order.
+
+    Tables with dot leaders ("Dry matter ........ 12") match line by line,
+    but their values do not ascend the way contents page numbers do.
+    """
+    content = [line for line in lines if line.strip()]
+    numbers = []
+    for line in content:
+        match = TOC_LINE.search(line)
+        if match:
+            numbers.append(int(match.group(2)))
+    return (len(numbers) >= max(TOC_MIN_ENTRIES, len(content) * TOC_MIN_SHARE)
+            and numbers == sorted(numbers))
+
+def strip_boilerplate(text: str, boilerplate: Set[str], edge_lines: int = EDGE_LINES) -> tuple:
+    """Remove header, footer, page number and table-of-contents lines from a page.
+
+    Headers, footers and page numbers are only looked for among the lines
+    at the page edges, and contents entries only on contents pages, so body
+    text and tables that happen to look like them are kept.
+
+    Returns:
+        tuple: (cleaned text, number of lines removed)
+    """
+    lines = text.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(content[:edge_lines] + content[-edge_lines:])
+    contents_page = is_contents_page(lines)
+    kept, removed = [], 0
+    for i, line in enumerate(lines):
+        if line.strip() and ((contents_page and TOC_LINE.search(line))
+                             or (i in edges and (normalize_line(line) in boilerplate
+                                                 or PAGE_NUMBER_LINE.match(line)))):
+            removed += 1
+            continue
+        kept.append(line)
+    return "\n".join(kept), removed
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """32-bit hashes of the word `size`-grams of a text (the whole text if shorter)."""
+    words = re.findall(r"\w+", text.lower())
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+class NearDuplicateFilter:
+    """MinHash signatures with LSH banding to find chunks that are near-copies.
+
+    Each chunk gets `num_perm` min-hashes; the signature is cut into
+    `bands` bands and chunks sharing any band are candidates, whose
+    estimated Jaccard similarity is then checked against the threshold.
+    Only kept chunks are indexed, so a run of copies collapses to its first.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = 128, bands: int = 32, seed: int = 1):
+        """Initialize the filter.
+
+        Args:
+            threshold (float): Estimated Jaccard similarity that counts as a duplicate
+            num_perm (int): Hash functions per signature
+            bands (int): LSH bands; more bands find less similar candidates
+            seed (int): Seed for the hash functions, fixed so runs are repeatable
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = []
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text)
+        # (a*x + b) mod p per hash function; uint64 products wrap, as in the usual MinHash formulation
+        with np.errstate(over="ignore"):
+            mixed = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % np.uint64(MERSENNE_PRIME)
+        return (mixed & np.uint64(MAX_HASH)).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> list:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(len(self.buckets))]
+
+    def add(self, text: str, signature: np.ndarray = None) -> None:
+        """Index a chunk as kept without checking it (e.g. chunks already stored)."""
+        signature = self.signature(text) if signature is None else signature
+        position = len(self.signatures)
+        self.signatures.append(signature)
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            bucket.setdefault(key, []).append(position)
+
+    def contains(self, signature: np.ndarray) -> bool:
+        """Whether a chunk with this signature nearly repeats one already indexed."""
+        candidates = set()
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        return any(np.mean(self.signatures[position] == signature) >= self.threshold for position in candidates)
+
+    def is_duplicate(self, text: str) -> bool:
+        """Check a chunk against those kept so far, keeping it if it is new."""
+        signature = self.signature(text)
+        if self.contains(signature):
+            return True
+        self.add(text, signature)
+        return False
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+def rebuild_filter(texts: Iterable[str], threshold: float = DEDUP_THRESHOLD) -> NearDuplicateFilter:
+    """Filter pre-loaded with chunks that are already stored."""
+    dedup = NearDuplicateFilter(threshold)
+    for text in texts:
+        dedup.add(text)
+    return dedup
@@ -0,0 +1,251 @@
+import os
+import json
+import sqlite3
+import threading
+import logging
+from typing import List, Dict, Iterable
+import numpy as np
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Relative paths are resolved against this folder, not the working directory
+DOCSTORE_PATH = os.path.join(BASE_DIR, os.getenv('DOCSTORE_PATH', 'docstore.db'))
+
+# SQLite caps the number of bound parameters per statement
+MAX_VARIABLES = 900
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+class DocStore:
+    """Local SQLite store for chunk text and metadata, keyed by vector id.
+
+    The vector index only carries ids (plus a few small filterable fields);
+    the chunk text lives here and is fetched in bulk after each search.
+    """
+
+    def __init__(self, path: str = DOCSTORE_PATH):
+        """Open (or create) the document store.
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA mmap_size=268435456")  # Map up to 256MB of the file
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                doc_id TEXT,
+                chunk_index INTEGER,
+                text TEXT NOT NULL,
+                metadata TEXT,
+                PRIMARY KEY (namespace, id)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks (namespace, doc_id)")
+        # Full-dimension embeddings, kept when the index stores projected vectors
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (namespace, id)
+            )
+        """)
+        self.conn.commit()
+
+    def put_many(self, records: Iterable[Dict], namespace: str = "") -> int:
+        """Insert or replace chunk records.
+
+        Args:
+            records (Iterable[Dict]): Records with 'id' and 'text' plus any metadata
+            namespace (str): Vector index namespace the ids belong to
+
+        Returns:
+            int: Number of records written
+        """
+        rows = []
+        for record in records:
+            metadata = {k: v for k, v in record.items() if k not in ("id", "text")}
+            rows.append((
+                namespace,
+                record["id"],
+                metadata.get("doc_id"),
+                metadata.get("chunk_index"),
+                record["text"],
+                json.dumps(metadata)
+            ))
+
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (namespace, id, doc_id, chunk_index, text, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def get_many(self, ids: List[str], namespace: str = "") -> Dict[str, Dict]:
+        """Fetch chunk records for a list of vector ids in one bulk lookup.
+
+        Args:
+            ids (List[str]): Vector ids to fetch
+            namespace (str): Vector index namespace the ids belong to
+
+        Returns:
+            Dict[str, Dict]: Metadata dicts (including 'text') keyed by id
+        """
+        found = {}
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(ids), MAX_VARIABLES):
+                batch = ids[i:i + MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                cursor = self.conn.execute(
+                    f"SELECT id, text, metadata FROM chunks "
+                    f"WHERE namespace = ? AND id IN ({placeholders})",
+                    [namespace, *batch]
+                )
+                for vector_id, text, metadata in cursor:
+                    record = json.loads(metadata) if metadata else {}
+                    record["text"] = text
+                    found[vector_id] = record
+        return found
+
+    def put_embeddings(self, ids: List[str], vectors: np.ndarray, namespace: str = "") -> int:
+        """Store full-dimension embeddings (L2-normalized, float32) by vector id.
+
+        Args:
+            ids (List[str]): Vector ids
+            vectors (np.ndarray): One row per id
+            namespace (str): Vector index namespace the ids belong to
+
+        Returns:
+            int: Number of embeddings written
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, id, vector) VALUES (?, ?, ?)",
+                [(namespace, vector_id, vector.tobytes()) for vector_id, vector in zip(ids, vectors)]
+            )
+            self.conn.commit()
+        return len(ids)
+
+    def get_embeddings(self, ids: List[str], namespace: str = "") -> Dict[str, np.ndarray]:
+        """Fetch stored full-dimension embeddings for a list of vector ids.
+
+        Args:
+            ids (List[str]): Vector ids to fetch
+            namespace (str): Vector index namespace the ids belong to
+
+        Returns:
+            Dict[str, np.ndarray]: Normalized embeddings keyed by id
+        """
+        found = {}
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(ids), MAX_VARIABLES):
+                batch = ids[i:i + MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                cursor = self.conn.execute(
+                    f"SELECT id, vector FROM embeddings WHERE namespace = ? AND id IN ({placeholders})",
+                    [namespace, *batch]
+                )
+                for vector_id, vector in cursor:
+                    found[vector_id] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def iter_records(self, namespace: str = "", page_size: int = 1000):
+        """Yield every record in a namespace, reading one page at a time.
+
+        Args:
+            namespace (str): Vector index namespace
+            page_size (int): Rows read per query
+
+        Yields:
+            Dict: Metadata dict with 'id' and 'text'
+        """
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, id, text, metadata FROM chunks "
+                    "WHERE namespace = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                    (namespace, last_rowid, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, vector_id, text, metadata in rows:
+                record = json.loads(metadata) if metadata else {}
+                record.update({"id": vector_id, "text": text})
+                yield record
+            last_rowid = rows[-1][0]
+
+    def delete_document(self, doc_id: str, namespace: str = "") -> int:
+        """Remove all chunks belonging to a document.
+
+        Args:
+            doc_id (str): Document identifier
+            namespace (str): Vector index namespace
+
+        Returns:
+            int: Number of chunks removed
+        """
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE namespace = ? AND id IN "
+                "(SELECT id FROM chunks WHERE namespace = ? AND doc_id = ?)",
+                (namespace, namespace, doc_id)
+            )
+            cursor = self.conn.execute(
+                "DELETE FROM chunks WHERE namespace = ? AND doc_id = ?",
+                (namespace, doc_id)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def count(self, namespace: str = None) -> int:
+        """Count stored chunks, optionally within one namespace."""
+        with self._lock:
+            if namespace is None:
+                cursor = self.conn.execute("SELECT COUNT(*) FROM chunks")
+            else:
+                cursor = self.conn.execute("SELECT COUNT(*) FROM chunks WHERE namespace = ?", (namespace,))
+            return cursor.fetchone()[0]
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self.conn.close()
+
+def open_docstore(path: str = DOCSTORE_PATH) -> DocStore:
+    """Return the process-wide store for a database file, opening it on first use.
+
+    Readers that switch between index versions share one connection per
+    version instead of opening a new one on every switch.
+    """
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = DocStore(path)
+        return _stores[path]
+
+def release_docstore(path: str) -> None:
+    """Close the shared store of a database file that is about to be deleted."""
+    with _stores_lock:
+        store = _stores.pop(path, None)
+    if store is not None:
+        store.close()
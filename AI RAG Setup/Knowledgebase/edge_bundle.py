@@ -0,0 +1,527 @@
+import os
+import copy
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import logging
+import numpy as np
+import torch
+from dotenv import load_dotenv
+from docstore import DocStore
+from local_index import Match, QueryResponse, FetchResponse, IndexStats, matches_filter
+from backends import load_embedder, open_index, EMBEDDING_MODEL, PINECONE_INDEX_NAME
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS or hard limit
+    resource = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EDGE_BUNDLE_DIR = os.path.join(BASE_DIR, os.getenv('EDGE_BUNDLE_DIR', 'edge_bundle'))
+# Resident memory the knowledge base may use once loaded (0: no cap)
+EDGE_MEMORY_CAP_MB = int(os.getenv('EDGE_MEMORY_CAP_MB', '2048'))
+# Also make the kernel refuse heap growth past the cap; memory-mapped files do not count against it
+EDGE_HARD_MEMORY_LIMIT = os.getenv('EDGE_HARD_MEMORY_LIMIT', '0') == '1'
+
+BUNDLE_FORMAT_VERSION = 2
+QUERY_BLOCK_ROWS = 65536  # Rows dequantized at a time while scoring
+RECALL_SAMPLE = 50  # Stored vectors used as probe queries to measure int8 recall at export
+QUANTIZED_WEIGHTS = "quantized_linear.pt"  # Int8 linear layers, beside the encoder's model directory
+
+class BundleError(Exception):
+    pass
+
+class MemoryCapExceeded(BundleError):
+    pass
+
+def quantize_rows(vectors: np.ndarray) -> tuple:
+    """L2-normalize rows and store each one's offset from the mean as int8 with its own scale.
+
+    Embeddings of one corpus share a large common component; quantizing
+    what is left keeps the int8 steps small where rows actually differ.
+    The mean's contribution to a score is the same for every row, so it is
+    added back once per query.
+
+    Returns:
+        tuple: (int8 matrix, float32 scale per row, float32 mean); row ≈ mean + int8 * scale
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    mean = vectors.mean(axis=0) if len(vectors) else np.zeros(vectors.shape[1], dtype=np.float32)
+    residuals = vectors - mean
+    scales = np.abs(residuals).max(axis=1) / 127 if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = np.where(scales == 0, 1, scales).astype(np.float32)
+    return np.round(residuals / scales[:, None]).astype(np.int8), scales, mean.astype(np.float32)
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far, or 0 where unknown."""
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+class QuantizedIndex:
+    """Read-only int8 index served from memory-mapped files.
+
+    Implements the query side of the LocalIndex API (query, fetch, list,
+    describe_index_stats). Matrices stay on disk until scored and are
+    dequantized in blocks of QUERY_BLOCK_ROWS rows, so resident memory
+    does not grow with the index.
+    """
+
+    def __init__(self, path: str):
+        """Open an index written by `export_bundle`.
+
+        Args:
+            path (str): The bundle's index directory
+        """
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dimension = manifest["dimension"]
+        self._namespaces = {}
+        for name, stem in manifest["namespaces"].items():
+            with open(os.path.join(path, f"{stem}.json"), encoding="utf-8") as f:
+                columns = json.load(f)
+            self._namespaces[name] = {
+                "matrix": np.load(os.path.join(path, f"{stem}.int8.npy"), mmap_mode="r"),
+                "scales": np.load(os.path.join(path, f"{stem}.scale.npy"), mmap_mode="r"),
+                "mean": np.load(os.path.join(path, f"{stem}.mean.npy")),
+                "ids": columns["ids"],
+                "metadata": columns["metadata"],
+                "positions": {vector_id: i for i, vector_id in enumerate(columns["ids"])},
+            }
+
+    @staticmethod
+    def write(path: str, namespaces: dict, dimension: int) -> dict:
+        """Quantize and write {namespace: (ids, vectors, metadata)}; returns the index manifest."""
+        os.makedirs(path, exist_ok=True)
+        manifest = {"dimension": dimension, "namespaces": {}}
+        for i, (name, (ids, vectors, metadata)) in enumerate(sorted(namespaces.items())):
+            quantized, scales, mean = quantize_rows(vectors)
+            np.save(os.path.join(path, f"ns{i}.int8.npy"), quantized)
+            np.save(os.path.join(path, f"ns{i}.scale.npy"), scales)
+            np.save(os.path.join(path, f"ns{i}.mean.npy"), mean)
+            with open(os.path.join(path, f"ns{i}.json"), "w", encoding="utf-8") as f:
+                json.dump({"ids": ids, "metadata": metadata}, f)
+            manifest["namespaces"][name] = f"ns{i}"
+        with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        return manifest
+
+    def scores(self, namespace: str, vector: list, rows: np.ndarray = None) -> np.ndarray:
+        ns = self._namespaces[namespace]
+        query_vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        query_vector = query_vector / norm if norm else query_vector
+        offset = float(ns["mean"] @ query_vector)
+        if rows is not None:
+            return (ns["matrix"][rows].astype(np.float32) @ query_vector) * ns["scales"][rows] + offset
+        scores = np.empty(len(ns["ids"]), dtype=np.float32)
+        for start in range(0, len(scores), QUERY_BLOCK_ROWS):
+            block = ns["matrix"][start:start + QUERY_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = (block @ query_vector) * ns["scales"][start:start + len(block)]
+        return scores + offset
+
+    def query(self, vector: list, top_k: int = 10, filter: dict = None, namespace: str = "",
+              include_metadata: bool = False, include_values: bool = False, **kwargs) -> QueryResponse:
+        """Return the `top_k` most similar vectors that pass the filter."""
+        ns = self._namespaces.get(namespace)
+        if ns is None or not ns["ids"]:
+            return QueryResponse([], namespace)
+        rows = None
+        if filter:
+            rows = np.array([i for i, metadata in enumerate(ns["metadata"]) if matches_filter(metadata, filter)],
+                            dtype=np.int64)
+            if not len(rows):
+                return QueryResponse([], namespace)
+        scores = self.scores(namespace, vector, rows)
+
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        matches = []
+        for i in best:
+            position = int(rows[i]) if rows is not None else int(i)
+            matches.append(Match(
+                ns["ids"][position],
+                float(scores[i]),
+                self._values(ns, position) if include_values else None,
+                dict(ns["metadata"][position]) if include_metadata else None
+            ))
+        return QueryResponse(matches, namespace)
+
+    @staticmethod
+    def _values(ns: dict, position: int) -> list:
+        return (ns["mean"] + ns["matrix"][position].astype(np.float32) * ns["scales"][position]).tolist()
+
+    def fetch(self, ids: list, namespace: str = "") -> FetchResponse:
+        """Return dequantized vectors and metadata for the given ids."""
+        ns = self._namespaces.get(namespace)
+        vectors = {}
+        if ns is not None:
+            for vector_id in ids:
+                if vector_id in ns["positions"]:
+                    position = ns["positions"][vector_id]
+                    vectors[vector_id] = Match(vector_id, 0.0, self._values(ns, position),
+                                               dict(ns["metadata"][position]))
+        return FetchResponse(vectors, namespace)
+
+    def list(self, namespace: str = "", prefix: str = None, limit: int = 100):
+        ns = self._namespaces.get(namespace)
+        ids = [vector_id for vector_id in (ns["ids"] if ns else []) if prefix is None or vector_id.startswith(prefix)]
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def describe_index_stats(self) -> IndexStats:
+        return IndexStats(self.dimension, {name: {"vector_count": len(ns["ids"])}
+                                           for name, ns in self._namespaces.items()})
+
+    def upsert(self, *args, **kwargs):
+        raise BundleError("Edge bundles are read-only; export a new bundle instead")
+
+    delete = upsert
+
+def int8_recall(vectors: np.ndarray, top_k: int = 10) -> float:
+    """Share of the float32 top-k that int8 scoring also returns, probing with stored vectors."""
+    if len(vectors) <= top_k:
+        return 1.0
+    normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    quantized, scales, mean = quantize_rows(vectors)
+    dequantized = mean + quantized.astype(np.float32) * scales[:, None]
+    probes = np.random.default_rng(0).choice(len(vectors), min(RECALL_SAMPLE, len(vectors)), replace=False)
+    found = 0
+    for probe in probes:
+        exact = set(np.argsort(-(normalized @ normalized[probe]))[:top_k])
+        approx = set(np.argsort(-(dequantized @ normalized[probe]))[:top_k])
+        found += len(exact & approx)
+    return round(found / (len(probes) * top_k), 3)
+
+def quantize_encoder(embedder):
+    """Dynamic int8 quantization of the encoder's linear layers, on a CPU copy.
+
+    The embedder from `load_embedder` is shared by the whole process, so it
+    is copied rather than moved off its device or quantized in place.
+    """
+    if not isinstance(embedder, torch.nn.Module):
+        return embedder  # Fake embedders have nothing to quantize
+    embedder = copy.deepcopy(embedder).to("cpu")
+    return torch.quantization.quantize_dynamic(embedder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def save_encoder(embedder, path: str, quantize: bool) -> None:
+    """Write the query encoder as a model directory (config, tokenizer, weights).
+
+    When quantized, the linear layers are left out of the directory's
+    weights and written already quantized to QUANTIZED_WEIGHTS. Both files
+    hold tensors only, so loading them runs no pickled code.
+    """
+    # Imported here: safetensors comes with transformers, which fake embedders do not need
+    from safetensors.torch import load_file, save_file
+
+    embedder.save(path)
+    if not quantize:
+        return
+    quantized = quantize_encoder(embedder)
+    layers = [name for name, module in quantized.named_modules()
+              if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)]
+    torch.save({key: value for key, value in quantized.state_dict().items()
+                if any(key.startswith(f"{name}.") for name in layers)}, os.path.join(path, QUANTIZED_WEIGHTS))
+
+    weights_path = os.path.join(path, "model.safetensors")
+    if not os.path.exists(weights_path):
+        raise BundleError(f"Expected the encoder's weights in a single {weights_path}")
+    linear = {name for name, module in embedder[0].auto_model.named_modules() if isinstance(module, torch.nn.Linear)}
+    weights = load_file(weights_path)
+    save_file({key: value for key, value in weights.items() if key.rsplit(".", 1)[0] not in linear},
+              weights_path, metadata={"format": "pt"})
+
+def load_encoder(path: str, quantized: bool):
+    """Rebuild an encoder written by `save_encoder`, on CPU.
+
+    A quantized encoder is built from its directory with placeholder linear
+    layers, quantized, then given the stored int8 layers.
+    """
+    # Imported here: only bundles with a real encoder need sentence-transformers
+    from sentence_transformers import SentenceTransformer
+    from transformers.utils import logging as transformers_logging
+
+    verbosity = transformers_logging.get_verbosity()
+    if quantized:
+        transformers_logging.set_verbosity_error()  # The missing linear weights are expected
+    try:
+        embedder = SentenceTransformer(path, device="cpu")
+    finally:
+        transformers_logging.set_verbosity(verbosity)
+    if not quantized:
+        return embedder
+    encoder = torch.quantization.quantize_dynamic(embedder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    state = encoder.state_dict()
+    layers = torch.load(os.path.join(path, QUANTIZED_WEIGHTS), map_location="cpu", weights_only=True)
+    unknown = set(layers) - set(state)
+    if unknown:
+        raise BundleError(f"Quantized weights do not match the encoder: {sorted(unknown)[:3]}")
+    state.update(layers)
+    encoder.load_state_dict(state)
+    return encoder.eval()
+
+def encoder_agreement(reference, candidate, texts: list) -> float:
+    """Mean cosine similarity between two encoders' embeddings of the same texts."""
+    a = np.asarray(reference.encode(texts, show_progress_bar=False), dtype=np.float32)
+    b = np.asarray(candidate.encode(texts, show_progress_bar=False), dtype=np.float32)
+    a /= np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b /= np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return round(float((a * b).sum(axis=1).mean()), 4)
+
+def copy_docstore(docstore: DocStore, path: str, keep_embeddings: bool) -> None:
+    """Consistent copy of the docstore, without full-dimension embeddings unless they are needed."""
+    if os.path.exists(path):
+        os.remove(path)
+    target = sqlite3.connect(path)
+    with sqlite3.connect(docstore.path) as source:
+        source.backup(target)
+    if not keep_embeddings:
+        target.execute("DELETE FROM embeddings")
+        target.commit()
+    target.execute("PRAGMA journal_mode=DELETE")  # A single file, nothing beside it
+    target.execute("VACUUM")
+    target.close()
+
+def export_bundle(bundle_dir: str = EDGE_BUNDLE_DIR, index=None, docstore: DocStore = None,
+                  index_name: str = PINECONE_INDEX_NAME, encoder_model: str = EMBEDDING_MODEL,
+                  quantize: bool = True, warm_cache_dir: str = None) -> dict:
+    """Write a self-contained offline bundle of the knowledge base.
+
+    The index is stored as int8 with a scale per vector (a quarter of the
+    float32 size). With a different `encoder_model`, every chunk is
+    re-embedded with that (smaller) model from the docstore text, so the
+    bundle is built from the same chunks; otherwise the index vectors are
+    copied. The query encoder is saved with int8 linear layers unless
+    `quantize` is off.
+
+    Args:
+        bundle_dir (str): Output directory (replaced if it exists)
+        index: Source index (default: the version PINECONE_INDEX_NAME points at)
+        docstore (DocStore): Source chunk store (default: that version's docstore)
+        index_name (str): Alias to export when `index` is not given
+        encoder_model (str): Query encoder for the bundle
+        quantize (bool): Quantize the encoder's linear layers to int8
+        warm_cache_dir (str): Warm cache to include (default: WARM_CACHE_DIR)
+
+    Returns:
+        dict: The bundle manifest
+    """
+    # Imported here: index_snapshot pulls in the ingestion pipeline, warm_cache the generation stack
+    from index_snapshot import read_vectors
+    from index_versions import current_version
+    from projection import load_projection
+    from warm_cache import WARM_CACHE_DIR, pointer_name
+
+    start = time.time()
+    version, docstore_path = current_version(index_name)
+    docstore = docstore or DocStore(docstore_path)
+    projection = load_projection(docstore_path=docstore.path)
+    index = index or open_index(version, projection.dimension if projection else None)
+    reembed = encoder_model != EMBEDDING_MODEL
+    if reembed:
+        projection = None  # The new encoder's vectors are stored at full dimension
+
+    tmp_dir = f"{bundle_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    encoder = load_embedder(encoder_model)
+    stats = index.describe_index_stats()
+    namespaces, recall, sample_texts = {}, {}, []
+    for namespace in sorted(stats.namespaces):
+        ids, vectors, metadata = read_vectors(index, namespace, stats.dimension)
+        records = docstore.get_many(ids, namespace=namespace)
+        sample_texts.extend(record["text"] for record in list(records.values())[:16])
+        if reembed:
+            from embedding_engine import EmbeddingEngine
+            vectors = EmbeddingEngine(encoder).encode([records.get(vector_id, {}).get("text", "") for vector_id in ids])
+        namespaces[namespace] = (ids, vectors, metadata)
+        recall[namespace] = int8_recall(vectors)
+        logger.info(f"Namespace '{namespace}': {len(ids)} vectors, int8 recall@10 {recall[namespace]}")
+    dimension = next(iter(namespaces.values()))[1].shape[1] if namespaces else stats.dimension
+    QuantizedIndex.write(os.path.join(tmp_dir, "index"), namespaces, dimension)
+
+    copy_docstore(docstore, os.path.join(tmp_dir, "docstore.db"), keep_embeddings=projection is not None)
+    if projection is not None:
+        projection.save(os.path.join(tmp_dir, "projection.npz"))
+
+    # Fake embedders are rebuilt from their name; a real encoder is saved, so loading needs no hub access
+    encoder_saved = isinstance(encoder, torch.nn.Module)
+    bundled_encoder = encoder
+    if encoder_saved:
+        save_encoder(encoder, os.path.join(tmp_dir, "encoder"), quantize)
+        bundled_encoder = load_encoder(os.path.join(tmp_dir, "encoder"), quantize)
+    agreement = encoder_agreement(load_embedder(EMBEDDING_MODEL), bundled_encoder, sample_texts[:32]) \
+        if sample_texts and not reembed else None
+
+    warm_cache_dir = warm_cache_dir or WARM_CACHE_DIR
+    warm_cache = None
+    pointer_path = os.path.join(warm_cache_dir, pointer_name(version))
+    if os.path.exists(pointer_path):
+        with open(pointer_path, encoding="utf-8") as f:
+            warm_cache = json.load(f)
+        os.makedirs(os.path.join(tmp_dir, "warm_cache"))
+        shutil.copy(pointer_path, os.path.join(tmp_dir, "warm_cache", pointer_name(version)))
+        shutil.copy(os.path.join(warm_cache_dir, warm_cache["artefact"]), os.path.join(tmp_dir, "warm_cache"))
+    else:
+        logger.warning("No warm cache to bundle; run warm_cache.py first for precomputed answers")
+
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "index_name": index_name,
+        "source_version": version,
+        "source_model": EMBEDDING_MODEL,
+        "encoder_model": encoder_model,
+        "encoder_quantized": quantize and encoder_saved,
+        "encoder_saved": encoder_saved,
+        "encoder_agreement": agreement,
+        "dimension": dimension,
+        "projection": projection is not None,
+        "vectors": {namespace: len(ids) for namespace, (ids, _, _) in namespaces.items()},
+        "int8_recall_at_10": recall,
+        "warm_cache": warm_cache["version"] if warm_cache else None,
+    }
+    manifest["bytes"] = {name: sum(os.path.getsize(os.path.join(root, file))
+                                   for root, _, files in os.walk(os.path.join(tmp_dir, name)) for file in files)
+                         if os.path.isdir(os.path.join(tmp_dir, name)) else os.path.getsize(os.path.join(tmp_dir, name))
+                         for name in os.listdir(tmp_dir)}
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.replace(tmp_dir, bundle_dir)
+    logger.info(f"✅ Edge bundle written to {bundle_dir} ({sum(manifest['bytes'].values()) / 2**20:.1f} MiB) "
+                f"in {time.time() - start:.2f}s")
+    return manifest
+
+class EdgeBundle:
+    """A loaded bundle: knowledge base, answer cache and the startup report."""
+
+    def __init__(self, knowledge_base, warm_cache, manifest: dict, report: dict):
+        self.knowledge_base = knowledge_base
+        self.warm_cache = warm_cache
+        self.manifest = manifest
+        self.report = report
+
+    def assistant(self, session_id: str = "edge"):
+        """An assistant answering from this bundle; cached analyses cover the common cases offline."""
+        from ai_response import AgrivannaAI
+        return AgrivannaAI(session_id, knowledge_base=self.knowledge_base, warm_cache=self.warm_cache)
+
+def check_memory(stage: str, memory_cap_mb: float) -> None:
+    peak = peak_rss_mb()
+    if memory_cap_mb and peak > memory_cap_mb:
+        raise MemoryCapExceeded(f"Peak RSS {peak:.0f} MiB after loading the {stage} exceeds the "
+                                f"{memory_cap_mb} MiB cap")
+
+def load_bundle(bundle_dir: str = EDGE_BUNDLE_DIR, memory_cap_mb: float = EDGE_MEMORY_CAP_MB) -> EdgeBundle:
+    """Load a bundle for offline serving under a memory cap.
+
+    The index and docstore are memory-mapped, so only the pages queries
+    touch become resident. Peak RSS is checked after each part is loaded
+    and loading stops with MemoryCapExceeded once it passes the cap; with
+    EDGE_HARD_MEMORY_LIMIT the kernel also refuses heap growth past it.
+
+    Args:
+        bundle_dir (str): Directory written by `export_bundle`
+        memory_cap_mb (float): Resident memory allowed for the process (0: no cap)
+
+    Returns:
+        EdgeBundle: Knowledge base, answer cache, manifest and startup report
+    """
+    from query_knowledge import KnowledgeBase
+    from projection import Projection
+    from warm_cache import WarmCache
+
+    start = time.perf_counter()
+    baseline_rss = peak_rss_mb()  # Interpreter, torch and whatever the caller loaded already
+    with open(os.path.join(bundle_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format {manifest.get('format_version')}")
+    if memory_cap_mb and EDGE_HARD_MEMORY_LIMIT and resource is not None:
+        cap = int(memory_cap_mb * 2**20)
+        resource.setrlimit(resource.RLIMIT_DATA, (cap, cap))
+
+    timings = {}
+    stage_start = time.perf_counter()
+    index = QuantizedIndex(os.path.join(bundle_dir, "index"))
+    docstore = DocStore(os.path.join(bundle_dir, "docstore.db"))
+    timings["index_and_docstore"] = time.perf_counter() - stage_start
+    check_memory("index", memory_cap_mb)
+
+    stage_start = time.perf_counter()
+    if manifest["encoder_saved"]:
+        encoder = load_encoder(os.path.join(bundle_dir, "encoder"), manifest["encoder_quantized"])
+    else:
+        encoder = load_embedder(manifest["encoder_model"])
+    timings["encoder"] = time.perf_counter() - stage_start
+    check_memory("encoder", memory_cap_mb)
+
+    # Bundles are self-contained: False keeps PROJECTION_PATH from the environment out
+    projection = False
+    if manifest["projection"]:
+        projection = Projection.load(os.path.join(bundle_dir, "projection.npz"))
+    knowledge_base = KnowledgeBase(embedder=encoder, index=index, docstore=docstore, projection=projection)
+    knowledge_base.device = torch.device("cpu")  # A quantized encoder runs on CPU
+
+    stage_start = time.perf_counter()
+    warm_cache = None
+    if manifest["warm_cache"]:
+        warm_cache = WarmCache.load(os.path.join(bundle_dir, "warm_cache"), index_version=manifest["source_version"],
+                                    embedding_model=manifest["source_model"])
+    timings["warm_cache"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    knowledge_base.query("livestock symptoms: fever, loss of appetite")  # First query pages in the hot parts
+    timings["first_query"] = time.perf_counter() - stage_start
+    check_memory("first query", memory_cap_mb)
+
+    report = {
+        "startup_seconds": round(time.perf_counter() - start, 2),
+        **{f"{stage}_seconds": round(seconds, 3) for stage, seconds in timings.items()},
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "memory_cap_mb": memory_cap_mb,
+        "bundle_mb": round(sum(manifest["bytes"].values()) / 2**20, 1),
+    }
+    logger.info(f"📦 Edge bundle ready in {report['startup_seconds']}s, peak RSS {report['peak_rss_mb']} MiB "
+                f"(cap {memory_cap_mb} MiB): {report}")
+    return EdgeBundle(knowledge_base, warm_cache, manifest, report)
+
+def main():
+    """Export an edge bundle, or load one and report startup time and peak memory."""
+    parser = argparse.ArgumentParser(description="Offline edge bundle")
+    parser.add_argument("command", choices=["export", "report"])
+    parser.add_argument("--bundle", default=EDGE_BUNDLE_DIR, help="Bundle directory")
+    parser.add_argument("--index", default=PINECONE_INDEX_NAME, help="Index alias to export")
+    parser.add_argument("--encoder", default=EMBEDDING_MODEL,
+                        help="Query encoder; a different (smaller) model re-embeds every chunk")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep the encoder in full precision")
+    parser.add_argument("--memory-cap-mb", type=float, default=EDGE_MEMORY_CAP_MB)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export_bundle(args.bundle, index_name=args.index, encoder_model=args.encoder,
+                                 quantize=not args.no_quantize)
+        logger.info(f"Manifest: {json.dumps(manifest, indent=2)}")
+    else:
+        # Run in a fresh process: peak RSS counts everything loaded before the bundle
+        bundle = load_bundle(args.bundle, args.memory_cap_mb)
+        print(json.dumps(bundle.report, indent=2))
+
+if __name__ == "__main__":
+    main()
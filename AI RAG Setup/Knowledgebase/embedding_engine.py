@@ -0,0 +1,317 @@
+import os
+import time
+import argparse
+import threading
+import logging
+import numpy as np
+import torch
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Memory for activations on top of the model weights; empty: 80% of free GPU memory, or 1 GiB on CPU
+EMBED_MEMORY_CEILING_MB = os.getenv('EMBED_MEMORY_CEILING_MB', '')
+EMBED_MAX_BATCH = int(os.getenv('EMBED_MAX_BATCH', '256'))
+# Encoder processes (1: encode in the calling process); on GPU machines one per device is typical
+EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', '1'))
+
+CPU_MEMORY_CEILING_MB = 1024
+# Padded tokens per batch tried while tuning; the fastest one that fits in memory is kept
+TOKEN_BUDGETS = (1024, 2048, 4096, 8192, 16384, 32768)
+
+def model_config(embedder):
+    """Transformer config of a SentenceTransformer, or None for other embedders."""
+    try:
+        return embedder[0].auto_model.config
+    except (TypeError, AttributeError, IndexError, KeyError):
+        return None
+
+def is_out_of_memory(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, MemoryError) or "out of memory" in message or "can't allocate memory" in message
+
+class EmbeddingEngine:
+    """Embeds many texts in length-sorted batches sized to a memory ceiling.
+
+    Texts are sorted longest first, so each batch holds texts of similar
+    length and pads little. Batches are sized by a budget of padded tokens:
+    the first batches try each budget in TOKEN_BUDGETS and the one with the
+    best tokens/sec is kept (large batches help on GPU, but are slower on
+    CPU). No batch may exceed the memory ceiling, judged by an activation
+    estimate for the model; on GPU the estimate is corrected from measured
+    peaks, and an out-of-memory error halves the batch and retries.
+    Results are returned in input order.
+
+    With several workers, the length-sorted texts are spread over a pool
+    of encoder processes with `encode_multi_process`, in batches sized by
+    the same budget and ceiling.
+    """
+
+    def __init__(self, embedder, device: str = None, memory_ceiling_mb: float = None,
+                 max_batch: int = EMBED_MAX_BATCH, workers: int = EMBED_WORKERS):
+        """Initialize the engine.
+
+        Args:
+            embedder: SentenceTransformer (or compatible) model
+            device (str): Device to encode on (default: cuda if available)
+            memory_ceiling_mb (float): Activation memory allowed per batch (default: EMBED_MEMORY_CEILING_MB)
+            max_batch (int): Upper bound on the batch size
+            workers (int): Encoder processes; above 1 a pool is started on first use
+        """
+        self.embedder = embedder
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.max_batch = max_batch
+        self.workers = workers
+        self.pool = None
+        self.max_length = getattr(embedder, "max_seq_length", None) or 512
+        self.config = model_config(embedder)
+        self.memory_ceiling = (memory_ceiling_mb or self.default_ceiling_mb()) * 2**20
+        # Measured / estimated memory; grows on OOM, follows measured peaks on GPU
+        self.correction = 1.0
+        self.throughput = {}  # token budget -> real tokens/sec of its last batch
+        self.token_budget = None  # Chosen once every budget has been tried
+        self._lock = threading.Lock()
+        self._counts = {"texts": 0, "batches": 0, "tokens": 0, "padded_tokens": 0, "oom_retries": 0}
+
+    def default_ceiling_mb(self) -> float:
+        if EMBED_MEMORY_CEILING_MB:
+            return float(EMBED_MEMORY_CEILING_MB)
+        if self.device.startswith("cuda"):
+            free, _ = torch.cuda.mem_get_info()
+            return free * 0.8 / 2**20
+        return CPU_MEMORY_CEILING_MB
+
+    def token_lengths(self, texts: list) -> np.ndarray:
+        """Token count per text, truncated as the model would (about 4 characters per token without a tokenizer)."""
+        tokenizer = getattr(self.embedder, "tokenizer", None)
+        if tokenizer is None:
+            lengths = [len(text) // 4 + 2 for text in texts]
+        else:
+            lengths = [len(ids) for ids in tokenizer(texts, add_special_tokens=True, truncation=False)["input_ids"]]
+        return np.minimum(np.asarray(lengths, dtype=np.int64), self.max_length)
+
+    def sequence_bytes(self, length: int) -> float:
+        """Estimated peak activation memory for one sequence of `length` tokens.
+
+        Encoders run layer by layer without gradients, so the peak is one
+        layer's feed-forward and projection activations plus its attention
+        matrix, float32 throughout.
+        """
+        config = self.config
+        if config is None:
+            return length * self.embedder.get_sentence_embedding_dimension() * 4 * 4 * self.correction
+        per_token = (config.intermediate_size + 4 * config.hidden_size) * 4
+        attention = config.num_attention_heads * length * 4
+        return 2 * length * (per_token + attention) * self.correction
+
+    def memory_limit(self, length: int) -> int:
+        """Largest batch of `length`-token sequences that fits under the memory ceiling."""
+        return int(max(1, min(self.max_batch, self.memory_ceiling // self.sequence_bytes(max(1, length)))))
+
+    def next_budget(self) -> int:
+        if self.token_budget is not None:
+            return self.token_budget
+        return next(budget for budget in TOKEN_BUDGETS if budget not in self.throughput)
+
+    def record_throughput(self, budget: int, tokens: int, seconds: float, limited: bool) -> None:
+        """Note a batch's speed; pick the fastest budget once all have been tried."""
+        if self.token_budget is not None or seconds <= 0:
+            return
+        self.throughput[budget] = tokens / seconds
+        if limited or len(self.throughput) == len(TOKEN_BUDGETS):
+            # Larger budgets would be capped by memory (or are all measured): settle now
+            self.token_budget = max(self.throughput, key=self.throughput.get)
+            logger.info(f"Embedding batch budget: {self.token_budget} tokens "
+                        f"({self.throughput[self.token_budget]:.0f} tokens/s)")
+
+    def batch_size_for(self, length: int, budget: int) -> tuple:
+        """Batch size for a padded length and whether memory, not the budget, limited it."""
+        by_budget, by_memory = max(1, budget // max(1, length)), self.memory_limit(length)
+        return min(by_budget, by_memory), by_memory < by_budget
+
+    def _encode(self, texts: list) -> np.ndarray:
+        embeddings = self.embedder.encode(
+            texts,
+            batch_size=len(texts),
+            show_progress_bar=False,
+            convert_to_tensor=True,
+            device=self.device
+        )
+        return embeddings.float().cpu().numpy()
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Embed texts, returning one row per text in input order.
+
+        Args:
+            texts (list): Texts to embed
+
+        Returns:
+            np.ndarray: (len(texts), dimension) float32 embeddings
+        """
+        if not texts:
+            return np.zeros((0, self.embedder.get_sentence_embedding_dimension()), dtype=np.float32)
+        lengths = self.token_lengths(texts)
+        order = np.argsort(-lengths, kind="stable")
+        if self.workers > 1:
+            return self._encode_parallel(texts, lengths, order)
+        results = None
+        position = 0
+        while position < len(texts):
+            longest = int(lengths[order[position]])
+            budget = self.next_budget()
+            size, limited = self.batch_size_for(longest, budget)
+            batch = order[position:position + size]
+            gpu = self.device.startswith("cuda")
+            if gpu:
+                torch.cuda.reset_peak_memory_stats()
+                baseline = torch.cuda.memory_allocated()
+            start = time.perf_counter()
+            try:
+                embeddings = self._encode([texts[i] for i in batch])
+            except Exception as e:
+                if not is_out_of_memory(e) or len(batch) == 1:
+                    raise
+                # Scale the estimate so this length now gets half the batch that failed
+                raw = self.sequence_bytes(longest) / self.correction
+                self.correction = max(self.correction * 2, self.memory_ceiling / (raw * max(1, len(batch) // 2)))
+                self._count("oom_retries")
+                logger.warning(f"Out of memory at batch {len(batch)} x {longest} tokens; "
+                               f"retrying with {self.batch_size_for(longest, budget)[0]}")
+                if gpu:
+                    torch.cuda.empty_cache()
+                continue
+
+            # Only full batches are representative of their budget
+            if len(batch) == size:
+                self.record_throughput(budget, int(lengths[batch].sum()), time.perf_counter() - start, limited)
+            if gpu:
+                measured = torch.cuda.max_memory_allocated() - baseline
+                estimated = self.sequence_bytes(longest) * len(batch) / self.correction
+                if estimated > 0 and measured > 0:
+                    self.correction = 0.5 * self.correction + 0.5 * measured / estimated
+            if results is None:
+                results = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            results[batch] = embeddings
+            with self._lock:
+                self._counts["texts"] += len(batch)
+                self._counts["batches"] += 1
+                self._counts["tokens"] += int(lengths[batch].sum())
+                self._counts["padded_tokens"] += longest * len(batch)
+            position += len(batch)
+        return results
+
+    def _encode_parallel(self, texts: list, lengths: np.ndarray, order: np.ndarray) -> np.ndarray:
+        """Encode length-sorted texts on the worker pool and restore input order."""
+        if self.pool is None:
+            devices = [self.device] * self.workers
+            if self.device.startswith("cuda") and torch.cuda.device_count() > 1:
+                devices = [f"cuda:{i % torch.cuda.device_count()}" for i in range(self.workers)]
+            self.pool = self.embedder.start_multi_process_pool(devices)
+            logger.info(f"Started {self.workers} embedding workers on {sorted(set(devices))}")
+        budget = self.token_budget or TOKEN_BUDGETS[len(TOKEN_BUDGETS) // 2]
+        size, _ = self.batch_size_for(int(lengths.max()), budget)
+        # Up to four batches per task, but never so many that a worker is left idle
+        chunk_size = max(1, min(size * 4, -(-len(texts) // self.workers)))
+        step = min(size, chunk_size)  # Texts per batch actually run (a task never spans two)
+        embeddings = self.embedder.encode_multi_process([texts[i] for i in order], self.pool, batch_size=size,
+                                                        chunk_size=chunk_size, show_progress_bar=False)
+        results = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+        results[order] = embeddings
+        with self._lock:
+            self._counts["texts"] += len(texts)
+            self._counts["batches"] += -(-len(texts) // step)
+            self._counts["tokens"] += int(lengths.sum())
+            self._counts["padded_tokens"] += int(sum(lengths[order[i]] * len(order[i:i + step])
+                                                     for i in range(0, len(texts), step)))
+        return results
+
+    def close(self) -> None:
+        """Stop the worker pool, if one was started."""
+        if self.pool is not None:
+            self.embedder.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            **counts,
+            "padding_share": round(1 - counts["tokens"] / counts["padded_tokens"], 3) if counts["padded_tokens"] else 0.0,
+            "avg_batch": round(counts["texts"] / counts["batches"], 1) if counts["batches"] else 0.0,
+            "correction": round(self.correction, 3),
+            "token_budget": self.token_budget,
+            "workers": self.workers,
+        }
+
+def fixed_batches(embedder, texts: list, batch_size: int, device: str) -> np.ndarray:
+    """The previous path: fixed slices in document order."""
+    return np.vstack([
+        embedder.encode(texts[i:i + batch_size], batch_size=batch_size, show_progress_bar=False,
+                        convert_to_tensor=True, device=device).cpu().numpy()
+        for i in range(0, len(texts), batch_size)
+    ])
+
+def benchmark(embedder, texts: list, device: str = "cpu", batch_size: int = 32, repeats: int = 1) -> dict:
+    """Embeddings per second of fixed batches versus the engine, on the same texts.
+
+    Args:
+        embedder: Embedding model
+        texts (list): Texts to embed
+        device (str): Device to run on
+        batch_size (int): Batch size of the fixed path
+        repeats (int): Runs per path; the fastest counts
+
+    Returns:
+        dict: Throughput of each path and the largest difference between their embeddings
+    """
+    engine = EmbeddingEngine(embedder, device=device)
+    fixed_batches(embedder, texts[:batch_size], batch_size, device)  # Warm up
+    timings = {"fixed": [], "engine": []}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        reference = fixed_batches(embedder, texts, batch_size, device)
+        timings["fixed"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        embeddings = engine.encode(texts)
+        timings["engine"].append(time.perf_counter() - start)
+    return {
+        "texts": len(texts),
+        "fixed_per_sec": round(len(texts) / min(timings["fixed"]), 1),
+        "engine_per_sec": round(len(texts) / min(timings["engine"]), 1),
+        "speedup": round(min(timings["fixed"]) / min(timings["engine"]), 2),
+        "max_abs_diff": float(np.abs(reference - embeddings).max()),
+        "engine": engine.stats(),
+    }
+
+def main():
+    """Compare the embedding engine with fixed-size batches on the ingested chunks."""
+    from backends import load_embedder, EMBEDDING_MODEL
+    from docstore import DocStore
+
+    parser = argparse.ArgumentParser(description="Embedding engine benchmark")
+    parser.add_argument("--texts", type=int, default=512, help="Chunks to embed")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size of the fixed path")
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    texts = [record["text"] for _, record in zip(range(args.texts), DocStore().iter_records())]
+    if not texts:
+        raise SystemExit("The docstore is empty; run pdf_loader.py first")
+    torch.set_grad_enabled(False)
+    report = benchmark(load_embedder(EMBEDDING_MODEL), texts, args.device, args.batch_size, args.repeats)
+    logger.info(f"📊 {report['texts']} chunks on {args.device}: fixed batches {report['fixed_per_sec']}/s, "
+                f"engine {report['engine_per_sec']}/s ({report['speedup']}x), "
+                f"max difference {report['max_abs_diff']:.2e}")
+    logger.info(f"Engine: {report['engine']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import os
+import re
+import time
+import zlib
+import json
+import argparse
+import logging
+from typing import Dict, List
+import numpy as np
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Served embedding model; every module reads the model and its dimension from this registry
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'intfloat/multilingual-e5-large')
+# Dimension of EMBEDDING_MODEL when it is not in KNOWN_DIMENSIONS
+EMBEDDING_DIMENSION_OVERRIDE = os.getenv('EMBEDDING_DIMENSION', '')
+# Further models with side-by-side indexes, comma-separated; "name:dimension" for unlisted models
+EMBEDDING_MODELS = os.getenv('EMBEDDING_MODELS', '')
+# Share of queries per further model, e.g. "intfloat/multilingual-e5-small=0.1"; the rest use EMBEDDING_MODEL
+EMBEDDING_TRAFFIC = os.getenv('EMBEDDING_TRAFFIC', '')
+
+KNOWN_DIMENSIONS = {
+    "intfloat/multilingual-e5-large": 1024,
+    "intfloat/multilingual-e5-base": 768,
+    "intfloat/multilingual-e5-small": 384,
+    "intfloat/e5-large-v2": 1024,
+    "intfloat/e5-base-v2": 768,
+    "intfloat/e5-small-v2": 384,
+    "BAAI/bge-m3": 1024,
+    "BAAI/bge-small-en-v1.5": 384,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+}
+MAX_INDEX_NAME = 45  # Pinecone's limit
+
+class EmbeddingModel:
+    """A registered embedding model and where its vectors live."""
+
+    def __init__(self, name: str, dimension: int, primary: bool = False):
+        self.name = name
+        self.dimension = dimension
+        self.primary = primary
+
+    @property
+    def slug(self) -> str:
+        """Index-safe short name: lowercase letters, digits and hyphens."""
+        return re.sub(r"[^a-z0-9]+", "-", os.path.basename(self.name.rstrip("/")).lower()).strip("-")
+
+    def index_name(self, version: str) -> str:
+        """Index holding this model's vectors for an index version; the served model's are the version itself.
+
+        Each version gets its own, so after a switch or rollback a model
+        never answers with ids from another version. Names too long for
+        the slug use a hash of the model name instead.
+        """
+        if self.primary:
+            return version
+        name = f"{version}-{self.slug}"
+        if len(name) > MAX_INDEX_NAME:
+            name = f"{version}-{text_hash(self.name)}"
+        return name[:MAX_INDEX_NAME]
+
+    def __repr__(self):
+        return f"EmbeddingModel({self.name!r}, {self.dimension})"
+
+def parse_models(primary: str = EMBEDDING_MODEL, extras: str = EMBEDDING_MODELS,
+                 primary_dimension: str = EMBEDDING_DIMENSION_OVERRIDE) -> Dict[str, EmbeddingModel]:
+    """Build the registry: the served model first, then the extra models in the order given.
+
+    Raises:
+        ValueError: If a model's dimension is unknown
+    """
+    registry = {}
+    dimension = int(primary_dimension) if primary_dimension else KNOWN_DIMENSIONS.get(primary)
+    if dimension is None:
+        raise ValueError(f"Unknown dimension for {primary}; set EMBEDDING_DIMENSION")
+    registry[primary] = EmbeddingModel(primary, dimension, primary=True)
+    for entry in filter(None, (part.strip() for part in extras.split(","))):
+        name, _, dimension = entry.rpartition(":") if re.search(r":\d+$", entry) else (entry, "", "")
+        dimension = int(dimension) if dimension else KNOWN_DIMENSIONS.get(name)
+        if dimension is None:
+            raise ValueError(f"Unknown dimension for {name}; register it as {name}:<dimension>")
+        registry.setdefault(name, EmbeddingModel(name, dimension))
+    return registry
+
+REGISTRY = parse_models()
+EMBEDDING_DIMENSION = REGISTRY[EMBEDDING_MODEL].dimension
+
+def get_model(name: str = EMBEDDING_MODEL) -> EmbeddingModel:
+    if name not in REGISTRY:
+        raise ValueError(f"Embedding model {name} is not registered; add it to EMBEDDING_MODELS")
+    return REGISTRY[name]
+
+def dimension_of(name: str):
+    """Dimension of a registered or well-known model, or None."""
+    return REGISTRY[name].dimension if name in REGISTRY else KNOWN_DIMENSIONS.get(name)
+
+def secondary_models() -> List[EmbeddingModel]:
+    return [model for model in REGISTRY.values() if not model.primary]
+
+def parse_traffic(spec: str = EMBEDDING_TRAFFIC) -> Dict[str, float]:
+    """Query share per model, with the served model taking what is left.
+
+    Raises:
+        ValueError: For unregistered models or shares that add up to more than 1
+    """
+    shares = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, share = entry.rpartition("=")
+        get_model(name)
+        shares[name] = float(share)
+    if any(share < 0 for share in shares.values()) or sum(shares.values()) > 1:
+        raise ValueError(f"Invalid EMBEDDING_TRAFFIC {spec!r}: shares must be non-negative and add up to at most 1")
+    shares[EMBEDDING_MODEL] = round(1.0 - sum(share for name, share in shares.items() if name != EMBEDDING_MODEL), 6)
+    return shares
+
+def route(question: str, traffic: Dict[str, float]) -> str:
+    """Model for a question: a hash of the text picks the bucket, so a repeated question gets the same model."""
+    bucket = zlib.crc32(question.encode("utf-8")) / 2**32
+    cumulative = 0.0
+    for name in sorted(name for name in traffic if name != EMBEDDING_MODEL):
+        cumulative += traffic[name]
+        if bucket < cumulative:
+            return name
+    return EMBEDDING_MODEL
+
+def text_hash(text: str) -> str:
+    return f"{zlib.crc32(text.encode('utf-8')):08x}"
+
+def sync_model_index(name: str, alias: str = None, batch_size: int = 64, version: tuple = None) -> dict:
+    """Bring a model's index for an index version in line with that version's docstore.
+
+    Chunks are embedded from the docstore text, so every model indexes
+    exactly the same chunks under the same ids. Each vector carries a hash
+    of its text, so chunks rewritten under the same id (a re-ingested
+    document) are embedded again; chunks the docstore no longer holds
+    are deleted.
+
+    Args:
+        name (str): Registered model
+        alias (str): Index alias whose docstore is the source (default: PINECONE_INDEX_NAME)
+        batch_size (int): Vectors per upsert
+        version (tuple): (index name, docstore path) to sync (default: the version `alias` serves)
+
+    Returns:
+        dict: Vectors embedded and removed per namespace
+    """
+    # Imported here: backends reads its defaults from this module
+    from backends import load_embedder, open_index, PINECONE_INDEX_NAME
+    from docstore import open_docstore
+    from embedding_engine import EmbeddingEngine
+    from index_versions import current_version, create_index
+
+    alias = alias or PINECONE_INDEX_NAME
+    model = get_model(name)
+    version, docstore_path = version or current_version(alias)
+    docstore = open_docstore(docstore_path)
+    index = create_index(model.index_name(version), model.dimension)
+    engine = EmbeddingEngine(load_embedder(model.name))
+    start = time.time()
+
+    changes = {}
+    for namespace in sorted(open_index(version).describe_index_stats().namespaces):
+        ids = [vector_id for page in index.list(namespace=namespace) for vector_id in page]
+        stored = {}
+        for i in range(0, len(ids), 100):
+            fetched = index.fetch(ids=ids[i:i + 100], namespace=namespace).vectors
+            stored.update({vector_id: (vector.metadata or {}).get("text_hash") for vector_id, vector in fetched.items()})
+        records = list(docstore.iter_records(namespace))
+        missing = [record for record in records if stored.get(record["id"]) != text_hash(record["text"])]
+        stale = list(set(stored) - {record["id"] for record in records})
+        for i in range(0, len(missing), 1024):
+            batch = missing[i:i + 1024]
+            embeddings = engine.encode([record["text"] for record in batch])
+            vectors = [(record["id"], embedding.tolist(),
+                        {**{k: v for k, v in record.items() if k not in ("id", "text")},
+                         "text_hash": text_hash(record["text"])})
+                       for record, embedding in zip(batch, embeddings)]
+            for j in range(0, len(vectors), batch_size):
+                index.upsert(vectors=vectors[j:j + batch_size], namespace=namespace)
+        for i in range(0, len(stale), 1000):
+            index.delete(ids=stale[i:i + 1000], namespace=namespace)
+        changes[namespace] = {"embedded": len(missing), "removed": len(stale)}
+    if hasattr(index, "save"):
+        index.save()
+    logger.info(f"✅ Synced {model.index_name(version)} ({model.name}) in {time.time() - start:.2f}s: {changes}")
+    return changes
+
+def probe_queries(docstore, count: int = 200, namespace: str = "", words: int = 12) -> List[dict]:
+    """Known-item queries: a run of words from the middle of sampled chunks, expecting that chunk back."""
+    records = [record for record in docstore.iter_records(namespace) if len(record["text"].split()) >= words * 2]
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(records), min(count, len(records)), replace=False) if records else []
+    probes = []
+    for i in sample:
+        tokens = records[i]["text"].split()
+        start = len(tokens) // 3
+        probes.append({"query": " ".join(tokens[start:start + words]), "id": records[i]["id"]})
+    return probes
+
+def is_hit(probe: dict, matches: list) -> bool:
+    """A known-item probe hits when its chunk is returned; a labelled one when its document (and page) is."""
+    if "id" in probe:
+        return any(match.id == probe["id"] for match in matches)
+    return any(match.metadata.get("doc_id") == probe["doc_id"]
+               and (probe.get("page") is None or match.metadata.get("page") == probe["page"]) for match in matches)
+
+def compare_models(knowledge_base, probes: List[dict], models: List[str] = None, top_k: int = 5) -> List[dict]:
+    """Hit rate, reciprocal rank and end-to-end latency per model on the same probe queries.
+
+    Args:
+        knowledge_base (KnowledgeBase): Knowledge base to query through
+        probes (List[dict]): {"query", "id"} or {"query", "doc_id", "page"} entries
+        models (List[str]): Models to compare (default: every registered model)
+        top_k (int): Results per query
+
+    Returns:
+        List[dict]: One row per model
+    """
+    # Imported here: generation_gateway pulls in the generation stack's config
+    from generation_gateway import percentile
+
+    rows = []
+    for name in models or list(REGISTRY):
+        if name != EMBEDDING_MODEL and knowledge_base.model_arm(name) is None:
+            raise ValueError(f"No {name} index for the served version; run embedding_models.py sync")
+        knowledge_base.query(probes[0]["query"], top_k=top_k, model=name)  # Load the model before timing
+        latencies, hits, reciprocal_ranks = [], 0, 0.0
+        for probe in probes:
+            start = time.perf_counter()
+            matches = knowledge_base.query(probe["query"], top_k=top_k, model=name)
+            latencies.append(time.perf_counter() - start)
+            for rank, match in enumerate(matches, 1):
+                if is_hit(probe, [match]):
+                    hits += 1
+                    reciprocal_ranks += 1 / rank
+                    break
+        rows.append({
+            "model": name,
+            "dimension": REGISTRY[name].dimension,
+            "hit_rate": round(hits / len(probes), 3),
+            "mrr": round(reciprocal_ranks / len(probes), 3),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        })
+    return rows
+
+def main():
+    """List registered models, sync their indexes, or compare them side by side."""
+    parser = argparse.ArgumentParser(description="Embedding model registry")
+    parser.add_argument("command", choices=["list", "sync", "report"])
+    parser.add_argument("--model", action="append", help="Model to sync or compare (default: all registered)")
+    parser.add_argument("--probes", type=int, default=200, help="Known-item queries sampled from the docstore")
+    parser.add_argument("--queries", help="JSONL of labelled {\"query\", \"doc_id\", \"page\"} queries instead")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        from backends import PINECONE_INDEX_NAME
+        from index_versions import current_version
+        traffic = parse_traffic()
+        version, _ = current_version(PINECONE_INDEX_NAME)
+        for model in REGISTRY.values():
+            print(f"{model.name:45} {model.dimension:>5}  {model.index_name(version):45} "
+                  f"{traffic.get(model.name, 0.0):.0%} of queries")
+    elif args.command == "sync":
+        for model in args.model or [model.name for model in secondary_models()]:
+            sync_model_index(model)
+    else:
+        from query_knowledge import KnowledgeBase
+        knowledge_base = KnowledgeBase()
+        if args.queries:
+            with open(args.queries, encoding="utf-8") as f:
+                probes = [json.loads(line) for line in f if line.strip()]
+        else:
+            probes = probe_queries(knowledge_base.docstore, args.probes)
+        if not probes:
+            raise SystemExit("No probe queries; ingest documents first")
+        rows = compare_models(knowledge_base, probes, args.model, args.top_k)
+        print(f"\n{len(probes)} queries, top {args.top_k}")
+        print(f"{'model':45}{'dim':>6}{'hit rate':>10}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}")
+        for row in rows:
+            print(f"{row['model']:45}{row['dimension']:>6}{row['hit_rate']:>10.3f}{row['mrr']:>7.3f}"
+                  f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import time
+import argparse
+import threading
+import logging
+from typing import List, Tuple
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Written by `main()`; takes precedence over EXTRACTIVE_THRESHOLD when present
+THRESHOLD_PATH = os.path.join(BASE_DIR, os.getenv('EXTRACTIVE_THRESHOLD_PATH', 'extractive_threshold.json'))
+EXTRACTIVE_THRESHOLD = float(os.getenv('EXTRACTIVE_THRESHOLD', '0.88'))
+EXTRACTIVE_MAX_PASSAGES = int(os.getenv('EXTRACTIVE_MAX_PASSAGES', '2'))
+
+# Questions asking for a fact that one passage can state
+FACTUAL_QUESTION = re.compile(r"^\s*(what|which|when|where|who|how (much|many|long|often|soon|old)|is|are|does|do|can)\b",
+                              re.IGNORECASE)
+# Explanations and comparisons need an answer composed from several sources
+EXPLANATION = re.compile(r"\b(why|explain|compare|difference|versus|vs)\b", re.IGNORECASE)
+# Questions about the conversation itself need the previous analysis, which passages cannot quote
+REFERS_TO_ANALYSIS = re.compile(r"\b(you|your|above|earlier|previous(ly)?|mentioned|suggested|recommended|said)\b"
+                                r"|\b(this|that|the) (diagnosis|analysis|recommendation|suggestion|treatment)\b",
+                                re.IGNORECASE)
+
+def load_threshold() -> float:
+    """Return the calibrated threshold if one has been saved, else EXTRACTIVE_THRESHOLD."""
+    if os.path.exists(THRESHOLD_PATH):
+        with open(THRESHOLD_PATH, encoding="utf-8") as f:
+            return float(json.load(f)["threshold"])
+    return EXTRACTIVE_THRESHOLD
+
+def is_factual_lookup(question: str) -> bool:
+    """Whether a question asks for a fact that quoted passages can answer on their own.
+
+    "How long is the milk withdrawal period?" qualifies; "Why did you
+    suggest antibiotics?" or "Explain the difference between..." do not.
+    """
+    return (bool(FACTUAL_QUESTION.match(question)) and not EXPLANATION.search(question)
+            and not REFERS_TO_ANALYSIS.search(question))
+
+def format_passages(matches: list, threshold: float, max_passages: int = EXTRACTIVE_MAX_PASSAGES) -> str:
+    """Quote the best passages above the threshold with their source and page.
+
+    Args:
+        matches (list): Hydrated matches sorted by score
+        threshold (float): Minimum score for a passage to be quoted
+        max_passages (int): Maximum number of passages
+
+    Returns:
+        str: Answer text, or "" if no passage clears the threshold
+    """
+    passages = []
+    for match in matches[:max_passages]:
+        if match.score < threshold:
+            break
+        metadata = match.metadata
+        source = metadata.get("doc_id", "knowledge base")
+        page = f", page {metadata['page']}" if metadata.get("page") else ""
+        passages.append(f"From {source}{page} (match {match.score:.2f}):\n{metadata['text'].strip()}")
+    return "\n\n".join(passages)
+
+def calibrate_threshold(samples: List[Tuple[float, bool]], target_precision: float = 0.9) -> float:
+    """Lowest score threshold whose retained samples are correct often enough.
+
+    Args:
+        samples (List[Tuple[float, bool]]): (top retrieval score, top passage answers the question)
+        target_precision (float): Required share of correct answers above the threshold
+
+    Returns:
+        float: Threshold, or 1.01 (never answer extractively) if none qualifies
+    """
+    ordered = sorted(samples, key=lambda sample: sample[0], reverse=True)
+    best, correct = 1.01, 0
+    for i, (score, is_correct) in enumerate(ordered, 1):
+        correct += is_correct
+        if correct / i >= target_precision:
+            best = score
+    return best
+
+class FastPathStats:
+    """Counts and latencies for answers served with and without a generation call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.extractive = []
+        self.generated = []
+
+    def record(self, extractive: bool, seconds: float) -> None:
+        with self._lock:
+            (self.extractive if extractive else self.generated).append(seconds)
+
+    def report(self) -> dict:
+        """Share of traffic served without an LLM call and the latency saved."""
+        with self._lock:
+            extractive, generated = list(self.extractive), list(self.generated)
+        total = len(extractive) + len(generated)
+        avg_extractive = sum(extractive) / len(extractive) if extractive else 0.0
+        avg_generated = sum(generated) / len(generated) if generated else 0.0
+        return {
+            "requests": total,
+            "extractive": len(extractive),
+            "share_without_llm": round(len(extractive) / total, 3) if total else 0.0,
+            "avg_extractive_sec": round(avg_extractive, 3),
+            "avg_generated_sec": round(avg_generated, 3),
+            # Each extractive answer saved roughly one average generation
+            "latency_saved_sec": round(len(extractive) * max(0.0, avg_generated - avg_extractive), 2),
+        }
+
+# Shared by every assistant in the process
+fast_path_stats = FastPathStats()
+
+def main():
+    """Calibrate the extractive threshold from labelled questions.
+
+    Input is JSONL with {"question": ..., "answer": ...} where `answer` is
+    a phrase the correct passage contains, optionally with "doc_id" and
+    "page" to pin the expected source.
+    """
+    from query_knowledge import KnowledgeBase
+
+    parser = argparse.ArgumentParser(description="Calibrate the extractive answer threshold")
+    parser.add_argument("labelled", help="JSONL file of labelled questions")
+    parser.add_argument("--precision", type=float, default=0.9, help="Target precision")
+    args = parser.parse_args()
+
+    kb = KnowledgeBase()
+    samples = []
+    with open(args.labelled, encoding="utf-8") as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    start = time.time()
+    for example in examples:
+        matches = kb.query(example["question"], top_k=1)
+        if not matches:
+            continue
+        top = matches[0].metadata
+        correct = example["answer"].lower() in top["text"].lower()
+        if "doc_id" in example:
+            correct = correct and top.get("doc_id") == example["doc_id"]
+        if "page" in example:
+            correct = correct and top.get("page") == example["page"]
+        samples.append((matches[0].score, correct))
+
+    threshold = calibrate_threshold(samples, args.precision)
+    covered = sum(1 for score, _ in samples if score >= threshold)
+    result = {
+        "threshold": threshold,
+        "target_precision": args.precision,
+        "examples": len(samples),
+        "coverage": round(covered / len(samples), 3) if samples else 0.0,
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(THRESHOLD_PATH, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    logger.info(f"✅ Calibrated on {len(samples)} questions in {time.time() - start:.2f}s: {result}")
+
+if __name__ == "__main__":
+    main()
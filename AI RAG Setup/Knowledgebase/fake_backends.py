@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import numpy as np
+import torch
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+FAKE_EMBED_LATENCY_MS = float(os.getenv('FAKE_EMBED_LATENCY_MS', '5'))
+FAKE_GENERATE_LATENCY_MS = float(os.getenv('FAKE_GENERATE_LATENCY_MS', '300'))
+
+# Small corpus used to seed an empty local index when running with fake backends
+SAMPLE_PASSAGES = [
+    "Mastitis is inflammation of the udder, usually caused by bacterial infection. Signs include a warm, "
+    "swollen udder, clots or flakes in the milk and reduced milk production. Treat with intramammary "
+    "antibiotics as directed by a veterinarian and observe the milk withdrawal period.",
+    "Lameness in dairy cattle is often caused by foot rot, digital dermatitis or sole ulcers. Regular hoof "
+    "trimming, clean dry footing and footbaths reduce the incidence of lameness.",
+    "Fever with loss of appetite can indicate respiratory disease, metritis or other infections. Record the "
+    "rectal temperature; a temperature above 39.5 C warrants veterinary examination.",
+    "Bloat is the accumulation of gas in the rumen. Animals show a distended left flank and discomfort. "
+    "Frothy bloat on legume pasture may be prevented with anti-bloat agents and gradual pasture introduction.",
+    "Milk from treated cows must be withheld for the full withdrawal period stated on the drug label "
+    "before it can enter the bulk tank.",
+    "Producers must keep treatment records for at least two years, including the animal id, drug, dose, "
+    "route of administration, date and withdrawal time.",
+]
+
+class FakeEmbedder:
+    """Deterministic stand-in for SentenceTransformer.
+
+    Words are hashed into a fixed number of buckets (signed bag of words),
+    so texts sharing vocabulary get similar vectors without loading a model.
+    """
+
+    def __init__(self, model_name: str = "fake", dimension: int = 1024):
+        self.model_name = model_name
+        self.dimension = dimension
+
+    def to(self, device):
+        return self
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = int(hashlib.md5(word.encode()).hexdigest(), 16)
+            vector[digest % self.dimension] += 1.0 if (digest >> 64) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, convert_to_tensor: bool = False, batch_size: int = 32,
+               show_progress_bar: bool = False, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        time.sleep(FAKE_EMBED_LATENCY_MS / 1000.0 * max(1, len(texts) // batch_size))
+        embeddings = np.vstack([self._embed_one(text) for text in texts]) if texts \
+            else np.zeros((0, self.dimension), dtype=np.float32)
+        if single:
+            embeddings = embeddings[0]
+        return torch.from_numpy(embeddings) if convert_to_tensor else embeddings
+
+class FakeImageEmbedder:
+    """Deterministic stand-in for a CLIP image encoder.
+
+    An image is embedded as its 16x16 grayscale thumbnail, so identical
+    photos match exactly and similar ones score high, without loading a model.
+    """
+
+    def __init__(self, model_name: str = "fake-clip"):
+        self.model_name = model_name
+
+    def encode(self, images, normalize_embeddings: bool = False, show_progress_bar: bool = False, **kwargs):
+        time.sleep(FAKE_EMBED_LATENCY_MS / 1000.0)
+        embeddings = np.vstack([
+            np.asarray(image.convert("L").resize((16, 16)), dtype=np.float32).ravel() for image in images
+        ])
+        embeddings -= embeddings.mean(axis=1, keepdims=True)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1, norms)
+        return embeddings
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel that answers after a fixed delay.
+
+    The answer contains every analysis section so the model router treats
+    it as complete.
+    """
+
+    def __init__(self, model_name: str = "fake-model"):
+        self.model_name = model_name
+
+    def generate_content(self, content, **kwargs) -> FakeResponse:
+        time.sleep(FAKE_GENERATE_LATENCY_MS / 1000.0)
+        prompt = content[0] if isinstance(content, list) else str(content)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        return FakeResponse(
+            f"[{self.model_name} response {digest}]\n"
+            "1. Possible Diagnoses: mastitis (85% confidence), udder oedema (10% confidence).\n"
+            "2. Recommended Actions: isolate the animal, strip affected quarters and check milk for clots.\n"
+            "3. Prevention Measures: keep bedding clean and dry, use post-milking teat dip.\n"
+            "4. When to Contact a Veterinarian: if fever develops or milk changes persist beyond 24 hours."
+        )
+
+def seed_index(index, docstore, embedder, namespace: str = "") -> int:
+    """Fill an empty local index from the docstore, or from SAMPLE_PASSAGES.
+
+    Args:
+        index: Index with an `upsert` method
+        docstore (DocStore): Chunk text store
+        embedder: Embedder with an `encode` method
+        namespace (str): Namespace to fill
+
+    Returns:
+        int: Number of vectors written
+    """
+    if docstore.count(namespace) == 0:
+        docstore.put_many([
+            {"id": f"sample_chunk_{i}", "text": text, "doc_id": "sample", "chunk_index": i,
+             "source_type": "veterinary_guide", "topic": "herd_health"}
+            for i, text in enumerate(SAMPLE_PASSAGES)
+        ], namespace=namespace)
+
+    records = list(docstore.iter_records(namespace))
+    embeddings = embedder.encode([record["text"] for record in records])
+    index.upsert(vectors=[
+        (record["id"], embedding.tolist(),
+         {k: v for k, v in record.items() if k not in ("id", "text")})
+        for record, embedding in zip(records, embeddings)
+    ], namespace=namespace)
+    logger.info(f"Seeded local index with {len(records)} chunks")
+    return len(records)
@@ -0,0 +1,308 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+from prompt_cache import CachedPrompt, get_context_cache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '60'))
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '1000000'))
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+
+# Gemini bills a fixed number of tokens per inline image
+IMAGE_TOKENS = 258
+# Number of recent queue wait times kept for percentiles
+WAIT_SAMPLES = 1000
+
+def content_key(content) -> str:
+    """Hash a prompt (string, list of parts or CachedPrompt) so identical requests collide."""
+    digest = hashlib.sha256()
+    if isinstance(content, CachedPrompt):
+        content = content.parts()
+    parts = content if isinstance(content, list) else [content]
+    for part in parts:
+        if isinstance(part, dict):
+            digest.update(part.get("mime_type", "").encode())
+            digest.update(part.get("data", b""))
+        else:
+            digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+def estimate_tokens(content) -> int:
+    """Rough input token count (about 4 characters per token)."""
+    if isinstance(content, CachedPrompt):
+        content = content.parts()  # Cached tokens still count toward the per-minute limit
+    parts = content if isinstance(content, list) else [content]
+    return sum(IMAGE_TOKENS if isinstance(part, dict) else len(str(part)) // 4 + 1 for part in parts)
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile of a sequence (0.0 if empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """Bucket refilled continuously at `per_minute`, holding at most one minute's worth."""
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+class GenerationGateway:
+    """Single entry point for generation calls to one model.
+
+    Identical in-flight prompts share one provider call, requests and
+    input tokens are limited per minute with token buckets, and queued
+    requests are served round-robin across sessions so one busy session
+    cannot starve the others.
+    """
+
+    def __init__(self, model, requests_per_minute: int = GEMINI_RPM,
+                 tokens_per_minute: int = GEMINI_TPM, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 context_cache=None):
+        """Initialize the gateway.
+
+        Args:
+            model: Object with a `generate_content` method (e.g. genai.GenerativeModel)
+            requests_per_minute (int): Request rate limit
+            tokens_per_minute (int): Input token rate limit
+            max_concurrency (int): Maximum concurrent provider calls
+            context_cache (ContextCache): Sends CachedPrompts and counts cached prefix tokens (default: the shared one)
+        """
+        self.model = model
+        self.context_cache = context_cache or get_context_cache()
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.slots = threading.Semaphore(max_concurrency)
+
+        self._lock = threading.Condition()
+        self._queues = OrderedDict()  # session_id -> deque of pending requests
+        self._inflight = {}  # content key -> Future
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._stats = {"submitted": 0, "coalesced": 0, "completed": 0, "failed": 0, "expired": 0,
+                       "throttled_sec": 0.0}
+        self._running = True
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="generation-gateway", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, content, session_id: str = "default") -> Future:
+        """Queue a generation request.
+
+        Args:
+            content: Prompt string or list of prompt parts
+            session_id (str): Caller's session, used for fair queueing
+
+        Returns:
+            Future: Resolves to the provider response
+        """
+        key = content_key(content)
+        with self._lock:
+            self._stats["submitted"] += 1
+            if key in self._inflight:
+                self._stats["coalesced"] += 1
+                self._inflight[key].waiters += 1
+                return self._inflight[key]
+
+            future = Future()
+            future.dispatched = threading.Event()  # Set once the request holds a slot and is sent
+            future.waiters = 1  # Callers sharing this future; it leaves the queue when all give up
+            self._inflight[key] = future
+            request = {"key": key, "content": content, "tokens": estimate_tokens(content),
+                       "future": future, "queued_at": time.monotonic()}
+            self._queues.setdefault(session_id, deque()).append(request)
+            self._lock.notify()
+            return future
+
+    def generate(self, content, session_id: str = "default", timeout: float = None):
+        """Submit a request and wait for the response.
+
+        Args:
+            content: Prompt string or list of prompt parts
+            session_id (str): Caller's session, used for fair queueing
+            timeout (float): Seconds to wait for the response, time queued behind other
+                requests and rate limits included (default: no limit)
+
+        Raises:
+            TimeoutError: The provider did not answer within `timeout`
+        """
+        future = self.submit(content, session_id)
+        if timeout is None:
+            return future.result()
+        expires = time.monotonic() + timeout
+        if not future.dispatched.wait(timeout):
+            self._withdraw(future)
+            raise TimeoutError(f"Generation request was still queued after {timeout:.2f}s")
+        return future.result(timeout=max(0.0, expires - time.monotonic()))
+
+    def _withdraw(self, future: Future) -> None:
+        """Drop a caller's interest in a queued request, removing it once no caller is left."""
+        with self._lock:
+            future.waiters -= 1
+            if future.waiters > 0:
+                return
+            for session_id, queue in self._queues.items():
+                request = next((request for request in queue if request["future"] is future), None)
+                if request is not None:
+                    break
+            else:
+                return  # Taken by the dispatcher, which drops it unless already sent
+            queue.remove(request)
+            if not queue:
+                del self._queues[session_id]
+            del self._inflight[request["key"]]
+            self._stats["expired"] += 1
+        future.cancel()
+
+    def _next_request(self) -> dict:
+        # Round-robin: take one request from the first session, then move it to the back
+        session_id, queue = next(iter(self._queues.items()))
+        request = queue.popleft()
+        del self._queues[session_id]
+        if queue:
+            self._queues[session_id] = queue
+        return request
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            # Take a request only once it can be sent, so it stays withdrawable while calls are busy
+            self.slots.acquire()
+            with self._lock:
+                while self._running and not self._queues:
+                    self._lock.wait()
+                if not self._running:
+                    self.slots.release()
+                    return
+                request = self._next_request()
+
+            while True:
+                with self._lock:
+                    delay = max(self.request_bucket.wait_time(1),
+                                self.token_bucket.wait_time(request["tokens"]))
+                    if delay == 0.0:
+                        self.request_bucket.consume(1)
+                        self.token_bucket.consume(request["tokens"])
+                        break
+                    self._stats["throttled_sec"] += delay
+                time.sleep(delay)
+
+            with self._lock:
+                abandoned = request["future"].waiters == 0
+                if abandoned:
+                    self._inflight.pop(request["key"], None)
+                    self._stats["expired"] += 1
+                else:
+                    self._waits.append(time.monotonic() - request["queued_at"])
+            if abandoned:
+                # Every caller timed out while it waited for the rate limits
+                request["future"].cancel()
+                self.slots.release()
+                continue
+            request["future"].dispatched.set()
+            self.executor.submit(self._call, request)
+
+    def _call(self, request: dict) -> None:
+        try:
+            content = request["content"]
+            if isinstance(content, CachedPrompt):
+                response = self.context_cache.generate(self.model, content)
+            else:
+                response = self.model.generate_content(content)
+            with self._lock:
+                self._stats["completed"] += 1
+            request["future"].set_result(response)
+        except Exception as e:
+            with self._lock:
+                self._stats["failed"] += 1
+            request["future"].set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(request["key"], None)
+            self.slots.release()
+
+    def metrics(self) -> dict:
+        """Queue depth, in-flight calls, coalescing and wait-time statistics."""
+        with self._lock:
+            waits = list(self._waits)
+            queued = {session_id: len(queue) for session_id, queue in self._queues.items()}
+            return {
+                **self._stats,
+                "queue_depth": sum(queued.values()),
+                "queued_by_session": queued,
+                "in_flight": len(self._inflight) - sum(queued.values()),
+                "wait_p50_sec": round(percentile(waits, 0.50), 4),
+                "wait_p95_sec": round(percentile(waits, 0.95), 4),
+                "wait_max_sec": round(max(waits), 4) if waits else 0.0,
+            }
+
+    def close(self) -> None:
+        """Stop dispatching, fail queued requests and wait for in-flight calls to finish."""
+        with self._lock:
+            self._running = False
+            self._lock.notify_all()
+        self._dispatcher.join()
+        with self._lock:
+            for queue in self._queues.values():
+                for request in queue:
+                    self._inflight.pop(request["key"], None)
+                    request["future"].set_exception(RuntimeError("Generation gateway closed"))
+                    request["future"].dispatched.set()
+            self._queues.clear()
+        self.executor.shutdown(wait=True)
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+def get_gateway(model) -> GenerationGateway:
+    """Return the process-wide gateway for a model, creating it on first use.
+
+    Rate limits apply per model and per API key, so every caller in the
+    process should share one gateway per model.
+    """
+    name = getattr(model, "model_name", repr(model))
+    with _gateways_lock:
+        if name not in _gateways:
+            _gateways[name] = GenerationGateway(model)
+        return _gateways[name]
+
+def gateway_metrics() -> dict:
+    """Metrics for every gateway in the process, keyed by model name."""
+    with _gateways_lock:
+        gateways = dict(_gateways)
+    return {name: gateway.metrics() for name, gateway in gateways.items()}
+
+def close_gateways() -> None:
+    """Close every gateway in the process (used on shutdown)."""
+    with _gateways_lock:
+        gateways = list(_gateways.values())
+        _gateways.clear()
+    for gateway in gateways:
+        gateway.close()
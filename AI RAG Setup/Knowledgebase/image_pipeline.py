@@ -0,0 +1,214 @@
+import os
+import io
+import hashlib
+import sqlite3
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+from backends import load_image_embedder
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EMBEDDING_MODEL = os.getenv('IMAGE_EMBEDDING_MODEL', 'clip-ViT-B-32')
+IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', '1024'))
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(25 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+IMAGE_CACHE_PATH = os.path.join(BASE_DIR, os.getenv('IMAGE_CACHE_PATH', 'image_cache.db'))
+# Labelled reference photos, one sub-folder per condition (e.g. ReferenceImages/foot_rot/*.jpg)
+REFERENCE_IMAGES_DIR = os.path.join(BASE_DIR, os.getenv('REFERENCE_IMAGES_DIR', 'ReferenceImages'))
+
+# Refuse to decode anything larger than this (decompression bombs); checked from the header
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', '60000000'))
+# Pillow itself only warns up to twice its limit, so this is a backstop behind the explicit check
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+def hash_file(path: str) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def decode_and_downscale(path: str, max_side: int = IMAGE_MAX_SIDE) -> bytes:
+    """Decode an upload and shrink it to at most `max_side` pixels per side.
+
+    Runs in a worker process. The pixel count is checked from the header
+    before anything is decoded. For JPEGs `draft` lets the decoder scale by
+    1/2, 1/4 or 1/8 while decoding, so a 12MP phone photo is never fully
+    expanded in memory; other formats decode at full size, which the pixel
+    cap bounds.
+
+    Args:
+        path (str): Path to the uploaded image
+        max_side (int): Longest side of the output image
+
+    Returns:
+        bytes: Re-encoded JPEG
+
+    Raises:
+        ValueError: If the image has more than IMAGE_MAX_PIXELS pixels
+    """
+    with Image.open(path) as img:
+        width, height = img.size
+        if width * height > IMAGE_MAX_PIXELS:
+            raise ValueError(f"Image too large ({width}x{height} pixels, limit {IMAGE_MAX_PIXELS})")
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_side, max_side))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=85)
+        return buffer.getvalue()
+
+class ImagePipeline:
+    def __init__(self, max_workers: int = IMAGE_WORKERS, max_side: int = IMAGE_MAX_SIDE):
+        """Initialize the decode pool, image encoder and embedding cache.
+
+        Args:
+            max_workers (int): Number of decode worker processes
+            max_side (int): Longest side of downscaled images
+        """
+        self.max_side = max_side
+        self.pool = ProcessPoolExecutor(max_workers=max_workers)
+        self.embedder = load_image_embedder(IMAGE_EMBEDDING_MODEL)
+
+        self._lock = threading.Lock()
+        self.cache = sqlite3.connect(IMAGE_CACHE_PATH, check_same_thread=False)
+        self.cache.execute("PRAGMA journal_mode=WAL")
+        self.cache.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                hash TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                jpeg BLOB NOT NULL
+            )
+        """)
+        self.cache.commit()
+
+        self.reference_labels, self.reference_matrix = self.load_references()
+        logger.info(f"Initialized image pipeline with {max_workers} workers, "
+                    f"{len(self.reference_labels)} reference images")
+
+    def _cached(self, digest: str) -> Dict:
+        with self._lock:
+            row = self.cache.execute(
+                "SELECT embedding, jpeg FROM images WHERE hash = ? AND model = ?",
+                (digest, IMAGE_EMBEDDING_MODEL)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"hash": digest, "embedding": np.frombuffer(row[0], dtype=np.float32), "jpeg": row[1]}
+
+    def _store(self, prepared: Dict) -> None:
+        with self._lock:
+            self.cache.execute(
+                "INSERT OR REPLACE INTO images (hash, model, embedding, jpeg) VALUES (?, ?, ?, ?)",
+                (prepared["hash"], IMAGE_EMBEDDING_MODEL,
+                 prepared["embedding"].astype(np.float32).tobytes(), prepared["jpeg"])
+            )
+            self.cache.commit()
+
+    def _check_size(self, path: str) -> None:
+        size = os.path.getsize(path)
+        if size > IMAGE_MAX_BYTES:
+            raise ValueError(f"Image too large ({size} bytes, limit {IMAGE_MAX_BYTES})")
+
+    def _lookup(self, path: str) -> Tuple[str, Dict]:
+        """Check the size, hash the file and look it up: (hash, cached result or None)."""
+        self._check_size(path)
+        digest = hash_file(path)
+        return digest, self._cached(digest)
+
+    def embed(self, jpeg: bytes) -> np.ndarray:
+        """Compute a normalized embedding for a downscaled JPEG."""
+        with Image.open(io.BytesIO(jpeg)) as img:
+            return self.embedder.encode([img], normalize_embeddings=True, show_progress_bar=False)[0]
+
+    def prepare(self, path: str) -> Dict:
+        """Downscale and embed an image, reusing cached results by content hash.
+
+        Args:
+            path (str): Path to the uploaded image
+
+        Returns:
+            Dict: {"hash", "jpeg", "embedding"}
+        """
+        digest, prepared = self._lookup(path)
+        if prepared is not None:
+            return prepared
+
+        jpeg = self.pool.submit(decode_and_downscale, path, self.max_side).result()
+        prepared = {"hash": digest, "jpeg": jpeg, "embedding": self.embed(jpeg)}
+        self._store(prepared)
+        return prepared
+
+    def load_references(self) -> Tuple[List[str], np.ndarray]:
+        """Embed the labelled reference photos (cached like any upload)."""
+        labels, embeddings = [], []
+        if os.path.isdir(REFERENCE_IMAGES_DIR):
+            for label in sorted(os.listdir(REFERENCE_IMAGES_DIR)):
+                folder = os.path.join(REFERENCE_IMAGES_DIR, label)
+                if not os.path.isdir(folder):
+                    continue
+                for name in sorted(os.listdir(folder)):
+                    if not name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    try:
+                        prepared = self.prepare(os.path.join(folder, name))
+                    except Exception as e:
+                        logger.warning(f"Skipping reference image {name}: {e}")
+                        continue
+                    labels.append(label.replace("_", " "))
+                    embeddings.append(prepared["embedding"])
+
+        matrix = np.vstack(embeddings) if embeddings else np.zeros((0, 1), dtype=np.float32)
+        return labels, matrix
+
+    def similar(self, embedding: np.ndarray, top_k: int = 3) -> List[Tuple[str, float]]:
+        """Find the reference conditions that look most like an image.
+
+        Args:
+            embedding (np.ndarray): Normalized image embedding
+            top_k (int): Number of labels to return
+
+        Returns:
+            List[Tuple[str, float]]: (label, cosine similarity) pairs, best first
+        """
+        if not self.reference_labels:
+            return []
+        scores = self.reference_matrix @ embedding
+        best = {}
+        for i in np.argsort(-scores):
+            label = self.reference_labels[i]
+            if label not in best:
+                best[label] = float(scores[i])
+                if len(best) == top_k:
+                    break
+        return list(best.items())
+
+    def close(self) -> None:
+        """Shut down the worker pool and close the cache."""
+        self.pool.shutdown(wait=True)
+        with self._lock:
+            self.cache.close()
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_image_pipeline() -> ImagePipeline:
+    """Return the process-wide image pipeline, creating it on first use."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ImagePipeline()
+        return _pipeline
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dotenv import load_dotenv
+from docstore import DocStore, open_docstore
+from backends import open_index, EMBEDDING_MODEL, PINECONE_INDEX_NAME
+from pdf_loader import CHUNK_SIZE, CHUNK_OVERLAP
+from projection import Projection, load_projection, docstore_projection_path
+from index_versions import (current_version, create_index, delete_version, new_version_name, publish_version,
+                            validate_version, version_docstore_path)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+SNAPSHOT_FORMAT_VERSION = 2  # 2 adds the projection and full-dimension embeddings of projected indexes
+FETCH_BATCH_SIZE = 100  # Ids per Pinecone fetch request
+UPSERT_BATCH_SIZE = 200  # Vectors per Pinecone upsert request
+
+class SnapshotError(Exception):
+    pass
+
+def manifest_path(snapshot_path: str) -> str:
+    return os.path.splitext(snapshot_path)[0] + ".manifest.json"
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_vectors(index, namespace: str, dimension: int) -> tuple:
+    """Read every vector in a namespace.
+
+    Args:
+        index: Pinecone or LocalIndex
+        namespace (str): Namespace to read
+        dimension (int): Vector dimension of the index
+
+    Returns:
+        tuple: (ids, float32 matrix, metadata dicts), in listing order
+    """
+    ids = [vector_id for page in index.list(namespace=namespace) for vector_id in page]
+    vectors, metadata = [], []
+    for i in range(0, len(ids), FETCH_BATCH_SIZE):
+        batch = ids[i:i + FETCH_BATCH_SIZE]
+        fetched = index.fetch(ids=batch, namespace=namespace).vectors
+        for vector_id in batch:
+            vectors.append(fetched[vector_id].values)
+            metadata.append(dict(fetched[vector_id].metadata or {}))
+    return ids, np.asarray(vectors, dtype=np.float32).reshape(len(ids), dimension), metadata
+
+def export_snapshot(snapshot_path: str, index=None, docstore: DocStore = None, index_name: str = PINECONE_INDEX_NAME,
+                    chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> dict:
+    """Write every vector, its metadata and chunk text to a columnar snapshot.
+
+    The snapshot is one .npz file holding, per namespace, an id column, a
+    float32 vector matrix and JSON-encoded metadata and text columns. For a
+    projected index it also holds the projection and, per namespace, the
+    full-dimension embeddings used for rescoring. A manifest beside it
+    records the model, chunking config, counts and the file's sha256.
+
+    Args:
+        snapshot_path (str): Output .npz path
+        index: Vector index to export (default: the version `index_name` points at)
+        docstore (DocStore): Chunk text store (default: that version's docstore)
+        index_name (str): Alias to export when `index` is not given
+        chunk_size (int): Chunk size the index was built with
+        overlap (int): Chunk overlap the index was built with
+
+    Returns:
+        dict: The manifest
+    """
+    start = time.time()
+    version, docstore_path = current_version(index_name)
+    index = index or open_index(version)
+    docstore = docstore or open_docstore(docstore_path)
+    projection = load_projection(docstore_path=docstore.path)
+    stats = index.describe_index_stats()
+
+    columns, namespaces = {}, {}
+    if projection is not None:
+        columns["projection_mean"], columns["projection_components"] = projection.mean, projection.components
+    for i, namespace in enumerate(sorted(stats.namespaces)):
+        ids, vectors, index_metadata = read_vectors(index, namespace, stats.dimension)
+        records = docstore.get_many(ids, namespace=namespace)
+        metadata, texts = [], []
+        for vector_id, fields in zip(ids, index_metadata):
+            # Legacy vectors keep their text in index metadata instead of the docstore
+            record = dict(records.get(vector_id) or fields)
+            texts.append(record.pop("text", ""))
+            metadata.append(json.dumps(record))
+
+        key = f"ns{i}"
+        columns[f"{key}_ids"] = np.array(ids, dtype=np.str_)
+        columns[f"{key}_vectors"] = vectors
+        columns[f"{key}_metadata"] = np.array(metadata, dtype=np.str_)
+        columns[f"{key}_text"] = np.array(texts, dtype=np.str_)
+        if projection is not None:
+            embeddings = docstore.get_embeddings(ids, namespace=namespace)
+            missing = [vector_id for vector_id in ids if vector_id not in embeddings]
+            if missing:
+                raise SnapshotError(f"Namespace '{namespace}': {len(missing)} vectors of the projected index have "
+                                    f"no full-dimension embedding, e.g. {missing[0]}")
+            columns[f"{key}_embeddings"] = np.stack([embeddings[vector_id] for vector_id in ids]) if ids else \
+                np.zeros((0, projection.components.shape[1]), dtype=np.float32)
+        namespaces[namespace] = {"key": key, "count": len(ids)}
+        logger.info(f"Exported {len(ids)} vectors from namespace '{namespace}'")
+
+    tmp_path = snapshot_path + ".tmp.npz"  # np.savez appends .npz to other names
+    np.savez_compressed(tmp_path, **columns)
+    os.replace(tmp_path, snapshot_path)
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "index_name": version,
+        "embedding_model": EMBEDDING_MODEL,
+        "dimension": stats.dimension,
+        "projection": {"full_dimension": int(projection.components.shape[1])} if projection is not None else None,
+        "chunking": {"chunk_size": chunk_size, "overlap": overlap},
+        "namespaces": namespaces,
+        "total_vectors": sum(ns["count"] for ns in namespaces.values()),
+        "sha256": file_sha256(snapshot_path),
+        "bytes": os.path.getsize(snapshot_path),
+    }
+    with open(manifest_path(snapshot_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"✅ Snapshot of {manifest['total_vectors']} vectors ({manifest['bytes'] / 2**20:.1f} MiB) "
+                f"written in {time.time() - start:.2f}s")
+    return manifest
+
+def verify_snapshot(snapshot_path: str, dimension: int = None, embedding_model: str = EMBEDDING_MODEL) -> tuple:
+    """Check a snapshot against its manifest and the current configuration.
+
+    Args:
+        snapshot_path (str): Snapshot .npz path
+        dimension (int): Required vector dimension (default: not checked)
+        embedding_model (str): Required model (None to skip the check)
+
+    Returns:
+        tuple: (manifest, loaded npz columns)
+
+    Raises:
+        SnapshotError: If any check fails
+    """
+    with open(manifest_path(snapshot_path), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") not in (1, SNAPSHOT_FORMAT_VERSION):
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    if file_sha256(snapshot_path) != manifest["sha256"]:
+        raise SnapshotError("Checksum mismatch: snapshot file is corrupt or was modified")
+    if embedding_model and manifest["embedding_model"] != embedding_model:
+        raise SnapshotError(f"Snapshot was embedded with {manifest['embedding_model']}, "
+                            f"this node uses {embedding_model}")
+    if dimension and manifest["dimension"] != dimension:
+        raise SnapshotError(f"Snapshot dimension {manifest['dimension']} does not match index dimension {dimension}")
+
+    columns = np.load(snapshot_path)
+    projected = manifest.get("projection")
+    if projected and columns["projection_components"].shape != (manifest["dimension"], projected["full_dimension"]):
+        raise SnapshotError(f"Projection has shape {columns['projection_components'].shape}")
+    for namespace, info in manifest["namespaces"].items():
+        key, count = info["key"], info["count"]
+        matrices = {"vectors": (columns[f"{key}_vectors"], manifest["dimension"])}
+        if projected:
+            matrices["embeddings"] = (columns[f"{key}_embeddings"], projected["full_dimension"])
+        lengths = {len(columns[f"{key}_{column}"]) for column in ("ids", "metadata", "text")} | \
+                  {len(matrix) for matrix, _ in matrices.values()}
+        if lengths != {count}:
+            raise SnapshotError(f"Namespace '{namespace}': expected {count} rows, found {sorted(lengths)}")
+        for name, (matrix, width) in matrices.items():
+            if matrix.ndim != 2 or matrix.shape[1] != width:
+                raise SnapshotError(f"Namespace '{namespace}': {name} have shape {matrix.shape}")
+            if not np.isfinite(matrix).all():
+                raise SnapshotError(f"Namespace '{namespace}': {name} contain NaN or infinity")
+
+    if manifest["chunking"] != {"chunk_size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP}:
+        logger.warning(f"Snapshot chunking {manifest['chunking']} differs from this node's; "
+                       f"newly ingested documents will be chunked differently")
+    return manifest, columns
+
+def snapshot_projection(manifest: dict, columns):
+    """The projection a snapshot's vectors were reduced with, or None if they are full-dimension."""
+    if not manifest.get("projection"):
+        return None
+    return Projection(columns["projection_mean"], columns["projection_components"], manifest["embedding_model"])
+
+def load_snapshot(manifest: dict, columns, index, docstore: DocStore = None, workers: int = 4) -> dict:
+    """Bulk load verified snapshot columns into an index and, if given, a docstore.
+
+    Returns:
+        dict: Vectors loaded per namespace
+    """
+    loaded = {}
+    for namespace, info in manifest["namespaces"].items():
+        key = info["key"]
+        ids = columns[f"{key}_ids"].tolist()
+        vectors = columns[f"{key}_vectors"]
+        metadata = [json.loads(value) for value in columns[f"{key}_metadata"].tolist()]
+
+        # Text (and full embeddings for rescoring) first, so ids are never searchable without them
+        if docstore is not None:
+            docstore.put_many([
+                {"id": vector_id, "text": text, **fields}
+                for vector_id, text, fields in zip(ids, columns[f"{key}_text"].tolist(), metadata)
+            ], namespace=namespace)
+            if manifest.get("projection"):
+                docstore.put_embeddings(ids, columns[f"{key}_embeddings"], namespace=namespace)
+
+        batches = [
+            [(ids[j], vectors[j].tolist(), metadata[j]) for j in range(i, min(i + UPSERT_BATCH_SIZE, len(ids)))]
+            for i in range(0, len(ids), UPSERT_BATCH_SIZE)
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda batch: index.upsert(vectors=batch, namespace=namespace), batches))
+        loaded[namespace] = len(ids)
+        logger.info(f"Imported {len(ids)} vectors into namespace '{namespace}'")
+
+    if hasattr(index, "save") and getattr(index, "path", None):
+        index.save()
+    return loaded
+
+def import_snapshot(snapshot_path: str, index=None, docstore: DocStore = None, index_name: str = PINECONE_INDEX_NAME,
+                    load_docstore: bool = True, workers: int = 4, live: bool = False) -> dict:
+    """Verify a snapshot and bulk load it.
+
+    By default the snapshot becomes a new version of the alias
+    `index_name`, which is validated and then served via switch_alias,
+    exactly like a version built from the PDFs.
+
+    Args:
+        snapshot_path (str): Snapshot .npz path
+        index: Index to load into instead of a new version, Pinecone or LocalIndex
+        docstore (DocStore): Chunk text store to load into along with `index` (default: none)
+        index_name (str): Alias the snapshot is imported for
+        load_docstore (bool): Also write chunk text to the docstore, when loading into an existing one
+        workers (int): Concurrent upsert requests
+        live (bool): Load into the version `index_name` currently serves (and its docstore); queries
+            see it change
+
+    Returns:
+        dict: Vectors imported per namespace
+    """
+    start = time.time()
+    if index is None and not live:
+        manifest, columns = verify_snapshot(snapshot_path)
+        version = new_version_name(index_name)
+        docstore_path = version_docstore_path(version)
+        projection = snapshot_projection(manifest, columns)
+        if projection is not None:
+            projection.save(docstore_projection_path(docstore_path))  # Served with the version, as built
+        index, docstore = create_index(version, manifest["dimension"]), DocStore(docstore_path)
+        try:
+            imported = load_snapshot(manifest, columns, index, docstore, workers)
+            report = validate_version(index, docstore, index_name)
+        except Exception:
+            docstore.close()
+            delete_version(version, docstore_path)
+            raise
+        docstore.close()
+        publish_version(index_name, version, docstore_path, report)
+    else:
+        if live:
+            version, docstore_path = current_version(index_name)
+            index, docstore = index or open_index(version), docstore or open_docstore(docstore_path)
+        manifest, columns = verify_snapshot(snapshot_path, dimension=index.describe_index_stats().dimension)
+        if load_docstore and docstore is not None:
+            projection, target = snapshot_projection(manifest, columns), load_projection(docstore_path=docstore.path)
+            if (projection is None) != (target is None) or \
+                    (projection is not None and not np.allclose(projection.components, target.components)):
+                raise SnapshotError("The snapshot and the target docstore use different projections; "
+                                    "import it as a new version instead")
+        imported = load_snapshot(manifest, columns, index, docstore if load_docstore else None, workers)
+    logger.info(f"✅ Imported {sum(imported.values())} vectors in {time.time() - start:.2f}s")
+    return imported
+
+def main():
+    """Export, verify or import an index snapshot."""
+    parser = argparse.ArgumentParser(description="Index snapshot export/import")
+    parser.add_argument("command", choices=["export", "verify", "import"])
+    parser.add_argument("snapshot", help="Snapshot .npz path (manifest is written beside it)")
+    parser.add_argument("--alias", default=PINECONE_INDEX_NAME, help="Alias to export, or to import a new version of")
+    parser.add_argument("--index", help="Import vectors only into this index (e.g. a local fallback copy)")
+    parser.add_argument("--in-place", action="store_true", help="Import into the version the alias serves")
+    parser.add_argument("--skip-docstore", action="store_true", help="Import vectors only (with --in-place)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.snapshot, index_name=args.alias)
+    elif args.command == "verify":
+        manifest, _ = verify_snapshot(args.snapshot)
+        logger.info(f"✅ Snapshot OK: {manifest['total_vectors']} vectors, model {manifest['embedding_model']}")
+    else:
+        index = None
+        if args.index:
+            manifest, _ = verify_snapshot(args.snapshot)
+            index = open_index(args.index, manifest["dimension"])
+        import_snapshot(args.snapshot, index=index, index_name=args.alias, load_docstore=not args.skip_docstore,
+                        live=args.in_place)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import threading
+import logging
+from typing import List, Optional
+from dotenv import load_dotenv
+from docstore import DocStore, open_docstore, release_docstore, DOCSTORE_PATH
+from backends import open_index, release_index, use_fakes, VECTOR_BACKEND, PINECONE_API_KEY, PINECONE_INDEX_NAME
+from embedding_models import secondary_models, sync_model_index
+from projection import load_projection, docstore_projection_path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Maps an alias (PINECONE_INDEX_NAME) to the index version currently served
+INDEX_ALIAS_PATH = os.path.join(BASE_DIR, os.getenv('INDEX_ALIAS_PATH', 'index_alias.json'))
+# Superseded versions kept for rollback; older ones are deleted
+INDEX_VERSIONS_KEEP = int(os.getenv('INDEX_VERSIONS_KEEP', '1'))
+# A new version must score at least this share of the live version's mean top score
+VALIDATION_MIN_SCORE_RATIO = float(os.getenv('VALIDATION_MIN_SCORE_RATIO', '0.9'))
+# Precompute context for common symptom sets (and optionally analyses) before a new version serves
+WARM_CACHE_AFTER_INGEST = os.getenv('WARM_CACHE_AFTER_INGEST', '1') == '1'
+WARM_CACHE_ANALYSES = os.getenv('WARM_CACHE_ANALYSES', '0') == '1'
+
+VALIDATION_QUERIES = [
+    "livestock symptoms: reduced milk production, warm udder, abnormal milk",
+    "livestock symptoms: lameness, swollen hoof",
+    "livestock symptoms: fever, loss of appetite",
+    "livestock symptoms: distended left flank, discomfort",
+    "How long must milk from treated cows be withheld?",
+    "What treatment records must producers keep?",
+]
+
+class ValidationError(Exception):
+    pass
+
+def local_backend() -> bool:
+    return use_fakes() or VECTOR_BACKEND == "local"
+
+def new_version_name(alias: str) -> str:
+    """Timestamped name for a new version of `alias`, distinct from every version it still knows."""
+    entry = read_aliases().get(alias) or {"index": alias, "previous": []}
+    taken = {entry["index"]} | {version["index"] for version in entry["previous"]}
+    while True:
+        version = f"{alias}-v{time.strftime('%Y%m%d%H%M%S')}"
+        if version not in taken:
+            return version
+        time.sleep(1)  # Built within the same second as the last one
+
+def version_docstore_path(version: str) -> str:
+    return os.path.join(os.path.dirname(DOCSTORE_PATH), f"docstore-{version}.db")
+
+def read_aliases(path: str = INDEX_ALIAS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def write_aliases(aliases: dict, path: str = INDEX_ALIAS_PATH) -> None:
+    """Replace the alias file in one step; readers see the old or new file, never a mix."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def current_version(alias: str = PINECONE_INDEX_NAME, path: str = INDEX_ALIAS_PATH) -> tuple:
+    """Return (index name, docstore path) currently served for an alias.
+
+    Without an alias entry the alias is itself the index name and the
+    default docstore is used, as before versioning existed.
+    """
+    entry = read_aliases(path).get(alias)
+    if not entry:
+        return alias, DOCSTORE_PATH
+    return entry["index"], entry["docstore"]
+
+def known_versions(path: str = INDEX_ALIAS_PATH) -> set:
+    """Index versions that an alias serves or can roll back to."""
+    return {version["index"] for entry in read_aliases(path).values() for version in [entry] + entry["previous"]}
+
+class AliasResolver:
+    """Re-reads the alias file only when its modification time changes."""
+
+    def __init__(self, alias: str = PINECONE_INDEX_NAME, path: str = INDEX_ALIAS_PATH):
+        self.alias = alias
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._version = None
+
+    def resolve(self) -> Optional[tuple]:
+        """Return (index name, docstore path) if the alias changed since the last call, else None."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if mtime == self._mtime and self._version is not None:
+                return None
+            self._mtime = mtime
+            version = current_version(self.alias, self.path)
+            if version == self._version:
+                return None
+            self._version = version
+            return version
+
+def create_index(name: str, dimension: int):
+    """Create an empty index version and return its client."""
+    if local_backend():
+        return open_index(name, dimension)
+    from pinecone_setup import create_pinecone_index
+    if not create_pinecone_index(dimension=dimension, index_name=name):
+        raise RuntimeError(f"Could not create index {name}")
+    return open_index(name)
+
+def delete_index(name: str) -> None:
+    """Remove an index, if it exists."""
+    release_index(name)
+    if local_backend():
+        from local_index import LOCAL_INDEX_DIR
+        shutil.rmtree(os.path.join(LOCAL_INDEX_DIR, name), ignore_errors=True)
+    else:
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+        if name in [index.name for index in pc.list_indexes()]:
+            pc.delete_index(name)
+
+def delete_version(name: str, docstore_path: str) -> None:
+    """Remove an index version, the other embedding models' indexes of it, its docstore and projection."""
+    release_docstore(docstore_path)
+    delete_index(name)
+    for model in secondary_models():
+        delete_index(model.index_name(name))
+    if docstore_path != DOCSTORE_PATH:
+        for path in glob.glob(f"{docstore_path}*"):  # Includes -wal and -shm
+            os.remove(path)
+        if os.path.exists(docstore_projection_path(docstore_path)):
+            os.remove(docstore_projection_path(docstore_path))
+    logger.info(f"🗑️ Deleted index version {name}")
+
+def wait_for_count(index, expected: int, timeout: float = 300.0) -> int:
+    """Wait until the index reports `expected` vectors (Pinecone counts lag behind upserts)."""
+    deadline = time.time() + timeout
+    while True:
+        count = index.describe_index_stats().total_vector_count
+        if count >= expected or time.time() > deadline:
+            return count
+        time.sleep(2)
+
+def mean_top_score(knowledge_base, queries: List[str]) -> float:
+    results = knowledge_base.query_batch(queries, top_k=1)
+    scores = [matches[0].score if matches else 0.0 for matches in results]
+    return sum(scores) / len(scores)
+
+def validate_version(index, docstore: DocStore, alias: str = PINECONE_INDEX_NAME,
+                     queries: List[str] = VALIDATION_QUERIES) -> dict:
+    """Check a freshly built version before it is allowed to serve.
+
+    The index must hold every chunk in its docstore, every validation query
+    must return a hydrated match, and the mean top score must not fall far
+    below that of the version being replaced.
+
+    Raises:
+        ValidationError: If any check fails
+    """
+    from query_knowledge import KnowledgeBase
+
+    expected = docstore.count()
+    count = wait_for_count(index, expected)
+    if expected == 0 or count != expected:
+        raise ValidationError(f"Index holds {count} vectors, docstore {expected} chunks")
+
+    candidate = KnowledgeBase(index=index, docstore=docstore)
+    empty = [query for query, matches in zip(queries, candidate.query_batch(queries, top_k=1)) if not matches]
+    if empty:
+        raise ValidationError(f"No results for: {empty}")
+
+    report = {"vectors": count, "mean_top_score": round(mean_top_score(candidate, queries), 4)}
+    live_name, live_docstore_path = current_version(alias)
+    live_projection = load_projection(docstore_path=live_docstore_path)
+    try:
+        live_index = open_index(live_name, live_projection.dimension if live_projection else None)
+        live_count = live_index.describe_index_stats().total_vector_count
+    except Exception as e:
+        logger.warning(f"No live version to compare against: {e}")
+        live_count = 0
+    if live_count:
+        live_docstore = DocStore(live_docstore_path)
+        live_score = mean_top_score(KnowledgeBase(index=live_index, docstore=live_docstore), queries)
+        live_docstore.close()
+        report["live_mean_top_score"] = round(live_score, 4)
+        if report["mean_top_score"] < live_score * VALIDATION_MIN_SCORE_RATIO:
+            raise ValidationError(f"Mean top score {report['mean_top_score']} is below "
+                                  f"{VALIDATION_MIN_SCORE_RATIO:.0%} of the live version's {live_score:.4f}")
+    return report
+
+def switch_alias(alias: str, version: str, docstore_path: str, report: dict = None) -> None:
+    """Point an alias at a version, remembering the one it replaces."""
+    aliases = read_aliases()
+    entry = aliases.get(alias)
+    if entry is None:
+        # The unversioned index served before the first switch
+        previous = [{"index": alias, "docstore": DOCSTORE_PATH}]
+    else:
+        previous = [{"index": entry["index"], "docstore": entry["docstore"]}] + entry["previous"]
+    aliases[alias] = {
+        "index": version,
+        "docstore": docstore_path,
+        "switched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "validation": report or {},
+        "previous": previous,
+    }
+    write_aliases(aliases)
+    logger.info(f"🔀 Alias {alias} now serves {version}")
+
+def publish_version(alias: str, version: str, docstore_path: str, report: dict) -> None:
+    """Serve a validated version and delete the versions that fall out of the rollback window."""
+    # Other embedding models get their index of the new version before it serves
+    for model in secondary_models():
+        try:
+            sync_model_index(model.name, alias, version=(version, docstore_path))
+        except Exception as e:
+            logger.error(f"Could not build the {model.name} index of {version}: {e}")
+    # So does the warm cache, which servers load as soon as they see the switch
+    if WARM_CACHE_AFTER_INGEST:
+        # Imported here: warm_cache pulls in the generation stack, which imports this module
+        from ai_response import AgrivannaAI
+        from query_knowledge import KnowledgeBase
+        from warm_cache import build_warm_cache
+        try:
+            knowledge_base = KnowledgeBase(index=open_index(version), docstore=open_docstore(docstore_path))
+            build_warm_cache(AgrivannaAI("warm-cache", knowledge_base=knowledge_base),
+                             include_analysis=WARM_CACHE_ANALYSES, index_version=version)
+        except Exception as e:
+            logger.error(f"Could not build the warm cache of {version}: {e}")
+    switch_alias(alias, version, docstore_path, report)
+    collect_garbage(alias)
+
+def collect_garbage(alias: str = PINECONE_INDEX_NAME, keep: int = INDEX_VERSIONS_KEEP) -> List[str]:
+    """Delete versions beyond the `keep` most recent superseded ones."""
+    aliases = read_aliases()
+    entry = aliases.get(alias)
+    if not entry or len(entry["previous"]) <= keep:
+        return []
+    doomed = entry["previous"][keep:]
+    entry["previous"] = entry["previous"][:keep]
+    write_aliases(aliases)  # Forget them before deleting, so a rollback never targets a deleted version
+    for version in doomed:
+        try:
+            delete_version(version["index"], version["docstore"])
+        except Exception as e:
+            logger.error(f"Could not delete {version['index']}: {e}")
+    return [version["index"] for version in doomed]
+
+def rollback(alias: str = PINECONE_INDEX_NAME) -> str:
+    """Serve the most recent superseded version again."""
+    aliases = read_aliases()
+    entry = aliases.get(alias)
+    if not entry or not entry["previous"]:
+        raise ValueError(f"No previous version of {alias} to roll back to")
+    target, rest = entry["previous"][0], entry["previous"][1:]
+    aliases[alias] = {**entry, "index": target["index"], "docstore": target["docstore"],
+                      "switched_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "validation": {},
+                      "previous": [{"index": entry["index"], "docstore": entry["docstore"]}] + rest}
+    write_aliases(aliases)
+    logger.info(f"⏪ Alias {alias} rolled back to {target['index']}")
+    return target["index"]
+
+def build_version(pdfs: List[str], alias: str = PINECONE_INDEX_NAME) -> str:
+    """Ingest `pdfs` into a new index version, validate it and switch the alias.
+
+    Queries keep being served from the current version throughout; readers
+    pick up the new one on their next query after the switch. A version
+    that fails validation is deleted and the alias is left untouched. The
+    new version keeps the projection of the one it replaces, if any.
+
+    Returns:
+        str: Name of the new version
+    """
+    from pdf_loader import DocumentProcessor
+    from backends import EMBEDDING_DIMENSION
+
+    start = time.time()
+    version = new_version_name(alias)
+    docstore_path = version_docstore_path(version)
+    projection = load_projection(docstore_path=current_version(alias)[1])
+    if projection is not None:
+        projection.save(docstore_projection_path(docstore_path))
+    index = create_index(version, projection.dimension if projection else EMBEDDING_DIMENSION)
+    docstore = DocStore(docstore_path)
+    logger.info(f"🏗️ Building {version}")
+
+    try:
+        processor = DocumentProcessor(index=index, docstore=docstore)
+        try:
+            for pdf_path in pdfs:
+                processor.process_pdf(pdf_path)
+        finally:
+            processor.engine.close()
+        logger.info(f"🧹 {processor.ingestion_summary()}")
+        if hasattr(index, "save"):
+            index.save()
+        report = validate_version(index, docstore, alias)
+    except Exception:
+        docstore.close()
+        delete_version(version, docstore_path)
+        raise
+
+    docstore.close()
+    publish_version(alias, version, docstore_path, report)
+    logger.info(f"✅ {version} built and serving in {time.time() - start:.2f}s: {report}")
+    return version
+
+def main():
+    """Build, inspect, roll back or clean up index versions."""
+    from pdf_loader import DEFAULT_PDFS
+
+    parser = argparse.ArgumentParser(description="Versioned indexes behind an alias")
+    parser.add_argument("command", choices=["build", "status", "rollback", "gc"])
+    parser.add_argument("--alias", default=PINECONE_INDEX_NAME)
+    parser.add_argument("--pdf", action="append", help="PDF to ingest (default: the standard documents)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_version(args.pdf or DEFAULT_PDFS, args.alias)
+    elif args.command == "rollback":
+        rollback(args.alias)
+    elif args.command == "gc":
+        logger.info(f"Deleted: {collect_garbage(args.alias)}")
+    else:
+        print(json.dumps(read_aliases().get(args.alias, {"index": args.alias}), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import base64
+import signal
+import tempfile
+import threading
+import argparse
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dotenv import load_dotenv
+from query_knowledge import KnowledgeBase
+from ai_response import AgrivannaAI
+from model_router import ModelRouter, GEMINI_FAST_MODEL, GEMINI_STRONG_MODEL
+from generation_gateway import get_gateway, gateway_metrics, close_gateways
+from backends import use_fakes, create_generative_model
+from docstore import release_docstore
+from index_versions import AliasResolver
+from extractive_answers import fast_path_stats
+from warm_cache import WarmCache
+from prompt_cache import get_context_cache
+from resilience import dependency_metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '8080'))
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '8'))
+SERVER_MAX_QUEUE = int(os.getenv('SERVER_MAX_QUEUE', '64'))
+REQUEST_TIMEOUT_SEC = float(os.getenv('REQUEST_TIMEOUT_SEC', '60'))
+MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', '1000'))
+
+MAX_BODY_BYTES = 20 * 1024 * 1024  # Room for one base64 photo
+
+class ServiceUnavailable(Exception):
+    pass
+
+class BadRequest(Exception):
+    pass
+
+class InferenceService:
+    """Warm models plus per-session assistants, independent of the HTTP layer.
+
+    One KnowledgeBase (embedder, index client, docstore) and one model
+    router are shared by every session. Work runs on a fixed pool of
+    worker threads; requests beyond the queue limit are rejected rather
+    than left to pile up.
+    """
+
+    def __init__(self, workers: int = SERVER_WORKERS, max_queue: int = SERVER_MAX_QUEUE,
+                 request_timeout: float = REQUEST_TIMEOUT_SEC, max_sessions: int = MAX_SESSIONS):
+        """Initialize the service (models are loaded by `warm_up`).
+
+        Args:
+            workers (int): Worker threads executing requests
+            max_queue (int): Requests allowed to wait for a worker
+            request_timeout (float): Seconds before a request is answered with 504
+            max_sessions (int): Conversations kept before the oldest is evicted
+        """
+        self.state = "starting"
+        self.started_at = time.time()
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.max_sessions = max_sessions
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.admission = threading.BoundedSemaphore(workers + max_queue)
+        self.knowledge_base = None
+        self.router = None
+        self.warm_cache = None
+        self.alias_resolver = AliasResolver()  # Each index version has its own warm cache
+        self.sessions = OrderedDict()  # session_id -> (AgrivannaAI, lock)
+        self._sessions_lock = threading.Lock()
+        self._in_flight = 0
+        self._counts = {"requests": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+        self._counts_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """Load shared models and run one query so the first request is fast."""
+        logger.info("🔥 Warming up models...")
+        self.knowledge_base = KnowledgeBase()
+        if use_fakes() and self.knowledge_base.index.describe_index_stats().total_vector_count == 0:
+            from fake_backends import seed_index
+            seed_index(self.knowledge_base.index, self.knowledge_base.docstore, self.knowledge_base.embedder)
+        self.router = ModelRouter(get_gateway(create_generative_model(GEMINI_FAST_MODEL)),
+                                  get_gateway(create_generative_model(GEMINI_STRONG_MODEL)))
+        self.refresh_warm_cache()
+        self.knowledge_base.query("warm udder and reduced milk production", top_k=1)
+        self.state = "ready"
+        logger.info(f"✅ Service ready in {time.time() - self.started_at:.2f} seconds")
+
+    def refresh_warm_cache(self) -> None:
+        """Load the warm cache of the index version the alias serves, if the alias moved."""
+        version = self.alias_resolver.resolve()
+        if version is not None:
+            self.warm_cache = WarmCache.load(index_version=version[0])
+
+    def session(self, session_id: str) -> tuple:
+        """Return (assistant, lock) for a session, evicting the least recently used."""
+        self.refresh_warm_cache()
+        with self._sessions_lock:
+            if session_id in self.sessions:
+                self.sessions.move_to_end(session_id)
+                self.sessions[session_id][0].warm_cache = self.warm_cache
+            else:
+                ai = AgrivannaAI(session_id, knowledge_base=self.knowledge_base, router=self.router,
+                                 warm_cache=self.warm_cache)
+                self.sessions[session_id] = (ai, threading.Lock())
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            return self.sessions[session_id]
+
+    def run(self, fn, *args):
+        """Execute `fn` on a worker thread with admission control and a timeout."""
+        if self.state != "ready":
+            raise ServiceUnavailable(f"Service is {self.state}")
+        if not self.admission.acquire(blocking=False):
+            with self._counts_lock:
+                self._counts["rejected"] += 1
+            raise ServiceUnavailable("Too many queued requests")
+
+        with self._counts_lock:
+            self._counts["requests"] += 1
+            self._in_flight += 1
+        try:
+            future = self.executor.submit(fn, *args)
+            future.add_done_callback(lambda _: self.admission.release())
+            try:
+                return future.result(timeout=self.request_timeout)
+            except FutureTimeout:
+                with self._counts_lock:
+                    self._counts["timeouts"] += 1
+                raise
+        finally:
+            with self._counts_lock:
+                self._in_flight -= 1
+
+    def analyze(self, payload: dict) -> dict:
+        symptoms = payload.get("symptoms")
+        if not symptoms or not isinstance(symptoms, list):
+            raise BadRequest("'symptoms' must be a non-empty list")
+        session_id = payload.get("session_id") or f"session-{time.time_ns()}"
+
+        photo_path = None
+        if payload.get("photo_base64"):
+            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+                f.write(base64.b64decode(payload["photo_base64"]))
+                photo_path = f.name
+
+        def work():
+            try:
+                ai, lock = self.session(session_id)
+                with lock:
+                    return ai.analyze_livestock(symptoms, photo_path)
+            finally:
+                if photo_path:
+                    os.unlink(photo_path)
+
+        try:
+            return {"session_id": session_id, "analysis": self.run(work)}
+        except ServiceUnavailable:
+            if photo_path:
+                os.unlink(photo_path)  # Rejected before a worker picked it up
+            raise
+
+    def followup(self, payload: dict) -> dict:
+        session_id, question = payload.get("session_id"), payload.get("question")
+        if not session_id or not question:
+            raise BadRequest("'session_id' and 'question' are required")
+
+        def work():
+            ai, lock = self.session(session_id)
+            with lock:
+                return ai.ask_followup(question)
+
+        return {"session_id": session_id, "response": self.run(work)}
+
+    def retrieve(self, payload: dict) -> dict:
+        query = payload.get("query")
+        if not query:
+            raise BadRequest("'query' is required")
+
+        def work():
+            return self.knowledge_base.query(
+                query,
+                top_k=int(payload.get("top_k", 3)),
+                filter=payload.get("filter"),
+                namespaces=payload.get("namespaces")
+            )
+
+        matches = self.run(work)
+        return {"matches": [{"id": match.id, "score": match.score, **match.metadata} for match in matches]}
+
+    def health(self) -> dict:
+        with self._counts_lock:
+            in_flight = self._in_flight
+        return {
+            "status": self.state,
+            "ready": self.state == "ready",
+            "uptime_sec": round(time.time() - self.started_at, 1),
+            "workers": self.workers,
+            "in_flight": in_flight,
+            "sessions": len(self.sessions),
+        }
+
+    def metrics(self) -> dict:
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return {
+            "service": counts,
+            "gateways": gateway_metrics(),
+            "routing": self.router.stats() if self.router else {},
+            "fast_path": fast_path_stats.report(),
+            "warm_cache": self.warm_cache.stats() if self.warm_cache else {},
+            "prompt_cache": get_context_cache().stats.report(),
+            "dependencies": dependency_metrics(),
+            "embedding_models": self.knowledge_base.model_stats(),
+        }
+
+    def close(self) -> None:
+        """Finish in-flight work and release shared resources."""
+        self.state = "draining"
+        self.executor.shutdown(wait=True)
+        close_gateways()
+        if self.knowledge_base is not None:
+            release_docstore(self.knowledge_base.docstore.path)
+        logger.info("👋 Service stopped")
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    service = None  # Set by make_server
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            body = self.service.health()
+            self._send(200 if body["ready"] else 503, body)
+        elif self.path == "/metrics":
+            self._send(200, self.service.metrics())
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        routes = {
+            "/analyze": self.service.analyze,
+            "/followup": self.service.followup,
+            "/retrieve": self.service.retrieve,
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            self._send(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY_BYTES:
+                raise BadRequest("Request body too large")
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            self._send(200, handler(payload))
+        except (BadRequest, ValueError) as e:
+            self._send(400, {"error": str(e)})
+        except ServiceUnavailable as e:
+            self._send(503, {"error": str(e)})
+        except FutureTimeout:
+            self._send(504, {"error": f"Request exceeded {self.service.request_timeout}s"})
+        except Exception as e:
+            logger.error(f"Request to {self.path} failed: {e}", exc_info=True)
+            with self.service._counts_lock:
+                self.service._counts["errors"] += 1
+            self._send(500, {"error": "Internal error"})
+
+def make_server(service: InferenceService, host: str = SERVER_HOST, port: int = SERVER_PORT,
+                listen_socket=None) -> ThreadingHTTPServer:
+    """Create the HTTP server bound to `service`.
+
+    Pass `listen_socket` to serve on an already bound socket (e.g. one
+    inherited from a pre-fork parent) instead of binding host:port.
+    """
+    handler = type("BoundInferenceHandler", (InferenceHandler,), {"service": service})
+    if listen_socket is None:
+        server = ThreadingHTTPServer((host, port), handler)
+    else:
+        server = ThreadingHTTPServer(listen_socket.getsockname()[:2], handler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = listen_socket
+    server.daemon_threads = False  # server_close() waits for open requests
+    return server
+
+def serve(service: InferenceService, server: ThreadingHTTPServer, on_ready=None) -> None:
+    """Serve until SIGINT/SIGTERM, then drain in-flight requests and close the service."""
+    def shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, draining...")
+        service.state = "draining"
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # Health checks answer "starting" while models load
+    serve_thread = threading.Thread(target=server.serve_forever)
+    serve_thread.start()
+    try:
+        service.warm_up()
+        if on_ready is not None:
+            on_ready()
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}", exc_info=True)
+        shutdown("warm-up failure", None)
+
+    serve_thread.join()
+    server.server_close()  # Waits for requests still being answered
+    service.close()
+
+def main():
+    """Run the inference service until SIGINT/SIGTERM, then drain and exit."""
+    parser = argparse.ArgumentParser(description="Agrivanna inference service")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker threads")
+    parser.add_argument("--max-queue", type=int, default=SERVER_MAX_QUEUE, help="Requests allowed to wait")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT_SEC, help="Per-request timeout (s)")
+    args = parser.parse_args()
+
+    service = InferenceService(workers=args.workers, max_queue=args.max_queue, request_timeout=args.timeout)
+    server = make_server(service, args.host, args.port)
+    logger.info(f"🚀 Listening on http://{args.host}:{args.port} ({args.workers} workers)")
+    serve(service, server)
+
+if __name__ == "__main__":
+    main()
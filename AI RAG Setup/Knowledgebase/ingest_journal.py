@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import threading
+import logging
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Resume interrupted documents from their last committed batch ("0": always start from page one)
+INGEST_RESUME = os.getenv('INGEST_RESUME', '1') == '1'
+# Least time between saves of a local index during ingestion; each save rewrites the namespace being filled
+INGEST_CHECKPOINT_SECONDS = float(os.getenv('INGEST_CHECKPOINT_SECONDS', '30'))
+
+def journal_path(docstore_path: str) -> str:
+    """Journal kept beside a docstore; it describes what that docstore and its index hold."""
+    return f"{docstore_path}-journal.jsonl"
+
+class IngestJournal:
+    """Append-only record of ingestion progress, one JSON event per line.
+
+    A document's run starts with a "start" event (file hash and chunking
+    settings), adds a "batch" event once each batch is in both the docstore
+    and the index, and ends with "done". Every event is fsynced before
+    ingestion moves on, so after a crash the journal lists exactly the
+    batches that were committed; a torn final line is ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, event: dict) -> None:
+        event["time"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def events(self, doc_id: str, namespace: str = "") -> list:
+        """Events of a document's most recent run."""
+        if not os.path.exists(self.path):
+            return []
+        run = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partly written when the process died
+                if event.get("doc") != doc_id or event.get("namespace") != namespace:
+                    continue
+                if event["event"] == "start":
+                    run = []
+                run.append(event)
+        return run
+
+    def state(self, doc_id: str, namespace: str = "") -> dict:
+        """Progress of a document's most recent run.
+
+        Returns:
+            dict: The run's "start" event, committed "batches", whether it is
+                "done", and where to continue: "next_page" (0-based) and "next_chunk"
+        """
+        run = self.events(doc_id, namespace)
+        batches = [event for event in run if event["event"] == "batch"]
+        return {
+            "start": run[0] if run and run[0]["event"] == "start" else None,
+            "batches": batches,
+            "done": any(event["event"] == "done" for event in run),
+            "next_page": batches[-1]["pages"][1] + 1 if batches else 0,
+            "next_chunk": batches[-1]["chunks"][1] if batches else 0,
+        }
+
+    def start(self, doc_id: str, namespace: str, settings: dict) -> None:
+        self._append({"event": "start", "doc": doc_id, "namespace": namespace, **settings})
+
+    def commit_batch(self, doc_id: str, namespace: str, pages: tuple, chunks: tuple) -> str:
+        """Record a batch as written to the docstore and the index.
+
+        Args:
+            doc_id (str): Document identifier
+            namespace (str): Namespace written to
+            pages (tuple): First and last 0-based page whose text the batch covers
+            chunks (tuple): Chunk indexes [start, end) written
+
+        Returns:
+            str: Batch id; vector ids are {doc_id}_chunk_{start..end-1}
+        """
+        batch_id = f"{doc_id}:{chunks[0]}-{chunks[1]}"
+        self._append({"event": "batch", "doc": doc_id, "namespace": namespace, "batch_id": batch_id,
+                      "pages": list(pages), "chunks": list(chunks)})
+        return batch_id
+
+    def finish(self, doc_id: str, namespace: str, chunks: int) -> None:
+        self._append({"event": "done", "doc": doc_id, "namespace": namespace, "chunks": chunks})
+
+    def clear(self) -> None:
+        """Forget all progress, so every document starts from page one."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import subprocess
+import logging
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from generation_gateway import percentile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SYMPTOM_SETS = [
+    ["reduced milk production", "warm udder", "abnormal milk"],
+    ["fever", "loss of appetite"],
+    ["lameness", "swollen hoof"],
+    ["distended left flank", "discomfort"],
+    ["coughing", "nasal discharge", "fever"],
+]
+FOLLOWUPS = [
+    "What is the withdrawal period after treatment?",
+    "What preventive measures should I take?",
+    "When should I call a veterinarian?",
+]
+
+def post(base_url: str, path: str, payload: dict, timeout: float) -> dict:
+    request = urllib.request.Request(
+        base_url + path,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def get(base_url: str, path: str, timeout: float = 5.0) -> dict:
+    with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def wait_until_ready(base_url: str, timeout: float = 300.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if get(base_url, "/health").get("ready"):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Service at {base_url} not ready after {timeout}s")
+
+def run_conversation(base_url: str, client_id: int, timeout: float) -> list:
+    """One analyze call, a follow-up and a raw retrieval; returns (endpoint, seconds, ok) tuples."""
+    samples = []
+    session_id = f"load-{client_id}-{time.time_ns()}"
+    calls = [
+        ("/analyze", {"session_id": session_id, "symptoms": random.choice(SYMPTOM_SETS)}),
+        ("/followup", {"session_id": session_id, "question": random.choice(FOLLOWUPS)}),
+        ("/retrieve", {"query": ", ".join(random.choice(SYMPTOM_SETS)), "top_k": 3}),
+    ]
+    for path, payload in calls:
+        start = time.perf_counter()
+        try:
+            post(base_url, path, payload, timeout)
+            samples.append((path, time.perf_counter() - start, True))
+        except Exception:
+            samples.append((path, time.perf_counter() - start, False))
+    return samples
+
+def run_load(base_url: str, clients: int, conversations: int, timeout: float) -> dict:
+    """Run `conversations` conversations across `clients` concurrent clients."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(lambda i: run_conversation(base_url, i, timeout), range(conversations)))
+    elapsed = time.perf_counter() - start
+
+    report = {"clients": clients, "conversations": conversations, "elapsed_sec": round(elapsed, 2),
+              "requests_per_sec": round(sum(len(r) for r in results) / elapsed, 2), "endpoints": {}}
+    samples = [sample for result in results for sample in result]
+    for path in sorted({path for path, _, _ in samples}):
+        latencies = [seconds for p, seconds, ok in samples if p == path and ok]
+        report["endpoints"][path] = {
+            "ok": len(latencies),
+            "errors": sum(1 for p, _, ok in samples if p == path and not ok),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        }
+    return report
+
+def main():
+    """Load test the inference service, optionally starting it with fake backends."""
+    parser = argparse.ArgumentParser(description="Load test the Agrivanna inference service")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--conversations", type=int, default=200, help="Conversations to run")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request (s)")
+    parser.add_argument("--spawn-fake", action="store_true",
+                        help="Start a local server with fake models and a local index")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn_fake:
+        port = args.url.rsplit(":", 1)[-1]
+        env = {**os.environ, "AGRIVANNA_BACKEND": "fake", "SERVER_PORT": port,
+               "DOCSTORE_PATH": os.getenv("DOCSTORE_PATH", "fake_docstore.db")}
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "inference_server.py")],
+                                  env=env)
+    try:
+        wait_until_ready(args.url)
+        report = run_load(args.url, args.clients, args.conversations, args.timeout)
+        report["server_metrics"] = get(args.url, "/metrics")
+        print(json.dumps(report, indent=2))
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import os
+import json
+import threading
+import logging
+from typing import List, Dict
+import numpy as np
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_INDEX_DIR = os.path.join(BASE_DIR, os.getenv('LOCAL_INDEX_DIR', 'local_index'))
+
+class Match:
+    """Search result with the same attributes as a Pinecone match."""
+    __slots__ = ("id", "score", "values", "metadata")
+
+    def __init__(self, id: str, score: float = 0.0, values: list = None, metadata: dict = None):
+        self.id = id
+        self.score = score
+        self.values = values or []
+        self.metadata = metadata
+
+    def __repr__(self):
+        return f"Match(id={self.id!r}, score={self.score:.4f})"
+
+class QueryResponse:
+    def __init__(self, matches: List[Match], namespace: str = ""):
+        self.matches = matches
+        self.namespace = namespace
+
+class FetchResponse:
+    def __init__(self, vectors: Dict[str, Match], namespace: str = ""):
+        self.vectors = vectors
+        self.namespace = namespace
+
+class IndexStats:
+    def __init__(self, dimension: int, namespaces: Dict[str, Dict]):
+        self.dimension = dimension
+        self.namespaces = namespaces
+        self.total_vector_count = sum(ns["vector_count"] for ns in namespaces.values())
+
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one record.
+
+    Supports $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $exists, $and, $or
+    and the {"field": value} shorthand for equality.
+    """
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op == "$exists" and (key in metadata) != operand:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+    return True
+
+class _Namespace:
+    def __init__(self, dimension: int):
+        self.ids = []
+        self.positions = {}  # id -> row
+        self.metadata = []
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+        self.pending = []  # rows appended since the matrix was last rebuilt
+        self.stem = None  # files holding this namespace in the saved index
+        self.dirty = True  # changed since it was last saved
+
+    def consolidate(self) -> None:
+        if self.pending:
+            self.matrix = np.vstack([np.asarray(self.matrix), np.vstack(self.pending)])
+            self.pending = []
+
+def _write_durably(path: str, write) -> None:
+    """Write a file beside `path`, fsync it and rename it into place."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _fsync_directory(path: str) -> None:
+    """Make renames in a directory durable (not possible on Windows)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class LocalIndexError(Exception):
+    pass
+
+class LocalIndex:
+    """In-process cosine-similarity index with the subset of the Pinecone
+    Index API used here (upsert, query, fetch, delete, list,
+    describe_index_stats).
+
+    Vectors are L2-normalized on insert, so the score is the dot product.
+    Metadata filters are evaluated before scoring, so only matching rows
+    are compared with the query.
+    """
+
+    def __init__(self, dimension: int, path: str = None):
+        """Create an empty index, or load one saved at `path`.
+
+        Args:
+            dimension (int): Vector dimension
+            path (str): Directory to load from and save to
+        """
+        self.dimension = dimension
+        self.path = path
+        self._lock = threading.RLock()
+        self._namespaces = {}
+        self._generation = 0  # bumped on every save; part of the names of the files it writes
+        if path and os.path.exists(os.path.join(path, "manifest.json")):
+            self.load(path)
+
+    def _namespace(self, namespace: str, create: bool = False) -> _Namespace:
+        if namespace not in self._namespaces and create:
+            self._namespaces[namespace] = _Namespace(self.dimension)
+        return self._namespaces.get(namespace)
+
+    def upsert(self, vectors: list, namespace: str = "") -> dict:
+        """Insert or overwrite (id, values, metadata) tuples or dicts."""
+        with self._lock:
+            ns = self._namespace(namespace, create=True)
+            ns.consolidate()
+            ns.dirty = True
+            if not ns.matrix.flags.writeable:
+                ns.matrix = np.array(ns.matrix)
+            for vector in vectors:
+                if isinstance(vector, dict):
+                    vector_id, values, metadata = vector["id"], vector["values"], vector.get("metadata")
+                else:
+                    vector_id, values, metadata = (tuple(vector) + (None,))[:3]
+                row = np.asarray(values, dtype=np.float32)
+                norm = np.linalg.norm(row)
+                row = row / norm if norm else row
+                if vector_id in ns.positions:
+                    position = ns.positions[vector_id]
+                    if position < len(ns.matrix):
+                        ns.matrix[position] = row
+                    else:
+                        ns.pending[position - len(ns.matrix)] = row
+                    ns.metadata[position] = metadata or {}
+                else:
+                    ns.positions[vector_id] = len(ns.ids)
+                    ns.ids.append(vector_id)
+                    ns.metadata.append(metadata or {})
+                    ns.pending.append(row)
+            return {"upserted_count": len(vectors)}
+
+    def query(self, vector: list, top_k: int = 10, filter: dict = None, namespace: str = "",
+              include_metadata: bool = False, include_values: bool = False, **kwargs) -> QueryResponse:
+        """Return the `top_k` most similar vectors that pass the filter."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or not ns.ids:
+                return QueryResponse([], namespace)
+            ns.consolidate()
+
+            if filter:
+                rows = np.array([i for i, metadata in enumerate(ns.metadata) if matches_filter(metadata, filter)],
+                                dtype=np.int64)
+                if not len(rows):
+                    return QueryResponse([], namespace)
+                candidates = ns.matrix[rows]
+            else:
+                rows = None
+                candidates = ns.matrix
+
+            query_vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            scores = candidates @ (query_vector / norm if norm else query_vector)
+
+            k = min(top_k, len(scores))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+
+            matches = []
+            for i in best:
+                position = int(rows[i]) if rows is not None else int(i)
+                matches.append(Match(
+                    ns.ids[position],
+                    float(scores[i]),
+                    ns.matrix[position].tolist() if include_values else None,
+                    dict(ns.metadata[position]) if include_metadata else None
+                ))
+            return QueryResponse(matches, namespace)
+
+    def fetch(self, ids: list, namespace: str = "") -> FetchResponse:
+        """Return stored vectors and metadata for the given ids."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            vectors = {}
+            if ns is not None:
+                ns.consolidate()
+                for vector_id in ids:
+                    if vector_id in ns.positions:
+                        position = ns.positions[vector_id]
+                        vectors[vector_id] = Match(vector_id, 0.0, ns.matrix[position].tolist(),
+                                                   dict(ns.metadata[position]))
+            return FetchResponse(vectors, namespace)
+
+    def delete(self, ids: list = None, namespace: str = "", delete_all: bool = False, filter: dict = None) -> dict:
+        """Delete vectors by id, by filter, or the whole namespace."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return {}
+            if delete_all:
+                del self._namespaces[namespace]
+                return {}
+            ns.consolidate()
+            ns.dirty = True
+            doomed = set(ids or [])
+            if filter:
+                doomed.update(vector_id for vector_id, metadata in zip(ns.ids, ns.metadata)
+                              if matches_filter(metadata, filter))
+            keep = [i for i, vector_id in enumerate(ns.ids) if vector_id not in doomed]
+            ns.ids = [ns.ids[i] for i in keep]
+            ns.metadata = [ns.metadata[i] for i in keep]
+            ns.matrix = np.asarray(ns.matrix)[keep]
+            ns.positions = {vector_id: i for i, vector_id in enumerate(ns.ids)}
+            return {}
+
+    def list(self, namespace: str = "", prefix: str = None, limit: int = 100):
+        """Yield pages of vector ids, like `Index.list` in the Pinecone client."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            ids = [vector_id for vector_id in (ns.ids if ns else [])
+                   if prefix is None or vector_id.startswith(prefix)]
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def iter_vectors(self, namespace: str = ""):
+        """Yield (id, values, metadata) for every vector in a namespace."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return
+            ns.consolidate()
+            rows = list(zip(ns.ids, np.asarray(ns.matrix), ns.metadata))
+        for vector_id, row, metadata in rows:
+            yield vector_id, row, metadata
+
+    def describe_index_stats(self) -> IndexStats:
+        with self._lock:
+            return IndexStats(self.dimension, {
+                name: {"vector_count": len(ns.ids)} for name, ns in self._namespaces.items()
+            })
+
+    def save(self, path: str = None) -> None:
+        """Write the index to a directory (one .npy matrix and .json columns per namespace).
+
+        Only namespaces changed since the last save are written, each to
+        new files; the manifest naming the current files is replaced last.
+        Every file is fsynced before it is renamed into place, so a crash
+        at any point leaves the previous save or this one, never a mix.
+        Files no manifest refers to any more are removed afterwards.
+        """
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        # Saving somewhere else writes everything and leaves this index's save state alone
+        in_place = path == self.path
+        with self._lock:
+            generation = self._generation + 1
+            manifest = {"dimension": self.dimension, "generation": generation, "namespaces": {}}
+            written = {}
+            for i, (name, ns) in enumerate(self._namespaces.items()):
+                if in_place and not ns.dirty and ns.stem:
+                    manifest["namespaces"][name] = ns.stem
+                    continue
+                ns.consolidate()
+                stem = f"ns{i}-g{generation}"
+                # New names rather than overwrites: the old matrix may still be memory-mapped
+                _write_durably(os.path.join(path, f"{stem}.npy"),
+                               lambda f: np.save(f, np.asarray(ns.matrix, dtype=np.float32)))
+                columns = json.dumps({"ids": ns.ids, "metadata": ns.metadata}).encode("utf-8")
+                _write_durably(os.path.join(path, f"{stem}.json"), lambda f: f.write(columns))
+                manifest["namespaces"][name] = written[name] = stem
+            _fsync_directory(path)
+            _write_durably(os.path.join(path, "manifest.json"),
+                           lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+            _fsync_directory(path)
+            if in_place:
+                self._generation = generation
+                for name, stem in written.items():
+                    self._namespaces[name].stem = stem
+                    self._namespaces[name].dirty = False
+            live = {f"{stem}{suffix}" for stem in manifest["namespaces"].values() for suffix in (".npy", ".json")}
+            for filename in os.listdir(path):
+                if filename.startswith("ns") and filename.endswith((".npy", ".json", ".tmp")) and filename not in live:
+                    try:
+                        os.remove(os.path.join(path, filename))
+                    except OSError:
+                        pass  # Still mapped on Windows; removed by a later save
+        logger.info(f"Saved local index to {path} ({len(written)} of {len(manifest['namespaces'])} namespaces written)")
+
+    def load(self, path: str) -> None:
+        """Load a saved index; matrices are memory-mapped read-only until written to.
+
+        Raises:
+            LocalIndexError: If a namespace's matrix and ids disagree on the number of rows
+        """
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        with self._lock:
+            self.dimension = manifest["dimension"]
+            self._generation = manifest.get("generation", 0)
+            self._namespaces = {}
+            for name, stem in manifest["namespaces"].items():
+                ns = _Namespace(self.dimension)
+                ns.matrix = np.load(os.path.join(path, f"{stem}.npy"), mmap_mode="r")
+                with open(os.path.join(path, f"{stem}.json"), encoding="utf-8") as f:
+                    columns = json.load(f)
+                ns.ids, ns.metadata = columns["ids"], columns["metadata"]
+                if not len(ns.ids) == len(ns.metadata) == len(ns.matrix):
+                    raise LocalIndexError(f"Namespace {name!r} in {path} has {len(ns.matrix)} vectors but "
+                                          f"{len(ns.ids)} ids and {len(ns.metadata)} metadata entries")
+                ns.positions = {vector_id: i for i, vector_id in enumerate(ns.ids)}
+                ns.stem, ns.dirty = stem, False
+                self._namespaces[name] = ns
+        logger.info(f"Loaded local index from {path}")
@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import threading
+import logging
+from collections import deque
+from dotenv import load_dotenv
+from generation_gateway import percentile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+GEMINI_FAST_MODEL = os.getenv('GEMINI_FAST_MODEL', 'gemini-1.5-flash')
+GEMINI_STRONG_MODEL = os.getenv('GEMINI_STRONG_MODEL', 'gemini-1.5-pro')
+ROUTER_MIN_RETRIEVAL_SCORE = float(os.getenv('ROUTER_MIN_RETRIEVAL_SCORE', '0.80'))
+ROUTER_MAX_FAST_SYMPTOMS = int(os.getenv('ROUTER_MAX_FAST_SYMPTOMS', '4'))
+ROUTER_MAX_FAST_DEPTH = int(os.getenv('ROUTER_MAX_FAST_DEPTH', '3'))
+
+# Phrases in a fast-model answer that suggest it was out of its depth
+HEDGING_PHRASES = [
+    "i'm not sure", "i am not sure", "cannot determine", "can't determine", "unable to determine",
+    "insufficient information", "not enough information", "unclear", "difficult to say",
+]
+MIN_ANSWER_CHARS = 200  # Analyses only; a short follow-up answer can be complete
+MIN_TOP_CONFIDENCE = 50  # Percent; lower stated diagnosis confidence triggers escalation
+# A percentage right before or after the word "confidence" ("85% confidence", "confidence: 40%");
+# other percentages, such as a 2% iodine dip, are not confidence levels
+CONFIDENCE_PATTERN = re.compile(
+    r"(\d{1,3})\s*%\s*confiden|confiden(?:ce|t)(?:\s+(?:level|of|is|about|around))*\s*[:=(-]?\s*(\d{1,3})\s*%"
+)
+# Number of recent latencies kept per route
+LATENCY_SAMPLES = 1000
+
+class ModelRouter:
+    """Send requests to a fast model first and escalate to a strong one when needed.
+
+    Requests go straight to the strong model when retrieval support is
+    weak, many symptoms are involved or the conversation has run long.
+    Otherwise the fast model answers, and its answer is escalated if it
+    looks unsure or incomplete.
+    """
+
+    def __init__(self, fast_gateway, strong_gateway,
+                 min_retrieval_score: float = ROUTER_MIN_RETRIEVAL_SCORE,
+                 max_fast_symptoms: int = ROUTER_MAX_FAST_SYMPTOMS,
+                 max_fast_depth: int = ROUTER_MAX_FAST_DEPTH):
+        """Initialize the router.
+
+        Args:
+            fast_gateway (GenerationGateway): Gateway for the fast model
+            strong_gateway (GenerationGateway): Gateway for the strong model
+            min_retrieval_score (float): Below this top score the strong model is used
+            max_fast_symptoms (int): Above this symptom count the strong model is used
+            max_fast_depth (int): Above this many follow-ups the strong model is used
+        """
+        self.fast_gateway = fast_gateway
+        self.strong_gateway = strong_gateway
+        self.min_retrieval_score = min_retrieval_score
+        self.max_fast_symptoms = max_fast_symptoms
+        self.max_fast_depth = max_fast_depth
+
+        self._lock = threading.Lock()
+        self._latencies = {route: deque(maxlen=LATENCY_SAMPLES) for route in ("fast", "strong", "escalated")}
+        self._counts = {route: 0 for route in self._latencies}
+        self._reasons = {}
+
+    def choose(self, top_score: float = None, symptom_count: int = 0, depth: int = 0) -> list:
+        """Return the reasons to skip the fast model (empty list means try it first)."""
+        reasons = []
+        if top_score is not None and top_score < self.min_retrieval_score:
+            reasons.append("low_retrieval_score")
+        if symptom_count > self.max_fast_symptoms:
+            reasons.append("many_symptoms")
+        if depth > self.max_fast_depth:
+            reasons.append("deep_conversation")
+        return reasons
+
+    def needs_escalation(self, text: str, required_sections: list = None) -> list:
+        """Return the reasons a fast-model answer should be redone (empty if acceptable).
+
+        Length and section checks only apply to structured answers (analyses),
+        which are the ones given `required_sections`.
+        """
+        reasons = []
+        lowered = (text or "").lower()
+        if required_sections and len(lowered) < MIN_ANSWER_CHARS:
+            reasons.append("short_answer")
+        if any(phrase in lowered for phrase in HEDGING_PHRASES):
+            reasons.append("hedging")
+        if required_sections and not all(section.lower() in lowered for section in required_sections):
+            reasons.append("missing_sections")
+        confidences = [int(before or after) for before, after in CONFIDENCE_PATTERN.findall(lowered)]
+        confidences = [value for value in confidences if value <= 100]
+        if confidences and max(confidences) < MIN_TOP_CONFIDENCE:
+            reasons.append("low_stated_confidence")
+        return reasons
+
+    def generate(self, content, top_score: float = None, symptom_count: int = 0, depth: int = 0,
+                 session_id: str = "default", required_sections: list = None, timeout: float = None) -> str:
+        """Generate a response on the cheapest route that is good enough.
+
+        Args:
+            content: Prompt string or list of prompt parts
+            top_score (float): Best retrieval score for the request, if known
+            symptom_count (int): Number of symptoms in the request
+            depth (int): Number of follow-ups so far in the conversation
+            session_id (str): Caller's session, used for fair queueing
+            required_sections (list): Headings a complete answer must contain
+            timeout (float): Seconds the whole request may take, shared by the first call and
+                any escalation (default: no limit)
+
+        Returns:
+            str: Generated text
+
+        Raises:
+            TimeoutError: The first call did not answer within `timeout`
+        """
+        start = time.monotonic()
+        expires = None if timeout is None else start + timeout
+
+        def remaining():
+            return None if expires is None else max(0.0, expires - time.monotonic())
+
+        reasons = self.choose(top_score, symptom_count, depth)
+        if reasons:
+            text = self.strong_gateway.generate(content, session_id=session_id, timeout=remaining()).text
+            self._record("strong", start, reasons)
+            return text
+
+        fast_text = self.fast_gateway.generate(content, session_id=session_id, timeout=remaining()).text
+        reasons = self.needs_escalation(fast_text, required_sections)
+        if not reasons:
+            self._record("fast", start, [])
+            return fast_text
+
+        # The fast answer is still usable, so keep it if the budget runs out before the strong model answers
+        if remaining() == 0.0:
+            logger.warning(f"No time left to escalate ({', '.join(reasons)}); keeping the fast answer")
+            self._record("fast", start, [])
+            return fast_text
+        logger.info(f"Escalating to strong model: {', '.join(reasons)}")
+        try:
+            text = self.strong_gateway.generate(content, session_id=session_id, timeout=remaining()).text
+        except TimeoutError:
+            logger.warning(f"Strong model missed the deadline ({', '.join(reasons)}); keeping the fast answer")
+            self._record("fast", start, [])
+            return fast_text
+        self._record("escalated", start, reasons)
+        return text
+
+    def _record(self, route: str, start: float, reasons: list) -> None:
+        with self._lock:
+            self._latencies[route].append(time.monotonic() - start)
+            self._counts[route] += 1
+            for reason in reasons:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def stats(self) -> dict:
+        """Per-route counts and latency percentiles, plus the escalation rate."""
+        with self._lock:
+            routes = {
+                route: {
+                    "count": self._counts[route],
+                    "p50_sec": round(percentile(latencies, 0.50), 3),
+                    "p95_sec": round(percentile(latencies, 0.95), 3),
+                }
+                for route, latencies in self._latencies.items()
+            }
+            fast_attempts = self._counts["fast"] + self._counts["escalated"]
+            all_latencies = [value for latencies in self._latencies.values() for value in latencies]
+            return {
+                "routes": routes,
+                "escalation_rate": round(self._counts["escalated"] / fast_attempts, 3) if fast_attempts else 0.0,
+                "overall_p50_sec": round(percentile(all_latencies, 0.50), 3),
+                "reasons": dict(self._reasons),
+            }
@@ -0,0 +1,176 @@
+import os
+import time
+import argparse
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Set, Tuple
+import fitz  # PyMuPDF
+from dotenv import load_dotenv
+from chunk_filters import strip_boilerplate
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Processes extracting page ranges of one PDF (1: extract in the ingesting process)
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Pages per task handed to a worker
+EXTRACT_RANGE_PAGES = int(os.getenv('EXTRACT_RANGE_PAGES', '16'))
+# Smaller documents are not worth starting the pool for
+EXTRACT_MIN_PAGES = int(os.getenv('EXTRACT_MIN_PAGES', '64'))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def extract_page_range(pdf_path: str, first_page: int, last_page: int, boilerplate: Set[str] = None) -> List[Tuple]:
+    """Extract and clean pages [first_page, last_page) of a PDF.
+
+    Runs in a worker process, which opens its own handle on the file:
+    PyMuPDF documents cannot be shared between processes.
+
+    Returns:
+        List[Tuple]: (text, boilerplate lines removed, characters removed) per page
+    """
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(first_page, last_page):
+            text = doc[page_num].get_text("text")
+            if boilerplate is None:
+                pages.append((text, 0, 0))
+                continue
+            cleaned, removed = strip_boilerplate(text, boilerplate)
+            pages.append((cleaned, removed, len(text) - len(cleaned)))
+    return pages
+
+def get_extraction_pool(workers: int = EXTRACT_WORKERS) -> ProcessPoolExecutor:
+    """Process-wide extraction pool, started once and reused for every document.
+
+    Workers are spawned, not forked: the parent already holds the embedding
+    model and its threads. Spawning re-imports the parent's modules, which
+    takes seconds, so the pool outlives a single PDF.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+            logger.info(f"Started {workers} page extraction workers")
+        return _pool
+
+def close_extraction_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+def iter_pages(pdf_path: str, first_page: int, total_pages: int, boilerplate: Set[str] = None,
+               workers: int = EXTRACT_WORKERS, range_pages: int = EXTRACT_RANGE_PAGES) -> Iterator[Tuple]:
+    """Yield (page_num, text, lines removed, characters removed) for each page, in page order.
+
+    With several workers, page ranges are extracted in parallel and at most
+    two ranges per worker are in flight; results are yielded in submission
+    order, so chunk boundaries and ids do not depend on the worker count.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        first_page (int): 0-based page to start at
+        total_pages (int): Number of pages in the document
+        boilerplate (Set[str]): Header/footer lines to strip (None: keep pages as extracted)
+        workers (int): Extraction processes
+        range_pages (int): Pages per task
+    """
+    if workers <= 1 or total_pages - first_page < EXTRACT_MIN_PAGES:
+        for start in range(first_page, total_pages, range_pages):
+            end = min(start + range_pages, total_pages)
+            for offset, page in enumerate(extract_page_range(pdf_path, start, end, boilerplate)):
+                yield (start + offset,) + page
+        return
+
+    pool = get_extraction_pool(workers)
+    ranges = deque((start, min(start + range_pages, total_pages))
+                   for start in range(first_page, total_pages, range_pages))
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, end = ranges.popleft()
+                in_flight.append((start, pool.submit(extract_page_range, pdf_path, start, end, boilerplate)))
+            start, future = in_flight.popleft()
+            for offset, page in enumerate(future.result()):
+                yield (start + offset,) + page
+    finally:
+        for _, future in in_flight:
+            future.cancel()  # Closed early: drop ranges nobody will read
+
+def benchmark(pdf_path: str, worker_counts: List[int], boilerplate: Set[str] = None,
+              range_pages: int = EXTRACT_RANGE_PAGES) -> List[dict]:
+    """Pages per second of full-document extraction at each worker count.
+
+    Every run must produce the same pages as the first one; a mismatch
+    raises, since chunking relies on the order being deterministic. Pool
+    startup is reported separately, as ingestion pays it once per run.
+    """
+    with fitz.open(pdf_path) as doc:
+        total_pages = len(doc)
+    results, reference = [], None
+    for workers in worker_counts:
+        startup = 0.0
+        if workers > 1:
+            start = time.perf_counter()
+            pool = get_extraction_pool(workers)
+            list(pool.map(extract_page_range, [pdf_path] * workers, [0] * workers, [1] * workers))
+            startup = time.perf_counter() - start
+        start = time.perf_counter()
+        pages = [text for _, text, _, _ in iter_pages(pdf_path, 0, total_pages, boilerplate, workers, range_pages)]
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = pages
+        elif pages != reference:
+            raise RuntimeError(f"Extraction with {workers} workers differs from {worker_counts[0]} workers")
+        results.append({"workers": workers, "pages": total_pages, "seconds": round(elapsed, 2),
+                        "pages_per_sec": round(total_pages / elapsed, 1), "startup_seconds": round(startup, 2)})
+    close_extraction_pool()
+    return results
+
+def main():
+    """Report extraction (and optionally embedding) throughput by worker count."""
+    parser = argparse.ArgumentParser(description="Page-parallel extraction benchmark")
+    parser.add_argument("pdf", help="PDF to extract")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--range-pages", type=int, default=EXTRACT_RANGE_PAGES)
+    parser.add_argument("--embed", type=int, default=0, help="Also embed this many chunks at each worker count")
+    args = parser.parse_args()
+
+    for result in benchmark(args.pdf, args.workers, range_pages=args.range_pages):
+        logger.info(f"📊 Extraction with {result['workers']} workers: {result['pages']} pages in "
+                    f"{result['seconds']}s ({result['pages_per_sec']} pages/s, "
+                    f"{result['startup_seconds']}s to start the pool)")
+
+    if args.embed:
+        from backends import load_embedder, EMBEDDING_MODEL
+        from embedding_engine import EmbeddingEngine
+        with fitz.open(args.pdf) as doc:
+            text = "".join(page.get_text("text") for page in doc)
+        texts = [text[i:i + 500] for i in range(0, len(text), 450)][:args.embed]
+        embedder = load_embedder(EMBEDDING_MODEL)
+        for workers in args.workers:
+            engine = EmbeddingEngine(embedder, workers=workers)
+            engine.encode(texts[:64])  # Warm up (and start the pool)
+            start = time.perf_counter()
+            engine.encode(texts)
+            elapsed = time.perf_counter() - start
+            engine.close()
+            logger.info(f"📊 Embedding with {workers} workers: {len(texts)} chunks in {elapsed:.2f}s "
+                        f"({len(texts) / elapsed:.1f} chunks/s)")
+
+if __name__ == "__main__":
+    main()
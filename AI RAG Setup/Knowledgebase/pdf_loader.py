@@ -2,14 +2,25 @@
 
 import os
 import fitz  # PyMuPDF
+import argparse
 import logging
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from dotenv import load_dotenv
 from tqdm import tqdm
 import time
-from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
+import bisect
 import torch
+from docstore import DocStore
+from backends import load_embedder, open_index
+from embedding_models import EMBEDDING_MODEL, secondary_models, sync_model_index
+from profiling import profile_run, profile_stage
+from projection import load_projection
+from index_versions import current_version, WARM_CACHE_AFTER_INGEST, WARM_CACHE_ANALYSES
+from embedding_engine import EmbeddingEngine, EMBED_WORKERS
+from page_extraction import iter_pages, close_extraction_pool, EXTRACT_WORKERS
+from chunk_filters import (NearDuplicateFilter, find_boilerplate_lines, sample_page_numbers, rebuild_filter,
+                           BOILERPLATE_FILTER, DEDUP_THRESHOLD)
+from ingest_journal import IngestJournal, journal_path, INGEST_RESUME, INGEST_CHECKPOINT_SECONDS
 
 # Configure logging
 logging.basicConfig(
@@ -20,93 +31,395 @@ logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
-PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
 PINECONE_INDEX_NAME = os.getenv('PINECONE_INDEX_NAME', 'agrivanna-knowledge')
-EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'intfloat/multilingual-e5-large')
+# Default chunking; recorded in index snapshots so imports can detect a mismatch
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '500'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '50'))
+
+PDF_FOLDER = os.path.join(os.path.dirname(__file__), "PDFs")
+DEFAULT_PDFS = [
+    os.path.join(PDF_FOLDER, "DairyCattle_23_FINAL.pdf"),
+    os.path.join(PDF_FOLDER, "2023-Producer-Policy-Handbook.pdf")
+]
+
+# Source type per known document; anything else is tagged "general"
+DOCUMENT_SOURCES = {
+    "DairyCattle_23_FINAL": "veterinary_guide",
+    "2023-Producer-Policy-Handbook": "policy_handbook",
+}
+
+# Keywords used to tag each chunk with a topic for metadata filtering
+TOPIC_KEYWORDS = {
+    "herd_health": ["disease", "mastitis", "lameness", "fever", "infection", "vaccin",
+                    "treatment", "veterinar", "antibiotic", "symptom", "udder", "bloat"],
+    "nutrition": ["feed", "ration", "forage", "silage", "protein", "mineral", "diet", "grazing"],
+    "reproduction": ["calving", "heifer", "breeding", "estrus", "insemination", "pregnan", "fertility"],
+    "milk_quality": ["milk", "somatic", "bulk tank", "milking", "dairy product"],
+    "policy": ["policy", "payment", "contract", "compliance", "penalty", "producer", "regulation"],
+}
+
+def tag_topic(text: str) -> str:
+    """Pick the topic whose keywords occur most often in the text.
+    
+    Args:
+        text (str): Chunk text
+        
+    Returns:
+        str: Topic name, or "general" if no keyword matches
+    """
+    lowered = text.lower()
+    scores = {
+        topic: sum(lowered.count(keyword) for keyword in keywords)
+        for topic, keywords in TOPIC_KEYWORDS.items()
+    }
+    best_topic = max(scores, key=scores.get)
+    return best_topic if scores[best_topic] > 0 else "general"
 
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 500, overlap: int = 50, batch_size: int = 32):
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, batch_size: int = 32,
+                 index=None, docstore: DocStore = None, resume: bool = INGEST_RESUME,
+                 extract_workers: int = EXTRACT_WORKERS, embed_workers: int = EMBED_WORKERS, live: bool = False):
         """Initialize with configurable parameters.
         
         Args:
             chunk_size (int): Size of text chunks (default: 500)
             overlap (int): Overlap between chunks (default: 50)
-            batch_size (int): Batch size for processing (default: 32)
+            batch_size (int): Chunks per docstore write and upsert (default: 32)
+            index: Vector index to write to (default with `live`: the version PINECONE_INDEX_NAME points at)
+            docstore (DocStore): Chunk text store (default with `live`: the docstore of that version)
+            resume (bool): Continue interrupted documents from the ingestion journal
+            extract_workers (int): Processes extracting page ranges of a PDF
+            embed_workers (int): Encoder processes
+            live (bool): Allow writing into the version being served; queries see the documents
+                change while they are written. Otherwise pass a new version's index and docstore
+                (see index_versions.build_version)
+
+        Raises:
+            ValueError: If the index or docstore is missing and `live` is not set
         """
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL)
+        if (index is None or docstore is None) and not live:
+            raise ValueError("Pass the index and docstore to write to (see index_versions.build_version), "
+                             "or live=True to write into the version being served")
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        self.embedder.to(self.device)
-        
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
-        self.index = self.pc.Index(PINECONE_INDEX_NAME)
+        self.embedder = load_embedder(EMBEDDING_MODEL)
+        # Length-sorted batches sized to the memory ceiling; batch_size only sets the upsert size
+        self.engine = EmbeddingEngine(self.embedder, device=self.device, workers=embed_workers)
+        self.extract_workers = extract_workers
+        index_name, docstore_path = current_version(PINECONE_INDEX_NAME)
+        self.docstore = docstore or DocStore(docstore_path)
+        # With a projection the index holds reduced vectors and the docstore the full ones
+        self.projection = load_projection(docstore_path=self.docstore.path)
+        self.index = index or open_index(index_name, self.projection.dimension if self.projection else None)
+        # Committed batches per document, so an interrupted run can pick up where it stopped
+        self.journal = IngestJournal(journal_path(self.docstore.path))
+        self.resume = resume
+        # Batches written to a local index that has not been saved since; journaled at the next checkpoint
+        self.pending_batches = []
+        self.last_checkpoint = time.time()
+        self.checkpoint_seconds = 0.0  # How long the last save took
         
         # Store configuration
         self.chunk_size = chunk_size
         self.overlap = overlap
         self.batch_size = batch_size
-        logger.info(f"Initialized processor with chunk_size={chunk_size}, overlap={overlap}, batch_size={batch_size}")
+        
+        # Near-duplicate filter per namespace, holding the chunks its docstore holds
+        self.dedup_filters = {}
+        self.filter_stats = {"boilerplate_lines": 0, "boilerplate_chars": 0, "duplicate_chunks": 0,
+                             "embedded_chunks": 0, "embed_seconds": 0.0}
+        logger.info(f"Initialized processor with chunk_size={chunk_size}, overlap={overlap}, batch_size={batch_size}, "
+                    f"{extract_workers} extraction and {embed_workers} embedding workers")
 
-    def process_pdf(self, pdf_path: str, namespace: str = "") -> None:
-        """Process PDF in smaller batches to avoid memory issues."""
+    def process_pdf(self, pdf_path: str, namespace: str = "", source_type: str = None,
+                    topic: str = None, restart: bool = False) -> None:
+        """Process PDF in smaller batches to avoid memory issues.
+        
+        Pages are extracted by a pool of processes in page ranges and
+        reassembled in order, so chunks and their ids are the same for any
+        number of workers.
+        
+        Each batch is recorded in the ingestion journal once it is in the
+        docstore and the index. If a previous run of the same file with the
+        same settings stopped part way, processing continues after its last
+        committed batch with the same chunk ids; a finished file is skipped.
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            namespace (str): Pinecone namespace to write into
+            source_type (str): Source type tag (default: looked up in DOCUMENT_SOURCES)
+            topic (str): Topic tag for every chunk (default: tagged per chunk by keywords)
+            restart (bool): Remove what earlier runs stored for the document and start from page one
+        """
         start_time = time.time()
         doc_id = os.path.splitext(os.path.basename(pdf_path))[0]
+        source_type = source_type or DOCUMENT_SOURCES.get(doc_id, "general")
+        
+        from index_snapshot import file_sha256  # index_snapshot imports this module
+        settings = {"sha256": file_sha256(pdf_path), "chunk_size": self.chunk_size, "overlap": self.overlap,
+                    "boilerplate_filter": BOILERPLATE_FILTER, "dedup_threshold": DEDUP_THRESHOLD}
+        state = self.journal.state(doc_id, namespace)
+        previous = state["start"]
+        matches = previous is not None and all(previous.get(key) == value for key, value in settings.items())
+        if matches and state["done"] and self.resume and not restart:
+            logger.info(f"⏭️ {doc_id} was already ingested with these settings; skipping")
+            return
+        resuming = matches and state["batches"] and self.resume and not restart
+        if not resuming:
+            if previous is not None or restart:
+                # Chunk boundaries may differ from the earlier run; leave none of its chunks behind
+                self.forget_document(doc_id, namespace)
+            self.journal.start(doc_id, namespace, settings)
+        first_page, first_chunk = (state["next_page"], state["next_chunk"]) if resuming else (0, 0)
+        pages = None
         
         try:
             doc = fitz.open(pdf_path)
             total_pages = len(doc)
             logger.info(f"\n📚 Processing: {doc_id} ({total_pages} pages)")
+            if resuming:
+                logger.info(f"↪️ Resuming at page {first_page + 1} (chunk {first_chunk}) after "
+                            f"{len(state['batches'])} committed batches")
+            if DEDUP_THRESHOLD > 0 and namespace not in self.dedup_filters:
+                self.restore_dedup(namespace, doc_id, first_chunk)
+            before = dict(self.filter_stats)
+            with profile_stage("filter"):
+                boilerplate = self.learn_boilerplate(doc) if BOILERPLATE_FILTER else set()
             
             # Process text in smaller chunks (10KB each)
             current_text = ""
-            total_chunks_processed = 0
+            page_offsets = []  # Offset in current_text where each page starts
+            page_numbers = []
+            total_chunks_processed = first_chunk
             chunk_batch = []
+            page_batch = []
+            batch_first_page = first_page
+            # Headers and footers are stripped in the extraction workers
+            pages = iter_pages(pdf_path, first_page, total_pages, boilerplate if BOILERPLATE_FILTER else None,
+                               self.extract_workers)
             
-            for page_num in tqdm(range(total_pages), desc="📄 Extracting text", unit="page"):
-                page = doc[page_num]
-                page_text = page.get_text("text") + "\n"
+            for page_num in tqdm(range(first_page, total_pages), desc="📄 Extracting text", unit="page",
+                                 initial=first_page, total=total_pages):
+                with profile_stage("extract"):
+                    _, page_text, removed, removed_chars = next(pages)
+                self.filter_stats["boilerplate_lines"] += removed
+                self.filter_stats["boilerplate_chars"] += removed_chars
+                page_text += "\n"
+                page_offsets.append(len(current_text))
+                page_numbers.append(page_num + 1)
                 current_text += page_text
                 
                 # Process when text reaches 10KB or on last page
                 if len(current_text) >= 10000 or page_num == total_pages - 1:
                     logger.info(f"Processing batch of text: {len(current_text)} characters")
                     
-                    # Create chunks from current text
-                    new_chunks = self.create_chunks(current_text)
-                    chunk_batch.extend(new_chunks)
-                    logger.info(f"Created {len(new_chunks)} chunks from current batch")
+                    # Create chunks from current text, noting the page each one starts on
+                    with profile_stage("chunk"):
+                        spans = self.chunk_spans(current_text)
+                    chunk_batch.extend(chunk for _, chunk in spans)
+                    page_batch.extend(
+                        page_numbers[bisect.bisect_right(page_offsets, start) - 1] for start, _ in spans
+                    )
+                    logger.info(f"Created {len(spans)} chunks from current batch")
                     
                     # Process chunks when batch is large enough
                     if len(chunk_batch) >= 100 or page_num == total_pages - 1:
+                        signatures = None
+                        if DEDUP_THRESHOLD > 0:
+                            with profile_stage("filter"):
+                                chunk_batch, page_batch, signatures = self.drop_duplicates(
+                                    chunk_batch, page_batch, namespace)
                         logger.info(f"Processing batch of {len(chunk_batch)} chunks")
-                        self.process_chunks(chunk_batch, doc_id, namespace)
+                        self.process_chunks(chunk_batch, doc_id, namespace,
+                                            start_index=total_chunks_processed,
+                                            source_type=source_type, topic=topic, pages=page_batch)
+                        self.commit_batch(doc_id, namespace, (batch_first_page, page_num),
+                                          (total_chunks_processed, total_chunks_processed + len(chunk_batch)),
+                                          chunk_batch, signatures)
                         total_chunks_processed += len(chunk_batch)
+                        batch_first_page = page_num + 1
                         chunk_batch = []  # Reset batch
+                        page_batch = []
                         
                         # Clear GPU cache if available
                         if torch.cuda.is_available():
                             torch.cuda.empty_cache()
                     
                     current_text = ""  # Reset current text
+                    page_offsets, page_numbers = [], []
                     
                 # Log progress every 10 pages
                 if (page_num + 1) % 10 == 0:
                     elapsed = time.time() - start_time
-                    pages_per_sec = (page_num + 1) / elapsed
+                    pages_per_sec = (page_num + 1 - first_page) / elapsed
                     logger.info(f"Progress: {page_num + 1}/{total_pages} pages "
                               f"({pages_per_sec:.2f} pages/sec)")
             
             doc.close()
+            self.checkpoint()
+            self.journal.finish(doc_id, namespace, total_chunks_processed)
+            # A sharded local index moves documents off shards that have grown too large
+            if hasattr(self.index, "rebalance"):
+                self.index.rebalance()
             elapsed = time.time() - start_time
             logger.info(f"✅ Processed {doc_id} ({total_chunks_processed} total chunks) "
-                       f"in {elapsed:.2f} seconds")
+                       f"in {elapsed:.2f} seconds ({(total_pages - first_page) / elapsed:.1f} pages/sec with "
+                       f"{self.extract_workers} extraction workers); dropped "
+                       f"{self.filter_stats['duplicate_chunks'] - before['duplicate_chunks']} near-duplicate chunks and "
+                       f"{self.filter_stats['boilerplate_lines'] - before['boilerplate_lines']} boilerplate lines")
             
         except Exception as e:
+            if pages is not None:
+                pages.close()  # Stops the extraction workers
             logger.error(f"Error processing PDF {pdf_path}: {str(e)}", exc_info=True)
+            try:
+                self.checkpoint()
+            except Exception as checkpoint_error:
+                self.pending_batches = []
+                logger.error(f"Could not save the batches written before the error: {checkpoint_error}")
+            logger.error("Committed batches are kept; the next run resumes after the last one")
             raise
 
+    def commit_batch(self, doc_id: str, namespace: str, pages: tuple, chunks: tuple,
+                     texts: List[str] = (), signatures: list = None) -> None:
+        """Record a processed batch; its chunks now count as seen by the duplicate filter.
+        
+        Pinecone upserts are durable when they return, so the batch is
+        journaled at once. A local index keeps them in memory and saving it
+        rewrites the namespace being filled, so batches are journaled at the
+        next checkpoint: at least INGEST_CHECKPOINT_SECONDS apart, and ten
+        times as long as the last save took, which keeps saving to a small
+        share of ingestion time however large the index grows.
+        
+        Args:
+            doc_id (str): Document identifier
+            namespace (str): Namespace written to
+            pages (tuple): First and last 0-based page the batch covers
+            chunks (tuple): Chunk indexes [start, end) written
+            texts (List[str]): The chunks written
+            signatures (list): Their near-duplicate signatures, if filtering
+        """
+        if signatures is not None:
+            dedup = self.dedup_filters.setdefault(namespace, NearDuplicateFilter(DEDUP_THRESHOLD))
+            for text, signature in zip(texts, signatures):
+                dedup.add(text, signature)
+        self.pending_batches.append((doc_id, namespace, pages, chunks))
+        if not hasattr(self.index, "save") or \
+                time.time() - self.last_checkpoint >= max(INGEST_CHECKPOINT_SECONDS, 10 * self.checkpoint_seconds):
+            self.checkpoint()
+    
+    def checkpoint(self) -> None:
+        """Make pending batches durable, then record them in the journal."""
+        if not self.pending_batches:
+            return
+        if hasattr(self.index, "save"):
+            save_start = time.time()
+            self.index.save()
+            self.checkpoint_seconds = time.time() - save_start
+        for doc_id, namespace, pages, chunks in self.pending_batches:
+            batch_id = self.journal.commit_batch(doc_id, namespace, pages, chunks)
+            logger.info(f"Committed batch {batch_id} (pages {pages[0] + 1}-{pages[1] + 1})")
+        self.pending_batches = []
+        self.last_checkpoint = time.time()
+
+    def forget_document(self, doc_id: str, namespace: str = "") -> int:
+        """Delete a document's chunks from the index and the docstore.
+        
+        The namespace's duplicate filter is dropped with them, to be rebuilt
+        from the docstore; otherwise the document's new chunks would be
+        dropped as repeats of the ones just deleted.
+        
+        Returns:
+            int: Number of chunks removed
+        """
+        ids = [record["id"] for record in self.docstore.iter_records(namespace) if record.get("doc_id") == doc_id]
+        for i in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[i:i + 1000], namespace=namespace)
+        removed = self.docstore.delete_document(doc_id, namespace)
+        self.dedup_filters.pop(namespace, None)
+        if removed:
+            logger.info(f"Removed {removed} chunks of {doc_id} from an earlier run")
+        return removed
+
+    def restore_dedup(self, namespace: str, doc_id: str, next_chunk: int) -> None:
+        """Rebuild the near-duplicate filter of a namespace from the docstore.
+        
+        Chunks of `doc_id` from `next_chunk` on belong to the batch that was
+        interrupted (or to the whole document when starting over); they are
+        written again and must not count as seen.
+        """
+        texts = (record["text"] for record in self.docstore.iter_records(namespace)
+                 if record.get("doc_id") != doc_id or record.get("chunk_index", 0) < next_chunk)
+        self.dedup_filters[namespace] = rebuild_filter(texts, DEDUP_THRESHOLD)
+        logger.info(f"Rebuilt duplicate filter from {len(self.dedup_filters[namespace])} stored chunks")
+
+    def learn_boilerplate(self, doc) -> set:
+        """Find a document's running headers and footers from a sample of its pages."""
+        pages = [doc[page_num].get_text("text") for page_num in sample_page_numbers(len(doc))]
+        boilerplate = find_boilerplate_lines(pages)
+        if boilerplate:
+            logger.info(f"Header/footer lines to drop: {sorted(boilerplate)[:10]}")
+        return boilerplate
+
+    def drop_duplicates(self, chunks: List[str], pages: List[int], namespace: str) -> tuple:
+        """Drop chunks that nearly repeat one already kept in the namespace or earlier in the batch.
+        
+        The namespace's filter is only read here; `commit_batch` adds the
+        kept chunks once they are written, so a batch that fails is not
+        dropped as a repeat of itself when it is tried again.
+        
+        Args:
+            chunks (List[str]): Chunks about to be embedded
+            pages (List[int]): Page each chunk starts on
+            namespace (str): Namespace the chunks are written to
+            
+        Returns:
+            tuple: (kept chunks, their pages, their signatures)
+        """
+        dedup = self.dedup_filters.setdefault(namespace, NearDuplicateFilter(DEDUP_THRESHOLD))
+        batch = NearDuplicateFilter(DEDUP_THRESHOLD)  # Same seed, so signatures are interchangeable
+        kept = []
+        for chunk, page in zip(chunks, pages):
+            signature = dedup.signature(chunk)
+            if not dedup.contains(signature) and not batch.contains(signature):
+                batch.add(chunk, signature)
+                kept.append((chunk, page, signature))
+        self.filter_stats["duplicate_chunks"] += len(chunks) - len(kept)
+        return [chunk for chunk, _, _ in kept], [page for _, page, _ in kept], [signature for _, _, signature in kept]
+
+    def ingestion_summary(self) -> dict:
+        """Chunks kept out of the index by filtering, and the embedding time that saved.
+        
+        Boilerplate lines are counted as the chunks their characters would
+        have filled; time is estimated from the measured embedding rate.
+        """
+        stats = self.filter_stats
+        chunks_saved = stats["duplicate_chunks"] + stats["boilerplate_chars"] // max(1, self.chunk_size - self.overlap)
+        per_chunk = stats["embed_seconds"] / stats["embedded_chunks"] if stats["embedded_chunks"] else 0.0
+        return {
+            "embedded_chunks": stats["embedded_chunks"],
+            "duplicate_chunks": stats["duplicate_chunks"],
+            "boilerplate_lines": stats["boilerplate_lines"],
+            "chunks_saved": chunks_saved,
+            "share_saved": round(chunks_saved / (chunks_saved + stats["embedded_chunks"]), 3)
+                           if chunks_saved + stats["embedded_chunks"] else 0.0,
+            "embed_seconds": round(stats["embed_seconds"], 2),
+            "embed_seconds_saved": round(chunks_saved * per_chunk, 2),
+        }
+
     def create_chunks(self, text: str) -> List[str]:
         """Create chunks with progress tracking."""
-        chunks = []
+        return [chunk for _, chunk in self.chunk_spans(text)]
+
+    def chunk_spans(self, text: str) -> List[Tuple[int, str]]:
+        """Split text into overlapping chunks, keeping each chunk's start offset.
+        
+        Args:
+            text (str): Text to split
+            
+        Returns:
+            List[Tuple[int, str]]: (start offset, stripped chunk) pairs
+        """
+        spans = []
         start = 0
         text_length = len(text)
         
@@ -116,72 +429,145 @@ class DocumentProcessor:
                 chunk = text[start:end].strip()
                 
                 if chunk:  # Only add non-empty chunks
-                    chunks.append(chunk)
+                    spans.append((start, chunk))
                 
                 # Update progress
                 pbar.update(end - start)
+                if end == text_length:
+                    break  # Stepping back by the overlap here would loop forever
                 start = end - self.overlap
         
-        return chunks
+        return spans
 
-    def process_chunks(self, chunks: List[str], doc_id: str, namespace: str):
-        """Process chunks with detailed progress."""
+    def process_chunks(self, chunks: List[str], doc_id: str, namespace: str, start_index: int = 0,
+                       source_type: str = "general", topic: str = None, pages: List[int] = None):
+        """Process chunks with detailed progress.
+        
+        Chunk text goes to the local docstore; the vector index only receives
+        ids and the small fields used for metadata filtering.
+        
+        Args:
+            chunks (List[str]): Text chunks to embed and store
+            doc_id (str): Document identifier
+            namespace (str): Pinecone namespace
+            start_index (int): Index of the first chunk within the document
+            source_type (str): Source type tag for every chunk
+            topic (str): Topic tag for every chunk (default: tagged per chunk)
+            pages (List[int]): 1-based page each chunk starts on, if known
+        """
         if not chunks:
             return
         
         total_chunks = len(chunks)
         logger.info(f"Processing {total_chunks} chunks in batches of {self.batch_size}")
         
+        # Embed every chunk at once so the engine can group them by length
+        embed_start = time.time()
+        with profile_stage("embed"):
+            all_embeddings = self.engine.encode(chunks)
+        self.filter_stats["embed_seconds"] += time.time() - embed_start
+        self.filter_stats["embedded_chunks"] += total_chunks
+        
         for i in tqdm(range(0, total_chunks, self.batch_size), desc="💾 Processing chunks"):
             batch = chunks[i:i + self.batch_size]
+            embeddings = all_embeddings[i:i + self.batch_size]
             
-            # Generate embeddings
-            embeddings = self.embedder.encode(
-                batch,
-                batch_size=self.batch_size,
-                show_progress_bar=False,
-                convert_to_tensor=True,
-                device=self.device
-            )
+            # Store text locally before the ids become searchable
+            records = [
+                {"id": f"{doc_id}_chunk_{start_index+i+j}", "text": chunk,
+                 "doc_id": doc_id, "chunk_index": start_index+i+j,
+                 "source_type": source_type, "topic": topic or tag_topic(chunk)}
+                for j, chunk in enumerate(batch)
+            ]
+            if pages:
+                for record, page in zip(records, pages[i:i + self.batch_size]):
+                    record["page"] = page
+            with profile_stage("docstore"):
+                self.docstore.put_many(records, namespace=namespace)
+                if self.projection is not None:
+                    self.docstore.put_embeddings([record["id"] for record in records], embeddings, namespace)
+                    embeddings = self.projection.transform(embeddings)
             
-            # Prepare vectors
+            # Prepare vectors; every non-text field is filterable in the index
             vectors = [
-                (f"{doc_id}_chunk_{i+j}", 
-                 embedding.cpu().tolist(), 
-                 {"text": chunk, "doc_id": doc_id, "chunk_index": i+j})
-                for j, (chunk, embedding) in enumerate(zip(batch, embeddings))
+                (record["id"], 
+                 embedding.tolist(), 
+                 {k: v for k, v in record.items() if k not in ("id", "text")})
+                for record, embedding in zip(records, embeddings)
             ]
             
             # Upload batch
-            self.index.upsert(vectors=vectors, namespace=namespace)
+            with profile_stage("upsert"):
+                self.index.upsert(vectors=vectors, namespace=namespace)
             
             # Log progress
             logger.info(f"Processed batch {i//self.batch_size + 1}/{(total_chunks+self.batch_size-1)//self.batch_size}")
 
 def main():
     """Process PDFs with progress tracking."""
-    processor = DocumentProcessor()
-    pdf_folder = os.path.join(os.path.dirname(__file__), "PDFs")
-    pdfs = [
-        os.path.join(pdf_folder, "DairyCattle_23_FINAL.pdf"),
-        os.path.join(pdf_folder, "2023-Producer-Policy-Handbook.pdf")
-    ]
+    parser = argparse.ArgumentParser(description="Ingest PDFs into the knowledge base")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Write into the version being served instead of building a new one; "
+                             "queries see partial results until ingestion finishes")
+    parser.add_argument("--restart", action="store_true",
+                        help="With --in-place, ignore the ingestion journal and reprocess every document from page one")
+    args = parser.parse_args()
+    pdfs = DEFAULT_PDFS
+
+    if not args.in_place:
+        # Imported here: index_versions imports this module to build versions
+        from index_versions import build_version
+        missing = [pdf_path for pdf_path in pdfs if not os.path.exists(pdf_path)]
+        for pdf_path in missing:
+            logger.error(f"PDF not found: {pdf_path}")
+        with profile_run("ingestion"):
+            build_version([pdf_path for pdf_path in pdfs if pdf_path not in missing])
+        close_extraction_pool()
+        return
+
+    processor = DocumentProcessor(live=True)
     
     total_start = time.time()
     logger.info(f"🚀 Starting to process {len(pdfs)} PDFs")
     
-    for pdf_path in pdfs:
-        if not os.path.exists(pdf_path):
-            logger.error(f"PDF not found: {pdf_path}")
-            continue
-            
-        try:
-            processor.process_pdf(pdf_path)
-        except Exception as e:
-            logger.error(f"Failed to process {pdf_path}: {e}")
+    # AGRIVANNA_PROFILE=1 writes CPU, stack and memory profiles to PROFILE_DIR
+    with profile_run("ingestion"):
+        for pdf_path in pdfs:
+            if not os.path.exists(pdf_path):
+                logger.error(f"PDF not found: {pdf_path}")
+                continue
+                
+            try:
+                processor.process_pdf(pdf_path, restart=args.restart)
+            except Exception as e:
+                logger.error(f"Failed to process {pdf_path}: {e}")
     
+    processor.engine.close()
+    close_extraction_pool()
+    if hasattr(processor.index, "save"):
+        processor.index.save()
     total_time = time.time() - total_start
     logger.info(f"✨ Completed all PDFs in {total_time:.2f} seconds")
+    summary = processor.ingestion_summary()
+    logger.info(f"🧹 Filtering kept {summary['chunks_saved']} chunks ({summary['share_saved']:.1%}) out of the index "
+                f"({summary['duplicate_chunks']} near-duplicates, {summary['boilerplate_lines']} boilerplate lines), "
+                f"saving ~{summary['embed_seconds_saved']:.1f}s of {summary['embed_seconds']:.1f}s embedding")
+
+    # Registered models besides EMBEDDING_MODEL index the same chunks side by side
+    for model in secondary_models():
+        try:
+            sync_model_index(model.name)
+        except Exception as e:
+            logger.error(f"Could not update the {model.name} index: {e}")
+
+    if WARM_CACHE_AFTER_INGEST:
+        # Imported here so ingestion does not require the generation stack
+        from ai_response import AgrivannaAI
+        from warm_cache import build_warm_cache
+        try:
+            build_warm_cache(AgrivannaAI("warm-cache"), include_analysis=WARM_CACHE_ANALYSES)
+        except Exception as e:
+            logger.error(f"Warm cache rebuild failed: {e}")
 
 if __name__ == "__main__":
     main()
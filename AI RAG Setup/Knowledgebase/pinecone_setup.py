@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec
 import logging
 from sentence_transformers import SentenceTransformer
+from embedding_models import EMBEDDING_MODEL, EMBEDDING_DIMENSION
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,7 +13,6 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
 PINECONE_INDEX_NAME = os.getenv('PINECONE_INDEX_NAME', 'agrivanna-knowledge-test')
-EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'intfloat/multilingual-e5-large')
 
 def verify_embedding_model():
     """Verify the embedding model loads correctly."""
@@ -27,22 +27,27 @@ def verify_embedding_model():
         logger.error(f"❌ Error loading embedding model: {e}")
         return False
 
-def create_pinecone_index():
-    """Create Pinecone index if it doesn't exist."""
+def create_pinecone_index(dimension: int = EMBEDDING_DIMENSION, index_name: str = PINECONE_INDEX_NAME):
+    """Create Pinecone index if it doesn't exist.
+    
+    Args:
+        dimension (int): Vector dimension (smaller than the model's for a projected index)
+        index_name (str): Name of the index to create
+    """
     try:
         pc = Pinecone(api_key=PINECONE_API_KEY)
         
         # Check if index already exists
         existing_indexes = [index.name for index in pc.list_indexes()]
         
-        if PINECONE_INDEX_NAME in existing_indexes:
-            logger.info(f"Index '{PINECONE_INDEX_NAME}' already exists")
+        if index_name in existing_indexes:
+            logger.info(f"Index '{index_name}' already exists")
             return True
             
         # Create new index
         pc.create_index(
-            name=PINECONE_INDEX_NAME,
-            dimension=1024,  # Dimension for multilingual-e5-large
+            name=index_name,
+            dimension=dimension,
             metric="cosine",
             spec=ServerlessSpec(
                 cloud="aws",
@@ -50,7 +55,7 @@ def create_pinecone_index():
             )
         )
         
-        logger.info(f"Successfully created index '{PINECONE_INDEX_NAME}' for model {EMBEDDING_MODEL}")
+        logger.info(f"Successfully created index '{index_name}' ({dimension} dims) for model {EMBEDDING_MODEL}")
         return True
         
     except Exception as e:
@@ -0,0 +1,219 @@
+import os
+import gc
+import time
+import socket
+import signal
+import argparse
+import logging
+from dotenv import load_dotenv
+from backends import load_embedder, EMBEDDING_MODEL
+from inference_server import (InferenceService, make_server, serve, SERVER_HOST, SERVER_PORT,
+                              SERVER_WORKERS, SERVER_MAX_QUEUE, REQUEST_TIMEOUT_SEC)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+PREFORK_WORKERS = int(os.getenv('PREFORK_WORKERS', '4'))
+# Torch intra-op threads per worker process; N workers x all cores oversubscribes the CPU
+PREFORK_TORCH_THREADS = int(os.getenv('PREFORK_TORCH_THREADS', '1'))
+PREFORK_REPORT_SEC = float(os.getenv('PREFORK_REPORT_SEC', '300'))
+
+class ProcessIdFilter(logging.Filter):
+    """Prefixes messages with the id of the process that logged them.
+
+    Workers write through the handlers they inherit from the parent, so
+    this tags their lines without replacing anyone's format.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "process_tagged", False):
+            record.msg = f"[{record.process}] {record.msg}"
+            record.process_tagged = True  # A record goes through every handler's filters
+        return True
+
+def tag_process_ids() -> None:
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, ProcessIdFilter) for f in handler.filters):
+            handler.addFilter(ProcessIdFilter())
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+def memory_usage(pid: int) -> dict:
+    """Resident memory of a process in MiB, from /proc/<pid>/smaps_rollup (Linux 4.14+).
+
+    Pss splits shared pages between the processes mapping them, so summing
+    Pss over the parent and workers gives their true combined footprint;
+    Private is what one more worker would add.
+    """
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            field, _, value = line.partition(":")
+            if field in SMAPS_FIELDS:
+                usage[field] = int(value.split()[0]) / 1024  # kB -> MiB
+    usage["Private"] = usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0)
+    return {field: round(value, 1) for field, value in usage.items()}
+
+def memory_report(parent_pid: int, worker_pids: list) -> dict:
+    """Per-process usage plus the combined footprint and the cost of one extra worker."""
+    processes = {}
+    for pid in [parent_pid] + worker_pids:
+        try:
+            processes[pid] = memory_usage(pid)
+        except OSError:
+            continue
+    workers = [processes[pid] for pid in worker_pids if pid in processes]
+    return {
+        "processes": processes,
+        "total_pss_mib": round(sum(usage["Pss"] for usage in processes.values()), 1),
+        "total_rss_mib": round(sum(usage["Rss"] for usage in processes.values()), 1),
+        "per_extra_worker_mib": round(sum(usage["Private"] for usage in workers) / len(workers), 1)
+                                if workers else 0.0,
+    }
+
+def log_memory_report(parent_pid: int, worker_pids: list) -> None:
+    report = memory_report(parent_pid, worker_pids)
+    for pid, usage in report["processes"].items():
+        role = "parent" if pid == parent_pid else "worker"
+        logger.info(f"  {role} {pid}: RSS {usage['Rss']} MiB, PSS {usage['Pss']} MiB, "
+                    f"shared {usage.get('Shared_Clean', 0) + usage.get('Shared_Dirty', 0):.1f} MiB, "
+                    f"private {usage['Private']} MiB")
+    logger.info(f"📊 {len(worker_pids)} workers: PSS total {report['total_pss_mib']} MiB "
+                f"(RSS would suggest {report['total_rss_mib']} MiB), "
+                f"each extra worker adds ~{report['per_extra_worker_mib']} MiB")
+
+class PreforkServer:
+    """Load the embedding model once, then fork workers that share its weights.
+
+    The parent imports everything and loads the model, freezes the garbage
+    collector so that later collections in the workers do not write to (and
+    so copy) the inherited objects, binds the listening socket, and forks.
+    Each worker runs its own InferenceService on the shared socket; the
+    kernel spreads connections across them. Nothing that owns threads,
+    sockets or database connections is created before the fork.
+    """
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT, processes: int = PREFORK_WORKERS,
+                 threads: int = SERVER_WORKERS, max_queue: int = SERVER_MAX_QUEUE,
+                 request_timeout: float = REQUEST_TIMEOUT_SEC):
+        """Initialize the server.
+
+        Args:
+            host (str): Address to listen on
+            port (int): Port to listen on
+            processes (int): Worker processes to fork
+            threads (int): Request threads per worker
+            max_queue (int): Requests allowed to wait per worker
+            request_timeout (float): Per-request timeout (s)
+        """
+        self.host = host
+        self.port = port
+        self.processes = processes
+        self.service_args = {"workers": threads, "max_queue": max_queue, "request_timeout": request_timeout}
+        self.socket = None
+        self.workers = {}  # pid -> worker slot
+        self.stopping = False
+
+    def preload(self) -> None:
+        """Load shared state in the parent before any worker exists."""
+        start = time.time()
+        load_embedder(EMBEDDING_MODEL)
+        gc.collect()
+        gc.freeze()  # Move everything to the permanent generation; workers never scan it
+        logger.info(f"Preloaded {EMBEDDING_MODEL} in {time.time() - start:.2f}s")
+
+    def bind(self) -> None:
+        self.socket = socket.create_server((self.host, self.port), backlog=128, reuse_port=False)
+        self.socket.set_inheritable(True)
+
+    def spawn(self, slot: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_worker(slot)
+            except BaseException:
+                logger.exception(f"Worker {slot} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = slot
+        return pid
+
+    def run_worker(self, slot: int) -> None:
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        import torch
+        torch.set_num_threads(PREFORK_TORCH_THREADS)
+
+        service = InferenceService(**self.service_args)
+        server = make_server(service, listen_socket=self.socket)
+
+        def on_ready():
+            usage = memory_usage(os.getpid())
+            logger.info(f"Worker {slot} ready: RSS {usage['Rss']} MiB, PSS {usage['Pss']} MiB, "
+                        f"private {usage['Private']} MiB")
+
+        serve(service, server, on_ready=on_ready)
+
+    def stop(self, signum, frame) -> None:
+        logger.info(f"Received signal {signum}, stopping {len(self.workers)} workers...")
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        """Preload, fork the workers and supervise them until stopped."""
+        self.preload()
+        self.bind()
+        parent_pid = os.getpid()
+        for slot in range(self.processes):
+            self.spawn(slot)
+        logger.info(f"🚀 Listening on http://{self.host}:{self.port} ({self.processes} processes)")
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: log_memory_report(parent_pid, list(self.workers)))
+
+        next_report = time.time() + min(PREFORK_REPORT_SEC, 60)  # First report once workers have warmed up
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                slot = self.workers.pop(pid)
+                if not self.stopping:
+                    logger.warning(f"Worker {slot} (pid {pid}) exited with status {status}; restarting")
+                    self.spawn(slot)
+                continue
+            if time.time() >= next_report and not self.stopping:
+                log_memory_report(parent_pid, list(self.workers))
+                next_report = time.time() + PREFORK_REPORT_SEC
+            time.sleep(0.5)
+
+        self.socket.close()
+        logger.info("👋 All workers stopped")
+
+def main():
+    """Run the inference service as a pre-fork pool of worker processes."""
+    parser = argparse.ArgumentParser(description="Agrivanna pre-fork inference server")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--processes", type=int, default=PREFORK_WORKERS, help="Worker processes")
+    parser.add_argument("--threads", type=int, default=SERVER_WORKERS, help="Request threads per worker")
+    parser.add_argument("--max-queue", type=int, default=SERVER_MAX_QUEUE, help="Requests allowed to wait per worker")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT_SEC, help="Per-request timeout (s)")
+    args = parser.parse_args()
+
+    tag_process_ids()
+    PreforkServer(args.host, args.port, args.processes, args.threads, args.max_queue, args.timeout).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+import logging
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Opt-in: profiling slows everything down, tracemalloc especially
+PROFILE_ENABLED = os.getenv('AGRIVANNA_PROFILE', '0') == '1'
+PROFILE_DIR = os.path.join(BASE_DIR, os.getenv('PROFILE_DIR', 'profiles'))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', '25'))
+
+_active = None  # The RunProfiler currently recording, if any
+
+# Keep the profiler's own bookkeeping out of allocation reports
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.top_allocations = None  # Captured on the first call
+
+class RunProfiler:
+    """CPU, wall-clock and memory profile of one ingestion or query run.
+
+    While active it records:
+      - a cProfile of the thread that started the run (`.prof`, for pstats/snakeviz)
+      - wall-clock stacks of every thread, sampled on a timer and written in
+        collapsed format (`.collapsed`, for flamegraph.pl or speedscope)
+      - per-stage call counts, time and tracemalloc peak, plus the lines that
+        allocated most during each stage's first call (`-memory.txt`)
+
+    Code marks stages with `profile_stage(name)`; stages are also the root
+    frame of every sampled stack so the flamegraph splits by stage.
+    """
+
+    def __init__(self, run_name: str, output_dir: str = PROFILE_DIR,
+                 sample_interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS, top_n: int = PROFILE_TOP_N):
+        self.run_name = run_name
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval_ms / 1000.0
+        self.top_n = top_n
+        self.prefix = os.path.join(output_dir, f"{run_name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        self.stages = {}
+        self.samples = Counter()
+        self._stage_stacks = {}  # thread id -> list of [name, peak bytes]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._profile = cProfile.Profile()
+        self._log_handler = None
+        self._run_peak = 0  # Stages reset the tracemalloc peak, so keep the run's own
+        self.started_at = None
+
+    def __enter__(self):
+        global _active
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Run log goes beside the profile outputs
+        self._log_handler = logging.FileHandler(f"{self.prefix}.log", encoding="utf-8")
+        self._log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logging.getLogger().addHandler(self._log_handler)
+
+        tracemalloc.start()
+        self.started_at = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        _active = self
+        logger.info(f"📈 Profiling {self.run_name} into {self.prefix}.*")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = None
+        self._profile.disable()
+        self._stop.set()
+        self._sampler.join()
+        elapsed = time.perf_counter() - self.started_at
+        final_snapshot = take_snapshot()
+        run_peak = max(self._run_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        self._profile.dump_stats(f"{self.prefix}.prof")
+        with open(f"{self.prefix}.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self._write_memory_summary(final_snapshot, run_peak, elapsed)
+        with open(f"{self.prefix}-stages.json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(elapsed), f, indent=2)
+
+        logger.info(f"📈 Profile written to {self.prefix}.* ({elapsed:.2f}s, peak {run_peak / 2**20:.1f} MiB)")
+        logging.getLogger().removeHandler(self._log_handler)
+        self._log_handler.close()
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage and track its tracemalloc peak, including nested stages."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            stack = self._stage_stacks.setdefault(thread_id, [])
+            self._raise_peaks(stack)
+            entry = [name, 0]
+            stack.append(entry)
+            stats = self.stages.setdefault(name, StageStats())
+            first_call = stats.calls == 0
+        before = take_snapshot() if first_call else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            after = take_snapshot() if first_call else None
+            with self._lock:
+                self._raise_peaks(stack)
+                stack.pop()
+                stats.calls += 1
+                stats.seconds += seconds
+                stats.peak_bytes = max(stats.peak_bytes, entry[1])
+                if first_call:
+                    stats.top_allocations = after.compare_to(before, "lineno")[:self.top_n]
+
+    def _raise_peaks(self, stack: list) -> None:
+        """Credit the peak since the last reset to every open stage, then reset it."""
+        _, peak = tracemalloc.get_traced_memory()
+        self._run_peak = max(self._run_peak, peak)
+        for entry in stack:
+            entry[1] = max(entry[1], peak)
+        tracemalloc.reset_peak()
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            with self._lock:
+                stage_names = {tid: [name for name, _ in stack] for tid, stack in self._stage_stacks.items()}
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                calls.reverse()
+                stages = stage_names.get(thread_id) or ["-"]
+                self.samples[";".join(stages + calls)] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "run": self.run_name,
+            "elapsed_sec": round(elapsed, 3),
+            "samples": sum(self.samples.values()),
+            "stages": {
+                name: {"calls": stats.calls, "seconds": round(stats.seconds, 3),
+                       "peak_mib": round(stats.peak_bytes / 2**20, 2)}
+                for name, stats in self.stages.items()
+            },
+        }
+
+    def _write_memory_summary(self, snapshot, run_peak: int, elapsed: float) -> None:
+        lines = [f"Run {self.run_name}: {elapsed:.2f}s, tracemalloc peak {run_peak / 2**20:.1f} MiB", ""]
+        lines.append(f"{'stage':<24}{'calls':>8}{'seconds':>12}{'peak MiB':>12}")
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1].peak_bytes):
+            lines.append(f"{name:<24}{stats.calls:>8}{stats.seconds:>12.3f}{stats.peak_bytes / 2**20:>12.2f}")
+
+        for name, stats in self.stages.items():
+            if stats.top_allocations:
+                lines += ["", f"Top {self.top_n} allocation growth during first '{name}' call:"]
+                lines += [f"  {stat}" for stat in stats.top_allocations]
+
+        lines += ["", f"Top {self.top_n} live allocations at end of run:"]
+        lines += [f"  {stat}" for stat in snapshot.statistics("lineno")[:self.top_n]]
+        with open(f"{self.prefix}-memory.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+def profile_run(run_name: str, enabled: bool = None):
+    """Profile the enclosed run if profiling is enabled (AGRIVANNA_PROFILE=1)."""
+    if enabled is None:
+        enabled = PROFILE_ENABLED
+    if not enabled or _active is not None:
+        return nullcontext()
+    return RunProfiler(run_name)
+
+def profile_stage(name: str):
+    """Mark a stage of the active profiled run; a no-op when not profiling."""
+    profiler = _active
+    return profiler.stage(name) if profiler is not None else nullcontext()
@@ -0,0 +1,276 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from docstore import DOCSTORE_PATH
+from backends import open_index, EMBEDDING_MODEL, EMBEDDING_DIMENSION, PINECONE_INDEX_NAME
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Projection of the unversioned index; empty: it stores full-dimension vectors and no rescoring happens
+PROJECTION_PATH = os.getenv('PROJECTION_PATH', '')
+# Candidates fetched from the projected index per requested result
+RESCORE_CANDIDATES = int(os.getenv('RESCORE_CANDIDATES', '4'))
+
+class Projection:
+    """PCA projection from embedding space to a smaller index dimension.
+
+    Projected vectors are re-normalized, so a cosine index over them
+    approximates the full-dimension ranking; exact scores come from
+    rescoring the shortlist against the stored full vectors.
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, model: str = EMBEDDING_MODEL):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)  # (dimension, full dimension)
+        self.model = model
+
+    @property
+    def dimension(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dimension: int, block_size: int = 8192) -> "Projection":
+        """Fit the top `dimension` principal components of `vectors`.
+
+        The covariance matrix is accumulated block by block, so memory
+        stays at one (full dimension)^2 matrix regardless of corpus size.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dimension >= vectors.shape[1]:
+            raise ValueError(f"Target dimension {dimension} must be below {vectors.shape[1]}")
+        mean = vectors.mean(axis=0)
+        covariance = np.zeros((vectors.shape[1], vectors.shape[1]), dtype=np.float64)
+        for i in range(0, len(vectors), block_size):
+            block = vectors[i:i + block_size] - mean
+            covariance += block.T @ block
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1][:dimension]
+        explained = eigenvalues[order].sum() / eigenvalues.sum()
+        logger.info(f"PCA to {dimension} dimensions keeps {explained:.1%} of the variance")
+        return cls(mean, eigenvectors[:, order].T)
+
+    def transform(self, vectors) -> np.ndarray:
+        """Project one vector or a matrix of vectors and L2-normalize the result."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        projected = (vectors - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return projected / np.where(norms == 0, 1, norms)
+
+    def save(self, path: str) -> None:
+        np.savez(path, mean=self.mean, components=self.components, model=np.array(self.model))
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        data = np.load(path)
+        return cls(data["mean"], data["components"], str(data["model"]))
+
+def docstore_projection_path(docstore_path: str) -> str:
+    """Projection file of an index version, kept beside the version's docstore."""
+    return os.path.splitext(docstore_path)[0] + ".projection.npz"
+
+def load_projection(path: str = PROJECTION_PATH, docstore_path: str = None):
+    """Return the projection an index uses, or None when it is full-dimension.
+
+    Index versions keep their projection beside their docstore, so a version
+    and its projection are served (and rolled back) together. The unversioned
+    index, which uses the default docstore, is configured by PROJECTION_PATH.
+
+    Args:
+        path (str): Projection file of the unversioned index
+        docstore_path (str): Docstore of the index version (default: the unversioned index)
+    """
+    if docstore_path is not None and docstore_path != DOCSTORE_PATH:
+        path = docstore_projection_path(docstore_path)
+        if not os.path.exists(path):
+            return None
+    if not path:
+        return None
+    projection = Projection.load(os.path.join(BASE_DIR, path))
+    if projection.model != EMBEDDING_MODEL:
+        raise ValueError(f"Projection {path} was fitted for {projection.model}, not {EMBEDDING_MODEL}")
+    return projection
+
+def rescore(matches: list, query_vector, embeddings: dict, top_k: int) -> list:
+    """Re-rank a shortlist by exact cosine similarity at full dimension.
+
+    Args:
+        matches (list): Matches from the projected index
+        query_vector: Full-dimension query embedding
+        embeddings (dict): Normalized full-dimension embeddings keyed by id
+        top_k (int): Number of results to keep
+
+    Returns:
+        list: Matches with full-dimension scores, best first
+    """
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(query_vector)
+    query_vector = query_vector / norm if norm else query_vector
+    for match in matches:
+        if match.id in embeddings:
+            match.score = float(embeddings[match.id] @ query_vector)
+        else:
+            logger.warning(f"No full-dimension embedding for {match.id}; keeping its projected score")
+    return sorted(matches, key=lambda match: match.score, reverse=True)[:top_k]
+
+def search_top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = matrix @ query
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+def benchmark(vectors: np.ndarray, queries: np.ndarray, dimensions: list, top_k: int = 10,
+              candidates: int = RESCORE_CANDIDATES) -> list:
+    """Recall, latency and memory of projected search against exact search.
+
+    Args:
+        vectors (np.ndarray): Normalized corpus embeddings
+        queries (np.ndarray): Normalized query embeddings
+        dimensions (list): Target dimensions to try
+        top_k (int): Results per query
+        candidates (int): Shortlist size per result before rescoring
+
+    Returns:
+        list: One row per dimension, starting with the full-dimension baseline
+    """
+    top_k = min(top_k, len(vectors))
+    shortlist = min(top_k * candidates, len(vectors))
+    start = time.perf_counter()
+    exact = [set(search_top_k(vectors, query, top_k)) for query in queries]
+    rows = [{"dimension": vectors.shape[1], "recall": 1.0, "recall_rescored": 1.0,
+             "ms_per_query": round((time.perf_counter() - start) * 1000 / len(queries), 3),
+             "index_mib": round(vectors.nbytes / 2**20, 2)}]
+
+    for dimension in dimensions:
+        projection = Projection.fit(vectors, dimension)
+        reduced, reduced_queries = projection.transform(vectors), projection.transform(queries)
+        hits = hits_rescored = 0
+        start = time.perf_counter()
+        for query, reduced_query, truth in zip(queries, reduced_queries, exact):
+            candidates_found = search_top_k(reduced, reduced_query, shortlist)
+            hits += len(truth & set(candidates_found[:top_k]))
+            # Rescoring reads only the shortlist's full rows
+            rescored = candidates_found[np.argsort(-(vectors[candidates_found] @ query))[:top_k]]
+            hits_rescored += len(truth & set(rescored))
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "dimension": dimension,
+            "recall": round(hits / (top_k * len(queries)), 4),
+            "recall_rescored": round(hits_rescored / (top_k * len(queries)), 4),
+            "ms_per_query": round(elapsed * 1000 / len(queries), 3),
+            "index_mib": round(reduced.nbytes / 2**20, 2),
+        })
+    return rows
+
+def load_corpus(index) -> tuple:
+    """Read every namespace of an index; returns (per-namespace ids/metadata, stacked vectors)."""
+    from index_snapshot import read_vectors
+
+    stats = index.describe_index_stats()
+    namespaces, matrices = {}, []
+    for namespace in stats.namespaces:
+        ids, vectors, metadata = read_vectors(index, namespace, stats.dimension)
+        namespaces[namespace] = (ids, metadata, sum(len(matrix) for matrix in matrices))
+        matrices.append(vectors)
+    vectors = np.vstack(matrices) if matrices else np.zeros((0, stats.dimension), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return namespaces, vectors / np.where(norms == 0, 1, norms)
+
+def build_projected_index(alias: str, dimension: int) -> str:
+    """Fit a projection on the version `alias` serves and switch the alias to a projected copy.
+
+    The copy is a new index version: its index holds the projected vectors,
+    its docstore the same chunks plus the full-dimension vectors used for
+    rescoring, and the projection file sits beside that docstore. It is
+    validated before the alias switches and can be rolled back like any
+    other version.
+
+    Returns:
+        str: Name of the new version
+    """
+    # Imported here: index_versions imports this module
+    from index_versions import (current_version, create_index, delete_version, new_version_name, publish_version,
+                                validate_version, version_docstore_path)
+    from docstore import DocStore, open_docstore
+
+    source_name, source_docstore_path = current_version(alias)
+    if load_projection(docstore_path=source_docstore_path) is not None:
+        raise ValueError(f"{source_name} is already projected; build a full-dimension version first")
+    namespaces, vectors = load_corpus(open_index(source_name))
+    projection = Projection.fit(vectors, dimension)
+
+    version = new_version_name(alias)
+    docstore_path = version_docstore_path(version)
+    projection.save(docstore_projection_path(docstore_path))
+    index = create_index(version, dimension)
+    source_docstore, docstore = open_docstore(source_docstore_path), DocStore(docstore_path)
+    try:
+        for namespace, (ids, metadata, offset) in namespaces.items():
+            docstore.put_many(source_docstore.iter_records(namespace), namespace=namespace)
+            full = vectors[offset:offset + len(ids)]
+            docstore.put_embeddings(ids, full, namespace=namespace)
+            reduced = projection.transform(full)
+            for i in range(0, len(ids), 200):
+                index.upsert(vectors=[
+                    (ids[j], reduced[j].tolist(), metadata[j]) for j in range(i, min(i + 200, len(ids)))
+                ], namespace=namespace)
+        if hasattr(index, "save"):
+            index.save()
+        report = validate_version(index, docstore, alias)
+    except Exception:
+        docstore.close()
+        delete_version(version, docstore_path)
+        raise
+
+    docstore.close()
+    publish_version(alias, version, docstore_path, report)
+    logger.info(f"✅ {alias} now serves {version} ({dimension} dims, {len(vectors)} vectors)")
+    return version
+
+def main():
+    """Fit a projected index, or report the recall/latency/memory trade-off."""
+    parser = argparse.ArgumentParser(description="PCA projection for the vector index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build a projected version of an alias and serve it")
+    build.add_argument("--dim", type=int, required=True, help="Target dimension")
+    build.add_argument("--alias", default=PINECONE_INDEX_NAME, help="Alias whose version is projected")
+
+    report = subparsers.add_parser("benchmark", help="Compare target dimensions on the corpus")
+    report.add_argument("--dims", type=int, nargs="+", default=[128, 256, 384, 512])
+    report.add_argument("--alias", default=PINECONE_INDEX_NAME, help="Alias of a full-dimension version")
+    report.add_argument("--queries", type=int, default=200, help="Queries sampled from chunk text")
+    report.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_projected_index(args.alias, args.dim)
+        return
+
+    from backends import load_embedder
+    from docstore import open_docstore
+    from index_versions import current_version
+
+    index_name, docstore_path = current_version(args.alias)
+    _, vectors = load_corpus(open_index(index_name))
+    # Opening sentences of random chunks stand in for user questions
+    texts = [record["text"] for record in open_docstore(docstore_path).iter_records()]
+    rng = np.random.default_rng(0)
+    sample = [texts[i].split(".")[0][:200] for i in rng.choice(len(texts), min(args.queries, len(texts)), replace=False)]
+    queries = np.asarray(load_embedder(EMBEDDING_MODEL).encode(sample, normalize_embeddings=True), dtype=np.float32)
+    if vectors.shape[1] != EMBEDDING_DIMENSION:
+        raise ValueError(f"Benchmark needs a full-dimension version, {index_name} has {vectors.shape[1]} dims")
+
+    print(f"{'dim':>6}{'recall@k':>10}{'rescored':>10}{'ms/query':>10}{'index MiB':>11}")
+    for row in benchmark(vectors, queries, [d for d in args.dims if d < vectors.shape[1]], args.top_k):
+        print(f"{row['dimension']:>6}{row['recall']:>10.3f}{row['recall_rescored']:>10.3f}"
+              f"{row['ms_per_query']:>10.3f}{row['index_mib']:>11.2f}")
+
+if __name__ == "__main__":
+    main()
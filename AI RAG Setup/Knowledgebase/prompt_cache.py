@@ -0,0 +1,173 @@
+import os
+import time
+import hashlib
+import datetime
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import List
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Explicit context caching needs a prefix at least this long (32768 tokens on Gemini 1.5 models)
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('CONTEXT_CACHE_MIN_TOKENS', '32768'))
+# Lifetime and number of explicitly cached prefixes kept per process
+CONTEXT_CACHE_TTL_MIN = int(os.getenv('CONTEXT_CACHE_TTL_MIN', '60'))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv('CONTEXT_CACHE_MAX_ENTRIES', '16'))
+# Number of recent per-request savings kept for reporting
+SAVINGS_SAMPLES = 1000
+
+class CachedPrompt:
+    """A prompt split into a stable prefix and a per-request suffix.
+
+    The prefix (role, instructions and any context shared by a series of
+    requests) repeats across requests and is identified by its hash; the
+    suffix (this request's question, findings and photo) changes every
+    time. Suffix parts may include inline image dicts.
+    """
+
+    def __init__(self, prefix: List[str], suffix: list):
+        self.prefix = list(prefix)
+        self.suffix = list(suffix)
+        digest = hashlib.sha256()
+        for part in self.prefix:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        self.prefix_key = digest.hexdigest()
+
+    @property
+    def prefix_tokens(self) -> int:
+        # Imported here: generation_gateway imports this module
+        from generation_gateway import estimate_tokens
+        return estimate_tokens(self.prefix)
+
+    def text(self) -> str:
+        """The whole prompt as one string, prefix first."""
+        return "\n\n".join(self.prefix + [part for part in self.suffix if isinstance(part, str)])
+
+    def parts(self) -> list:
+        """Content for a provider call without caching: the text followed by any images."""
+        return [self.text()] + [part for part in self.suffix if isinstance(part, dict)]
+
+    def suffix_parts(self) -> list:
+        """Content for a call whose prefix is already cached: the suffix text followed by any images."""
+        return ["\n\n".join(part for part in self.suffix if isinstance(part, str))] + \
+               [part for part in self.suffix if isinstance(part, dict)]
+
+class PromptCacheStats:
+    """Input tokens sent versus served from cached prefixes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "hits": 0, "misses": 0, "not_cacheable": 0,
+                        "input_tokens": 0, "cached_tokens": 0}
+        self._savings = deque(maxlen=SAVINGS_SAMPLES)
+
+    def record(self, outcome: str, input_tokens: int, cached_tokens: int) -> None:
+        """Record one request; outcome is "hit", "miss" or "not_cacheable"."""
+        with self._lock:
+            self._counts["requests"] += 1
+            self._counts[{"hit": "hits", "miss": "misses"}.get(outcome, outcome)] += 1
+            self._counts["input_tokens"] += input_tokens
+            self._counts["cached_tokens"] += cached_tokens
+            self._savings.append(cached_tokens / input_tokens if input_tokens else 0.0)
+        logger.debug(f"Prompt cache {outcome}: {cached_tokens}/{input_tokens} input tokens cached")
+
+    def report(self) -> dict:
+        with self._lock:
+            counts, savings = dict(self._counts), list(self._savings)
+        return {
+            **counts,
+            "saved_share": round(counts["cached_tokens"] / counts["input_tokens"], 3) if counts["input_tokens"] else 0.0,
+            "avg_saved_tokens_per_request": round(counts["cached_tokens"] / counts["requests"], 1)
+                                            if counts["requests"] else 0.0,
+            "avg_saved_share_per_request": round(sum(savings) / len(savings), 3) if savings else 0.0,
+        }
+
+class ContextCache:
+    """Sends CachedPrompts, caching the prefix explicitly when it is long enough.
+
+    Gemini 1.5 models only serve input tokens from cache through explicit
+    context caching, which has a minimum size. A prefix of at least
+    CONTEXT_CACHE_MIN_TOKENS is uploaded once as CachedContent and reused
+    until it expires; shorter prefixes, and models without a provider-side
+    cache (fakes), are sent whole and recorded as not cacheable. Savings
+    are only what the provider reports in
+    `usage_metadata.cached_content_token_count`.
+    """
+
+    def __init__(self, min_tokens: int = CONTEXT_CACHE_MIN_TOKENS, ttl_minutes: int = CONTEXT_CACHE_TTL_MIN,
+                 max_entries: int = CONTEXT_CACHE_MAX_ENTRIES):
+        self.stats = PromptCacheStats()
+        self.min_tokens = min_tokens
+        self.ttl = ttl_minutes * 60
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (model name, prefix key) -> (CachedContent, model using it, expires at)
+        self._lock = threading.Lock()
+
+    def cacheable(self, model, prompt: CachedPrompt) -> bool:
+        if prompt.prefix_tokens < self.min_tokens:
+            return False
+        # Imported here: only prompts long enough to cache need the SDK
+        import google.generativeai as genai
+        return isinstance(model, genai.GenerativeModel)
+
+    def generate(self, model, prompt: CachedPrompt):
+        """Generate a response for `prompt` with `model`, recording token savings."""
+        from generation_gateway import estimate_tokens
+        input_tokens = estimate_tokens(prompt)
+        if not self.cacheable(model, prompt):
+            response = model.generate_content(prompt.parts())
+            self.stats.record("not_cacheable", input_tokens, 0)
+            return response
+
+        response = self._cached_model(model, prompt).generate_content(prompt.suffix_parts())
+        usage = getattr(response, "usage_metadata", None)
+        cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+        self.stats.record("hit" if cached_tokens else "miss", input_tokens, cached_tokens)
+        return response
+
+    def _cached_model(self, model, prompt: CachedPrompt):
+        """Model bound to the CachedContent for this prompt's prefix, creating it if needed."""
+        from google.generativeai import caching, GenerativeModel
+
+        key = (model.model_name, prompt.prefix_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            # A minute of margin, so a cache never expires between lookup and use
+            if entry and entry[2] > time.time() + 60:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        cached = caching.CachedContent.create(model=model.model_name, contents=["\n\n".join(prompt.prefix)],
+                                              ttl=datetime.timedelta(seconds=self.ttl))
+        cached_model = GenerativeModel.from_cached_content(cached)
+        evicted = []
+        with self._lock:
+            self._entries[key] = (cached, cached_model, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1][0])
+        for content in evicted:
+            try:
+                content.delete()  # Storage is billed until it expires
+            except Exception as e:
+                logger.warning(f"Could not delete cached content {content.name}: {e}")
+        logger.info(f"Cached a {prompt.prefix_tokens}-token prompt prefix for {model.model_name}")
+        return cached_model
+
+_context_cache = None
+_context_cache_lock = threading.Lock()
+
+def get_context_cache() -> ContextCache:
+    """Return the process-wide context cache."""
+    global _context_cache
+    with _context_cache_lock:
+        if _context_cache is None:
+            _context_cache = ContextCache()
+        return _context_cache
@@ -1,11 +1,20 @@
 import os
+import time
+import threading
+from collections import deque
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
 import logging
 import torch
 from torch import autocast
 from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from docstore import DocStore, open_docstore
+from backends import load_embedder, open_index
+from embedding_models import EMBEDDING_MODEL, get_model, parse_traffic, route
+from profiling import profile_run, profile_stage
+from projection import load_projection, rescore, RESCORE_CANDIDATES
+from index_versions import AliasResolver, current_version
+from resilience import get_dependency, open_fallback_index, CircuitOpenError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,48 +22,366 @@ logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
-PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
 PINECONE_INDEX_NAME = os.getenv('PINECONE_INDEX_NAME', 'agrivanna-knowledge')
-EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'intfloat/multilingual-e5-large')
+# Number of recent latencies kept per embedding model
+LATENCY_SAMPLES = 1000
+# Seconds before looking again for another model's index that an index version did not have
+MODEL_INDEX_RETRY_SEC = float(os.getenv('MODEL_INDEX_RETRY_SEC', '60'))
 
 class KnowledgeBase:
-    def __init__(self):
-        """Initialize the knowledge base query system."""
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL)
+    def __init__(self, embedder=None, index=None, docstore: DocStore = None, projection=None,
+                 fallback_index=None, traffic: dict = None):
+        """Initialize the knowledge base query system.
+        
+        Args:
+            embedder: Preloaded embedding model (default: the shared one for EMBEDDING_MODEL)
+            index: Vector index client (default: the version PINECONE_INDEX_NAME points at,
+                re-resolved before every search)
+            docstore (DocStore): Chunk text store (default: the docstore of that version)
+            projection (Projection): Projection used by the index (default: the one kept beside the
+                docstore, or PROJECTION_PATH for the unversioned index; False: none)
+            fallback_index: Local index searched while the primary one is failing (default: a local
+                copy of the served version, if one exists)
+            traffic (dict): Share of queries per registered embedding model (default: EMBEDDING_TRAFFIC,
+                or only EMBEDDING_MODEL when an index or docstore is injected)
+        """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.embedder.to(self.device)
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
-        self.index = self.pc.Index(PINECONE_INDEX_NAME)
+        self.embedder = embedder or load_embedder(EMBEDDING_MODEL)
+        self.projection = projection or None
+        if projection is None and docstore is not None:
+            self.projection = load_projection(docstore_path=docstore.path)
+        # Otherwise the projection follows the version, like the index and docstore
+        self.projection_pinned = projection is not None or docstore is not None
+        # An injected index or docstore pins this instance; otherwise it follows the alias
+        self.resolver = AliasResolver(PINECONE_INDEX_NAME) if index is None and docstore is None else None
+        self.index = index
+        self.docstore = docstore
+        self.version = None  # Index version served; other models' indexes are tied to it
+        self.fallback_index = fallback_index
+        self.fallback_pinned = fallback_index is not None
+        self.vector_search = get_dependency("vector_search")
+        # Other embedding models answer a share of queries from their own indexes over the same chunks
+        self.traffic = traffic if traffic is not None else (parse_traffic() if self.resolver else {})
+        self.models = {}  # (model name, version) -> ((embedder, index, search policy) or None, checked at)
+        self._model_lock = threading.Lock()
+        self._model_latencies = {}
+        self._model_counts = {}
+        self.refresh_version()
+
+    @classmethod
+    def from_bundle(cls, bundle_dir: str = None, memory_cap_mb: float = None) -> "KnowledgeBase":
+        """Load an offline edge bundle (see edge_bundle.py) under a memory cap.
+        
+        Args:
+            bundle_dir (str): Bundle directory (default: EDGE_BUNDLE_DIR)
+            memory_cap_mb (float): Resident memory allowed (default: EDGE_MEMORY_CAP_MB)
+            
+        Returns:
+            KnowledgeBase: Knowledge base served from the bundle
+        """
+        from edge_bundle import load_bundle, EDGE_BUNDLE_DIR, EDGE_MEMORY_CAP_MB
+        bundle = load_bundle(bundle_dir or EDGE_BUNDLE_DIR,
+                             EDGE_MEMORY_CAP_MB if memory_cap_mb is None else memory_cap_mb)
+        return bundle.knowledge_base
 
-    def query(self, question: str, top_k: int = 3) -> list:
+    def refresh_version(self) -> None:
+        """Switch to the index version the alias points at, if it changed."""
+        version = self.resolver.resolve() if self.resolver else None
+        if version is not None:
+            index_name, docstore_path = version
+            projection = self.projection if self.projection_pinned else load_projection(docstore_path=docstore_path)
+            dimension = projection.dimension if projection else None
+            # Searches already running keep the pair they started with; both are shared per version
+            self.index, self.docstore, self.projection = \
+                open_index(index_name, dimension), open_docstore(docstore_path), projection
+            self.version = index_name
+            if not self.fallback_pinned:
+                self.fallback_index = open_fallback_index(index_name, dimension)
+            logger.info(f"Serving index version {index_name}")
+        elif self.index is None or self.docstore is None:
+            index_name, docstore_path = current_version(PINECONE_INDEX_NAME)
+            if not self.projection_pinned:
+                self.projection = load_projection(docstore_path=docstore_path)
+            self.index = self.index or open_index(index_name, self.projection.dimension if self.projection else None)
+            self.docstore = self.docstore or open_docstore(docstore_path)
+            self.version = index_name
+
+    def query(self, question: str, top_k: int = 3, filter: dict = None, namespaces: list = None,
+              model: str = None) -> list:
         """Query the knowledge base.
         
         Args:
             question (str): The question to ask
             top_k (int): Number of results to return
+            filter (dict): Pinecone metadata filter, e.g. {"topic": {"$eq": "herd_health"}}
+            namespaces (list): Namespaces to search (default: the default namespace)
+            model (str): Embedding model to answer with (default: chosen by the traffic split)
             
         Returns:
             list: List of relevant answers with scores
         """
+        model = model or (route(question, self.traffic) if self.traffic else EMBEDDING_MODEL)
+        if model != EMBEDDING_MODEL:
+            self.refresh_version()
+            if self.model_arm(model) is None:
+                model = EMBEDDING_MODEL  # The served version has no index for this model
+        start = time.perf_counter()
+        results = []
         try:
+            embedder = self.embedder if model == EMBEDDING_MODEL else self.model_arm(model)[0]
             # Generate embedding with GPU if available
-            with torch.cuda.amp.autocast() if torch.cuda.is_available() else nullcontext():
-                query_vector = self.embedder.encode(
+            with profile_stage("embed"), \
+                    torch.cuda.amp.autocast() if torch.cuda.is_available() else nullcontext():
+                query_vector = embedder.encode(
                     question,
                     convert_to_tensor=True,
                     device=self.device
                 ).cpu().tolist()
             
-            results = self.index.query(
-                vector=query_vector,
-                top_k=top_k,
-                include_metadata=True
-            )
-            
-            return results.matches
+            results = self.search(query_vector, top_k=top_k, filter=filter, namespaces=namespaces, model=model)
+            return results
+        except CircuitOpenError as e:
+            logger.warning(f"Query rejected: {e}")
+            return []
         except Exception as e:
             logger.error(f"Query failed: {e}")
             return []
+        finally:
+            self._record_model(model, time.perf_counter() - start, results)
+
+    def model_arm(self, name: str, version: str = None):
+        """Embedder, index and search policy of a non-served registered model, opened on first use.
+
+        Each model has one index per index version, and the search policy
+        keeps that model's own latency history and hedge delay.
+
+        Args:
+            name (str): Registered model
+            version (str): Index version (default: the one being served)
+
+        Returns:
+            tuple: (embedder, index, Dependency), or None when the version has no index for the model
+        """
+        version = version or self.version or current_version(PINECONE_INDEX_NAME)[0]
+        with self._model_lock:
+            arm, checked_at = self.models.get((name, version), (None, None))
+            if arm is not None or (checked_at is not None and time.monotonic() - checked_at < MODEL_INDEX_RETRY_SEC):
+                return arm
+            model = get_model(name)
+            try:
+                index = open_index(model.index_name(version), model.dimension)
+                if index.describe_index_stats().total_vector_count:
+                    arm = (load_embedder(model.name), index, get_dependency(f"vector_search:{name}"))
+            except Exception as e:
+                logger.warning(f"Could not open the {name} index of {version}: {e}")
+            if arm is None:
+                logger.warning(f"No {name} index for {version}; its queries use {EMBEDDING_MODEL}")
+            else:
+                logger.info(f"Serving a share of queries with {name} from {model.index_name(version)}")
+            # Arms of versions no longer served are dropped
+            self.models = {key: value for key, value in self.models.items() if key[1] == version}
+            self.models[(name, version)] = (arm, time.monotonic())
+            return arm
+
+    def _record_model(self, name: str, seconds: float, results: list) -> None:
+        with self._model_lock:
+            self._model_latencies.setdefault(name, deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+            counts = self._model_counts.setdefault(name, {"queries": 0, "empty": 0, "top_score_sum": 0.0})
+            counts["queries"] += 1
+            if results:
+                counts["top_score_sum"] += results[0].score
+            else:
+                counts["empty"] += 1
+
+    def model_stats(self) -> dict:
+        """Per-model query counts, latency percentiles, empty-result rate and mean top score."""
+        # Imported here: generation_gateway pulls in the generation stack's config
+        from generation_gateway import percentile
+        with self._model_lock:
+            return {
+                name: {
+                    "share": self.traffic.get(name, 0.0) if self.traffic else float(name == EMBEDDING_MODEL),
+                    "queries": counts["queries"],
+                    "p50_ms": round(percentile(self._model_latencies[name], 0.50) * 1000, 1),
+                    "p95_ms": round(percentile(self._model_latencies[name], 0.95) * 1000, 1),
+                    "empty_rate": round(counts["empty"] / counts["queries"], 3),
+                    "mean_top_score": round(counts["top_score_sum"] / max(1, counts["queries"] - counts["empty"]), 4),
+                }
+                for name, counts in self._model_counts.items()
+            }
+
+    def query_batch(self, questions: list, top_k: int = 3, filter: dict = None,
+                    namespaces: list = None, max_workers: int = 8) -> list:
+        """Query the knowledge base for many questions at once.
+        
+        All questions are embedded in a single encoder call and the index
+        searches run concurrently. Batches always use EMBEDDING_MODEL.
+        
+        Args:
+            questions (list): Questions to ask
+            top_k (int): Number of results per question
+            filter (dict): Pinecone metadata filter
+            namespaces (list): Namespaces to search
+            max_workers (int): Concurrent index searches
+            
+        Returns:
+            list: One list of matches per question, in input order
+        """
+        if not questions:
+            return []
+        
+        with profile_stage("embed"), torch.cuda.amp.autocast() if torch.cuda.is_available() else nullcontext():
+            query_vectors = self.embedder.encode(
+                questions,
+                convert_to_tensor=True,
+                device=self.device,
+                show_progress_bar=False
+            ).cpu().tolist()
+        
+        def search_one(query_vector: list) -> list:
+            try:
+                return self.search(query_vector, top_k=top_k, filter=filter, namespaces=namespaces)
+            except Exception as e:
+                logger.error(f"Query failed: {e}")
+                return []
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(query_vectors))) as executor:
+            return list(executor.map(search_one, query_vectors))
+
+    def search(self, query_vector: list, top_k: int = 3, filter: dict = None, namespaces: list = None,
+               model: str = None) -> list:
+        """Search one or more namespaces with an already computed query vector.
+        
+        The filter is passed to the index so it is applied before scoring,
+        rather than trimming results afterwards. Several namespaces are
+        searched in parallel and merged by score. With a projection, the
+        index returns a larger shortlist that is rescored at full dimension,
+        so scores stay comparable with an unprojected index.
+        
+        Index queries run under the vector search deadline and are hedged
+        when slow; if they fail or the circuit is open, the local fallback
+        index answers instead when there is one.
+        
+        Args:
+            query_vector (list): Query embedding
+            top_k (int): Number of results to return
+            filter (dict): Pinecone metadata filter
+            namespaces (list): Namespaces to search (default: the default namespace)
+            model (str): Embedding model the vector came from (default: EMBEDDING_MODEL)
+            
+        Returns:
+            list: Hydrated matches sorted by score
+        """
+        namespaces = namespaces or [""]
+        self.refresh_version()
+        index, docstore, fallback_index, projection = self.index, self.docstore, self.fallback_index, self.projection
+        version, vector_search = self.version, self.vector_search
+        if model and model != EMBEDDING_MODEL:
+            arm = self.model_arm(model, version)
+            if arm is None:
+                raise ValueError(f"{version} has no {model} index; run embedding_models.py sync")
+            # Other models' indexes are full-dimension and share the version's chunk ids
+            _, index, vector_search = arm
+            fallback_index, projection = None, None
+        if projection is not None:
+            index_vector, candidates = projection.transform(query_vector).tolist(), top_k * RESCORE_CANDIDATES
+        else:
+            index_vector, candidates = query_vector, top_k
+        
+        def search_namespace(namespace: str) -> list:
+            request = {"vector": index_vector, "top_k": candidates, "filter": filter,
+                       "namespace": namespace, "include_metadata": False}
+            with profile_stage("index_query"):
+                try:
+                    results = vector_search.call(lambda: index.query(**request))
+                except Exception as e:
+                    if fallback_index is None:
+                        raise
+                    logger.warning(f"Vector search failed ({e}); using the local fallback index")
+                    vector_search.record_fallback()
+                    results = fallback_index.query(**request)
+            matches = results.matches
+            if projection is not None:
+                with profile_stage("rescore"):
+                    embeddings = docstore.get_embeddings([match.id for match in matches], namespace)
+                    matches = rescore(matches, query_vector, embeddings, top_k)
+            with profile_stage("hydrate"):
+                return self.hydrate(matches, namespace=namespace, index=index, docstore=docstore)
+        
+        if len(namespaces) == 1:
+            return search_namespace(namespaces[0])
+        
+        with ThreadPoolExecutor(max_workers=len(namespaces)) as executor:
+            per_namespace = list(executor.map(search_namespace, namespaces))
+        
+        merged = [match for matches in per_namespace for match in matches]
+        merged.sort(key=lambda match: match.score, reverse=True)
+        return merged[:top_k]
+
+    def hydrate(self, matches: list, namespace: str = "", index=None, docstore: DocStore = None) -> list:
+        """Attach chunk text and metadata from the docstore to search matches.
+        
+        Vectors written before the docstore existed still carry their text in
+        index metadata; those are fetched once and copied into the docstore.
+        
+        Args:
+            matches (list): Matches returned by the vector index
+            namespace (str): Namespace the matches came from
+            index: Index the matches came from (default: the current one)
+            docstore (DocStore): Store to read from (default: the current one)
+            
+        Returns:
+            list: Matches with `metadata` populated, missing ids dropped
+        """
+        if not matches:
+            return []
+        
+        # Both from the same version, even if the alias moves while this runs
+        if index is None or docstore is None:
+            index, docstore = self.index, self.docstore
+        records = docstore.get_many([match.id for match in matches], namespace=namespace)
+        missing = [match.id for match in matches if match.id not in records]
+        if missing:
+            records.update(self.backfill(missing, namespace, index=index, docstore=docstore))
+        
+        hydrated = []
+        for match in matches:
+            record = records.get(match.id)
+            if record is None:
+                logger.warning(f"No docstore entry for vector {match.id}")
+                continue
+            match.metadata = {**record, "namespace": namespace}
+            hydrated.append(match)
+        return hydrated
+
+    def backfill(self, ids: list, namespace: str = "", index=None, docstore: DocStore = None) -> dict:
+        """Copy legacy in-index chunk text into the docstore.
+        
+        Args:
+            ids (list): Vector ids missing from the docstore
+            namespace (str): Namespace the ids belong to
+            index: Index to read the text from (default: the current one)
+            docstore (DocStore): Store of the same version to copy it into (default: the current one)
+            
+        Returns:
+            dict: Records recovered from index metadata, keyed by id
+        """
+        if index is None or docstore is None:
+            index, docstore = self.index, self.docstore
+        response = index.fetch(ids=ids, namespace=namespace)
+        records = {}
+        for vector_id, vector in response.vectors.items():
+            metadata = dict(vector.metadata or {})
+            if "text" in metadata:
+                records[vector_id] = metadata
+        
+        if records:
+            docstore.put_many(
+                [{"id": vector_id, **record} for vector_id, record in records.items()],
+                namespace=namespace
+            )
+            logger.info(f"Backfilled {len(records)} legacy chunks into the docstore")
+        return records
 
 def main():
     """Interactive query interface."""
@@ -63,18 +390,19 @@ def main():
     print("\n🔍 Agrivanna Knowledge Base Query System")
     print("Type 'exit' to quit\n")
     
-    while True:
-        question = input("\nEnter your question: ")
-        if question.lower() == 'exit':
-            break
+    with profile_run("query"):
+        while True:
+            question = input("\nEnter your question: ")
+            if question.lower() == 'exit':
+                break
+                
+            results = kb.query(question)
             
-        results = kb.query(question)
-        
-        print("\nResults:")
-        for i, match in enumerate(results, 1):
-            print(f"\n--- Result {i} (Score: {match.score:.3f}) ---")
-            print(match.metadata['text'])
-            print("-" * 80)
+            print("\nResults:")
+            for i, match in enumerate(results, 1):
+                print(f"\n--- Result {i} (Score: {match.score:.3f}) ---")
+                print(match.metadata['text'])
+                print("-" * 80)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
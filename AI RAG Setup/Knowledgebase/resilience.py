@@ -0,0 +1,307 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dotenv import load_dotenv
+from generation_gateway import percentile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+VECTOR_SEARCH_DEADLINE_SEC = float(os.getenv('VECTOR_SEARCH_DEADLINE_SEC', '2.0'))
+GENERATION_DEADLINE_SEC = float(os.getenv('GENERATION_DEADLINE_SEC', '30'))
+# Consecutive failures that open a breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SEC = float(os.getenv('BREAKER_RESET_SEC', '30'))
+# A hedge is sent once a call has taken longer than this percentile of recent calls
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '0.95'))
+HEDGE_MIN_DELAY_SEC = float(os.getenv('HEDGE_MIN_DELAY_SEC', '0.05'))
+# Calls observed before hedging starts; until then there is no reliable p95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 1000
+# Answer from a local copy of the index while vector search is failing
+FALLBACK_LOCAL_INDEX = os.getenv('FALLBACK_LOCAL_INDEX', '1') == '1'
+
+# Client libraries whose errors mean the remote service failed (top-level package names)
+SERVICE_ERROR_PACKAGES = {"google", "grpc", "pinecone", "urllib3", "requests", "httpx", "httpcore", "sharded_index"}
+
+class DependencyError(Exception):
+    pass
+
+class CircuitOpenError(DependencyError):
+    pass
+
+class DeadlineExceeded(DependencyError):
+    pass
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """Whether an error says the dependency is unhealthy, as opposed to a bug in the calling code.
+
+    Timeouts, connection errors and errors raised by service client
+    libraries count; a TypeError from building a prompt does not.
+    """
+    if isinstance(error, (DependencyError, TimeoutError, ConnectionError, OSError)):
+        return True
+    return (type(error).__module__ or "").split(".")[0] in SERVICE_ERROR_PACKAGES
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open after a cool-down.
+
+    While open every call is rejected immediately. Half-open lets one trial
+    call through; its success closes the breaker, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_SEC):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.counts = {"opened": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.counts["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Circuit closed again after a successful trial call")
+            self.state, self.failures, self.trial_in_flight = "closed", 0, False
+
+    def release_trial(self) -> None:
+        """End a trial call that neither succeeded nor failed (the caller's own error)."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.counts["opened"] += 1
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, **self.counts}
+
+class Dependency:
+    """Deadline, optional hedging and a circuit breaker around calls to one dependency.
+
+    A hedge (a duplicate of the same call) is only sent for idempotent,
+    cheap operations such as vector search: once a call has run longer than
+    the recent p95 latency, the second copy often returns first.
+
+    Only timeouts and service errors (see `is_dependency_failure`) count
+    towards the breaker. Attempts that miss the deadline keep running until
+    the service answers, so at most `max_workers` may be running at once;
+    further calls are refused rather than queued behind them.
+    """
+
+    def __init__(self, name: str, deadline: float, hedge: bool = False, max_workers: int = 32,
+                 breaker: CircuitBreaker = None, queued: bool = False):
+        """Initialize the dependency.
+
+        Args:
+            name (str): Name used in logs and metrics
+            deadline (float): Seconds before a call is abandoned
+            hedge (bool): Send a duplicate call after the p95-based delay
+            max_workers (int): Threads available for calls and hedges
+            breaker (CircuitBreaker): Breaker for this dependency (default: a new one)
+            queued (bool): Calls wait in a queue before reaching the service (the generation
+                gateway). They run in the caller's thread and must apply `deadline` themselves,
+                as one budget for the whole call, and raise TimeoutError when it passes.
+        """
+        self.name = name
+        self.deadline = deadline
+        self.hedge = hedge
+        self.queued = queued
+        self.max_workers = max_workers
+        self.breaker = breaker or CircuitBreaker()
+        self.executor = None if queued else \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"dep-{name}")
+        self.slots = threading.BoundedSemaphore(max_workers)  # Attempts running, including late ones
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "succeeded": 0, "failed": 0, "deadline_exceeded": 0, "saturated": 0,
+                        "caller_errors": 0, "hedges_sent": 0, "hedges_won": 0, "fallbacks": 0}
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before hedging, or None while there is too little history."""
+        with self._lock:
+            latencies = list(self._latencies)
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY_SEC, percentile(latencies, HEDGE_PERCENTILE))
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def record_fallback(self) -> None:
+        """Count a request answered by the fallback instead of this dependency."""
+        self._count("fallbacks")
+
+    def _submit(self, fn):
+        """Start an attempt if fewer than `max_workers` are running, else return None."""
+        if not self.slots.acquire(blocking=False):
+            return None
+        future = self.executor.submit(fn)
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def _failed(self, error: BaseException) -> None:
+        """Count a failed call; only the dependency's own failures move the breaker."""
+        if is_dependency_failure(error):
+            self.breaker.record_failure()
+            self._count("failed")
+        else:
+            self.breaker.release_trial()
+            self._count("caller_errors")
+
+    def _succeeded(self, start: float, hedge_won: bool = False) -> None:
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+            self._counts["succeeded"] += 1
+            if hedge_won:
+                self._counts["hedges_won"] += 1
+        self.breaker.record_success()
+
+    def call(self, fn, deadline: float = None):
+        """Run `fn()` under the deadline, hedging and breaker policies.
+
+        Raises:
+            CircuitOpenError: The breaker is open
+            DeadlineExceeded: No attempt finished before the deadline
+            DependencyError: Too many late attempts are still running
+            Exception: The error raised by the last failed attempt
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self._count("calls")
+        start = time.monotonic()
+        if self.queued:
+            return self._call_in_caller(fn, start)
+
+        expires = start + (deadline or self.deadline)
+        first = self._submit(fn)
+        if first is None:
+            self._count("saturated")
+            self.breaker.record_failure()
+            raise DependencyError(f"{self.name} already has {self.max_workers} calls running")
+        attempts = [first]
+
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is not None:
+            done, _ = wait(attempts, timeout=min(delay, max(0.0, expires - time.monotonic())))
+            if not done and time.monotonic() < expires:
+                hedge = self._submit(fn)
+                if hedge is not None:
+                    attempts.append(hedge)
+                    self._count("hedges_sent")
+
+        error = None
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, expires - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self._succeeded(start, hedge_won=future is not attempts[0])
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            self._failed(error)
+            raise error
+        self.breaker.record_failure()
+        self._count("deadline_exceeded")
+        # Late attempts keep running in the background (holding a slot); their results are discarded
+        raise DeadlineExceeded(f"{self.name} did not answer within {deadline or self.deadline:.2f}s")
+
+    def _call_in_caller(self, fn, start: float):
+        """Run a queued call in this thread; it applies the deadline to the whole call itself."""
+        try:
+            result = fn()
+        except TimeoutError as e:
+            self.breaker.record_failure()
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"{self.name} did not answer within {self.deadline:.2f}s") from e
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded(start)
+        return result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+            counts = dict(self._counts)
+        return {
+            **counts,
+            "p50_sec": round(percentile(latencies, 0.50), 4),
+            "p95_sec": round(percentile(latencies, 0.95), 4),
+            "hedge_delay_sec": round(self.hedge_delay() or 0.0, 4),
+            "breaker": self.breaker.metrics(),
+        }
+
+def open_fallback_index(index_name: str, dimension: int = None):
+    """Return the local copy of a Pinecone index, or None if there is none.
+
+    A copy is made with `VECTOR_BACKEND=local python index_snapshot.py import
+    <snapshot> --index <index name>` and lives under LOCAL_INDEX_DIR/<index name>. With the local backend the
+    served index is already local, so there is nothing to fall back to.
+    """
+    from backends import use_fakes, VECTOR_BACKEND
+    from local_index import LocalIndex, LOCAL_INDEX_DIR
+
+    path = os.path.join(LOCAL_INDEX_DIR, index_name)
+    if not FALLBACK_LOCAL_INDEX or use_fakes() or VECTOR_BACKEND == "local" \
+            or not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    logger.info(f"Local fallback index available for {index_name}")
+    return LocalIndex(dimension or 0, path)
+
+_dependencies = {}
+_dependencies_lock = threading.Lock()
+
+def get_dependency(name: str) -> Dependency:
+    """Return the process-wide policy for a named dependency.
+
+    Names are "vector_search", "generation", or "vector_search:<model>" for
+    the index of another embedding model, which keeps its own latency
+    history, hedge delay and breaker.
+    """
+    with _dependencies_lock:
+        if name not in _dependencies:
+            if name == "vector_search" or name.startswith("vector_search:"):
+                _dependencies[name] = Dependency(name, VECTOR_SEARCH_DEADLINE_SEC, hedge=True)
+            elif name == "generation":
+                # Not hedged: the gateway would coalesce the duplicate anyway, and it costs tokens.
+                # Queued: the gateway applies the deadline itself, queue wait included, in the caller's thread
+                _dependencies[name] = Dependency(name, GENERATION_DEADLINE_SEC, hedge=False, queued=True)
+            else:
+                raise ValueError(f"Unknown dependency {name}")
+        return _dependencies[name]
+
+def dependency_metrics() -> dict:
+    with _dependencies_lock:
+        return {name: dependency.metrics() for name, dependency in _dependencies.items()}
@@ -0,0 +1,414 @@
+import os
+import json
+import time
+import atexit
+import argparse
+import itertools
+import threading
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import Future
+import numpy as np
+from dotenv import load_dotenv
+from local_index import LocalIndex, QueryResponse, FetchResponse, IndexStats
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# A shard may hold this much more than the average before documents are moved off it
+REBALANCE_TOLERANCE = float(os.getenv('REBALANCE_TOLERANCE', '0.2'))
+
+SHARD_MANIFEST = "shards.json"
+
+class ShardError(Exception):
+    pass
+
+def document_of(vector_id: str, metadata: dict) -> str:
+    """Document a vector belongs to; documents are never split across shards."""
+    return (metadata or {}).get("doc_id") or vector_id.rsplit("_chunk_", 1)[0]
+
+def _serve_shard(connection, dimension: int, path: str) -> None:
+    """Worker process: answer index calls for one shard until told to stop.
+
+    Requests are handled in the order they arrive; each reply carries the
+    id of its request.
+    """
+    index = LocalIndex(dimension, path)
+    while True:
+        try:
+            request_id, op, args, kwargs = connection.recv()
+        except EOFError:
+            break
+        if op == "close":
+            break
+        try:
+            if op == "documents":
+                # (namespace, document) -> vector count
+                result = Counter()
+                for namespace in index.describe_index_stats().namespaces:
+                    for vector_id, _, metadata in index.iter_vectors(namespace):
+                        result[(namespace, document_of(vector_id, metadata))] += 1
+            elif op == "extract":
+                namespace, doc_id = args
+                result = [(vector_id, row.tolist(), metadata) for vector_id, row, metadata
+                          in index.iter_vectors(namespace) if document_of(vector_id, metadata) == doc_id]
+            elif op == "list":
+                result = [vector_id for page in index.list(*args, **kwargs) for vector_id in page]
+            else:
+                result = getattr(index, op)(*args, **kwargs)
+            connection.send((request_id, True, result))
+        except Exception as e:
+            connection.send((request_id, False, e))
+    connection.close()
+
+class ShardedIndex:
+    """Local index split across worker processes, one LocalIndex per shard.
+
+    Whole documents are placed on shards, new ones on the shard holding the
+    fewest vectors. A query is sent to every shard at once, each returns its
+    own top-k, and the results are merged by score, so memory and scoring
+    work are divided between processes. `rebalance` moves documents off
+    shards that have grown past the average. Same API as LocalIndex.
+
+    Requests to a shard are tagged with an id and a reader thread per shard
+    hands each reply to the request that sent it, so concurrent callers
+    share the pipes and a failed exchange never leaves a stale reply for
+    the next one. A shard whose worker dies is restarted from its last
+    save on next use; writes since then are gone, so the index then
+    refuses to save and must be reopened.
+    """
+
+    def __init__(self, dimension: int, path: str, shards: int = 2):
+        """Start the shard workers, loading any shards saved at `path`.
+
+        Args:
+            dimension (int): Vector dimension
+            path (str): Directory holding one sub-directory per shard
+            shards (int): Number of shards; an existing index can grow but not shrink
+        """
+        self.dimension = dimension
+        self.path = path
+        self.placement = {}  # document -> shard
+        manifest = os.path.join(path, SHARD_MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest, encoding="utf-8") as f:
+                saved = json.load(f)
+            if shards < saved["shards"]:
+                raise ValueError(f"{path} has {saved['shards']} shards; cannot reduce to {shards}")
+            self.placement = saved["placement"]
+        self.shards = shards
+        self._request_ids = itertools.count()
+        self._send_locks = [threading.Lock() for _ in range(shards)]  # One writer per shard pipe
+        self._workers = [None] * shards
+        self._connections = [None] * shards
+        self._pending = [{} for _ in range(shards)]  # request id -> Future, per shard
+        self._broken = set()
+        self._restarted = set()
+        self._closing = False
+        for shard in range(shards):
+            self._start_shard(shard)
+        self.counts = [sum(ns["vector_count"] for ns in stats.namespaces.values())
+                       for stats in self._broadcast("describe_index_stats")]
+        atexit.register(self.close)
+        logger.info(f"Started {shards} index shards ({sum(self.counts)} vectors)")
+
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.path, f"shard-{shard}")
+
+    def _start_shard(self, shard: int) -> None:
+        """Start a shard's worker (loading its last save) and the thread reading its replies."""
+        context = multiprocessing.get_context("spawn")
+        parent, child = context.Pipe()
+        worker = context.Process(target=_serve_shard, args=(child, self.dimension, self.shard_path(shard)),
+                                 name=f"shard-{shard}", daemon=True)
+        worker.start()
+        child.close()
+        pending = {}
+        self._workers[shard], self._connections[shard], self._pending[shard] = worker, parent, pending
+        threading.Thread(target=self._read_replies, args=(shard, parent, pending),
+                         name=f"shard-{shard}-replies", daemon=True).start()
+
+    def _read_replies(self, shard: int, connection, pending: dict) -> None:
+        """Complete each request's future with its reply until the pipe closes."""
+        while True:
+            try:
+                request_id, ok, result = connection.recv()
+            except Exception as e:  # EOF when the worker exits; anything else leaves the pipe unusable
+                error = e
+                break
+            future = pending.pop(request_id, None)
+            if future is not None:
+                future.set_result((ok, result))
+        with self._send_locks[shard]:
+            if not self._closing and self._connections[shard] is connection:
+                self._broken.add(shard)
+                logger.error(f"Lost index shard {shard}: {error!r}")
+            for future in list(pending.values()):
+                future.set_exception(ShardError(f"Shard {shard} stopped before replying"))
+            pending.clear()
+
+    def _submit(self, shard: int, op: str, args: tuple = (), kwargs: dict = None) -> Future:
+        """Send one request to a shard; the future resolves to (ok, result)."""
+        with self._send_locks[shard]:
+            if self._closing:
+                raise ShardError("Index is closed")
+            if shard in self._broken:
+                self._broken.discard(shard)
+                self._restarted.add(shard)
+                logger.warning(f"Restarting index shard {shard} from its last save")
+                self._start_shard(shard)
+            request_id = next(self._request_ids)
+            future = Future()
+            self._pending[shard][request_id] = future
+            try:
+                self._connections[shard].send((request_id, op, args, kwargs or {}))
+            except Exception as e:
+                self._pending[shard].pop(request_id, None)
+                raise ShardError(f"Could not send {op} to shard {shard}: {e}") from e
+        return future
+
+    @staticmethod
+    def _gather(futures: list) -> list:
+        """Wait for every reply, then raise the first error if any request failed."""
+        results, error = [], None
+        for future in futures:
+            try:
+                ok, result = future.result()
+            except ShardError as e:
+                ok, result = False, e
+            if not ok and error is None:
+                error = result
+            results.append(result)
+        if error is not None:
+            raise error
+        return results
+
+    def _call(self, shards: list, op: str, *args, **kwargs) -> list:
+        """Send one request to each of `shards`, then collect the replies in the same order."""
+        return self._gather([self._submit(shard, op, args, kwargs) for shard in shards])
+
+    def _broadcast(self, op: str, *args, **kwargs) -> list:
+        return self._call(list(range(self.shards)), op, *args, **kwargs)
+
+    def _place(self, doc_id: str) -> int:
+        if doc_id not in self.placement:
+            self.placement[doc_id] = int(np.argmin(self.counts))
+        return self.placement[doc_id]
+
+    def upsert(self, vectors: list, namespace: str = "") -> dict:
+        """Insert or overwrite vectors, each on the shard of its document."""
+        by_shard = {}
+        for vector in vectors:
+            if isinstance(vector, dict):
+                vector_id, metadata = vector["id"], vector.get("metadata")
+            else:
+                vector_id, metadata = vector[0], (tuple(vector) + (None,))[2]
+            shard = self._place(document_of(vector_id, metadata))
+            # Counted as placed, so new documents in one batch spread out; overwrites are corrected by rebalance
+            self.counts[shard] += 1
+            by_shard.setdefault(shard, []).append(vector)
+        shards = sorted(by_shard)
+        self._gather([self._submit(shard, "upsert", kwargs={"vectors": by_shard[shard], "namespace": namespace})
+                      for shard in shards])
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector: list, top_k: int = 10, filter: dict = None, namespace: str = "",
+              include_metadata: bool = False, include_values: bool = False, **kwargs) -> QueryResponse:
+        """Ask every shard for its top_k and merge them into the global top_k."""
+        responses = self._broadcast("query", vector=np.asarray(vector, dtype=np.float32), top_k=top_k,
+                                    filter=filter, namespace=namespace, include_metadata=include_metadata,
+                                    include_values=include_values)
+        best = {}
+        for response in responses:
+            for match in response.matches:
+                # A document being moved can briefly sit on two shards
+                if match.id not in best or match.score > best[match.id].score:
+                    best[match.id] = match
+        matches = sorted(best.values(), key=lambda match: match.score, reverse=True)[:top_k]
+        return QueryResponse(matches, namespace)
+
+    def fetch(self, ids: list, namespace: str = "") -> FetchResponse:
+        vectors = {}
+        for response in self._broadcast("fetch", ids=ids, namespace=namespace):
+            vectors.update(response.vectors)
+        return FetchResponse(vectors, namespace)
+
+    def delete(self, ids: list = None, namespace: str = "", delete_all: bool = False, filter: dict = None) -> dict:
+        self._broadcast("delete", ids=ids, namespace=namespace, delete_all=delete_all, filter=filter)
+        return {}
+
+    def list(self, namespace: str = "", prefix: str = None, limit: int = 100):
+        ids = [vector_id for shard_ids in self._broadcast("list", namespace=namespace, prefix=prefix)
+               for vector_id in shard_ids]
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def describe_index_stats(self) -> IndexStats:
+        namespaces = {}
+        for stats in self._broadcast("describe_index_stats"):
+            for name, ns in stats.namespaces.items():
+                namespaces.setdefault(name, {"vector_count": 0})["vector_count"] += ns["vector_count"]
+        return IndexStats(self.dimension, namespaces)
+
+    def rebalance(self, tolerance: float = REBALANCE_TOLERANCE) -> list:
+        """Move whole documents from shards above the average to the lightest shard.
+
+        A document is copied before it is deleted from its old shard, so
+        queries never miss it while it moves.
+
+        Returns:
+            list: (document, from shard, to shard) for every move
+        """
+        sizes = {}  # document -> {namespace: count}
+        shard_of = {}
+        for shard, documents in enumerate(self._broadcast("documents")):
+            for (namespace, doc_id), count in documents.items():
+                sizes.setdefault(doc_id, {})[namespace] = count
+                shard_of[doc_id] = shard
+        self.placement.update(shard_of)
+        self.counts = [0] * self.shards
+        for doc_id, shard in shard_of.items():
+            self.counts[shard] += sum(sizes[doc_id].values())
+
+        moves = []
+        limit = sum(self.counts) / self.shards * (1 + tolerance)
+        while True:
+            source, target = int(np.argmax(self.counts)), int(np.argmin(self.counts))
+            if self.counts[source] <= limit:
+                break
+            gap = self.counts[source] - self.counts[target]
+            # The largest document whose move narrows the gap
+            movable = [doc_id for doc_id, shard in shard_of.items()
+                       if shard == source and sum(sizes[doc_id].values()) < gap]
+            if not movable:
+                break
+            doc_id = max(movable, key=lambda doc: sum(sizes[doc].values()))
+            for namespace in sizes[doc_id]:
+                vectors = self._call([source], "extract", namespace, doc_id)[0]
+                self._call([target], "upsert", vectors=vectors, namespace=namespace)
+                self._call([source], "delete", ids=[vector[0] for vector in vectors], namespace=namespace)
+            size = sum(sizes[doc_id].values())
+            self.counts[source] -= size
+            self.counts[target] += size
+            shard_of[doc_id] = self.placement[doc_id] = target
+            moves.append((doc_id, source, target))
+            logger.info(f"Moved {doc_id} ({size} vectors) from shard {source} to shard {target}")
+        return moves
+
+    def save(self, path: str = None) -> None:
+        """Save every shard and the document placement.
+
+        Raises:
+            ShardError: If a shard was restarted; saving would drop the writes it lost
+        """
+        if path is not None and path != self.path:
+            raise ValueError("A sharded index is saved in place")
+        if self._restarted:
+            raise ShardError(f"Shards {sorted(self._restarted)} were restarted and lost writes since their last "
+                             f"save; reopen the index (ingestion resumes from its journal)")
+        self._broadcast("save")
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, f"{SHARD_MANIFEST}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"shards": self.shards, "dimension": self.dimension, "placement": self.placement}, f)
+        os.replace(tmp_path, os.path.join(self.path, SHARD_MANIFEST))
+        logger.info(f"Saved {self.shards} shards to {self.path}")
+
+    def close(self) -> None:
+        self._closing = True
+        for shard, connection in enumerate(self._connections):
+            with self._send_locks[shard]:
+                try:
+                    connection.send((None, "close", (), {}))
+                except (OSError, ValueError):
+                    pass
+        for worker in self._workers:
+            worker.join(timeout=5)
+        for connection in self._connections:
+            connection.close()
+        self._workers, self._connections = [], []
+
+def benchmark(vectors: int, dimension: int, shard_counts: list, queries: int = 200, top_k: int = 10,
+              documents: int = 50) -> list:
+    """Query latency of one in-process LocalIndex versus sharded indexes of growing size.
+
+    Args:
+        vectors (int): Random vectors in the corpus
+        dimension (int): Vector dimension
+        shard_counts (list): Shard counts to try
+        queries (int): Queries per configuration
+        top_k (int): Results per query
+        documents (int): Documents the vectors are spread over
+
+    Returns:
+        list: One row per configuration with p50/p95 latency in ms
+    """
+    import tempfile
+    from generation_gateway import percentile
+
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((vectors, dimension), dtype=np.float32)
+    query_vectors = rng.standard_normal((queries, dimension), dtype=np.float32)
+    batches = [[(f"doc{i % documents}_chunk_{i}", corpus[i], {"doc_id": f"doc{i % documents}"})
+                for i in range(start, min(start + 5000, vectors))] for start in range(0, vectors, 5000)]
+
+    def measure(index) -> dict:
+        latencies = []
+        for query in query_vectors:
+            start = time.perf_counter()
+            index.query(vector=query, top_k=top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return {"p50_ms": round(percentile(latencies, 0.5), 2), "p95_ms": round(percentile(latencies, 0.95), 2)}
+
+    baseline = LocalIndex(dimension)
+    for batch in batches:
+        baseline.upsert(batch)
+    rows = [{"shards": "in-process", **measure(baseline)}]
+    del baseline
+
+    for shards in shard_counts:
+        with tempfile.TemporaryDirectory() as path:
+            index = ShardedIndex(dimension, path, shards)
+            for batch in batches:
+                index.upsert(batch)
+            rows.append({"shards": shards, **measure(index)})
+            index.close()
+    return rows
+
+def main():
+    """Benchmark query latency against the number of shards, or rebalance an index."""
+    from backends import EMBEDDING_DIMENSION, PINECONE_INDEX_NAME
+    from local_index import LOCAL_INDEX_DIR
+
+    parser = argparse.ArgumentParser(description="Sharded local index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report = subparsers.add_parser("benchmark", help="Query latency as the shard count grows")
+    report.add_argument("--vectors", type=int, default=200000)
+    report.add_argument("--dim", type=int, default=EMBEDDING_DIMENSION)
+    report.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    report.add_argument("--queries", type=int, default=200)
+    balance = subparsers.add_parser("rebalance", help="Even out a saved sharded index")
+    balance.add_argument("--index", default=PINECONE_INDEX_NAME)
+    balance.add_argument("--shards", type=int, help="Grow the index to this many shards first")
+    args = parser.parse_args()
+
+    if args.command == "rebalance":
+        path = os.path.join(LOCAL_INDEX_DIR, args.index)
+        with open(os.path.join(path, SHARD_MANIFEST), encoding="utf-8") as f:
+            saved = json.load(f)
+        index = ShardedIndex(saved["dimension"], path, args.shards or saved["shards"])
+        logger.info(f"Moves: {index.rebalance()}")
+        index.save()
+        index.close()
+        return
+
+    print(f"{'shards':>11}{'p50 ms':>9}{'p95 ms':>9}  ({args.vectors} x {args.dim}, {os.cpu_count()} CPUs)")
+    for row in benchmark(args.vectors, args.dim, args.shards, args.queries):
+        print(f"{row['shards']:>11}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+import logging
+from typing import List, Optional
+from dotenv import load_dotenv
+from ai_response import AgrivannaAI, ANALYSIS_FILTER, analysis_query, symptom_key
+from backends import EMBEDDING_MODEL, PINECONE_INDEX_NAME
+from index_versions import current_version, known_versions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WARM_CACHE_DIR = os.path.join(BASE_DIR, os.getenv('WARM_CACHE_DIR', 'warm_cache'))
+# Artefacts kept on disk besides the ones current for an index version
+WARM_CACHE_KEEP = int(os.getenv('WARM_CACHE_KEEP', '3'))
+
+# Presentations that make up most analysis traffic
+SYMPTOM_CATALOGUE = [
+    {"name": "clinical_mastitis", "symptoms": ["reduced milk production", "warm udder", "abnormal milk"]},
+    {"name": "mastitis_clots", "symptoms": ["clots in milk", "swollen udder"]},
+    {"name": "mastitis_fever", "symptoms": ["swollen udder", "fever", "loss of appetite"]},
+    {"name": "subclinical_mastitis", "symptoms": ["high somatic cell count", "reduced milk production"]},
+    {"name": "lameness", "symptoms": ["lameness", "swollen hoof"]},
+    {"name": "foot_rot", "symptoms": ["lameness", "foul smell from hoof", "swelling between claws"]},
+    {"name": "digital_dermatitis", "symptoms": ["lameness", "lesion above heel"]},
+    {"name": "fever_appetite", "symptoms": ["fever", "loss of appetite"]},
+    {"name": "respiratory", "symptoms": ["coughing", "nasal discharge", "fever"]},
+    {"name": "metritis", "symptoms": ["fever", "foul vaginal discharge", "recently calved"]},
+    {"name": "ketosis", "symptoms": ["loss of appetite", "reduced milk production", "weight loss"]},
+    {"name": "milk_fever", "symptoms": ["recently calved", "unable to stand", "cold ears"]},
+    {"name": "bloat", "symptoms": ["distended left flank", "discomfort"]},
+    {"name": "frothy_bloat", "symptoms": ["distended left flank", "grazing legume pasture", "labored breathing"]},
+    {"name": "scours", "symptoms": ["diarrhea", "dehydration"]},
+]
+
+def pointer_name(index_version: str) -> str:
+    """File naming the current artefact for an index version."""
+    return f"current-{index_version}.json"
+
+def catalogue_version(catalogue: List[dict], index_version: str) -> str:
+    """Fingerprint of everything a cached context depends on."""
+    fingerprint = json.dumps({
+        "embedding_model": EMBEDDING_MODEL,
+        "index_version": index_version,
+        "catalogue": [symptom_key(entry["symptoms"]) for entry in catalogue],
+    }, sort_keys=True)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:12]
+
+def write_json_atomic(path: str, data: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class WarmCache:
+    """Precomputed contexts (and optionally analyses) keyed by symptom set."""
+
+    def __init__(self, entries: dict, version: str = "", metadata: dict = None):
+        self.entries = entries
+        self.version = version
+        self.metadata = metadata or {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, symptoms: list) -> Optional[dict]:
+        """Return the cached entry for a symptom set, or None."""
+        entry = self.entries.get(symptom_key(symptoms))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "version": self.version,
+            "entries": len(self.entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+    @classmethod
+    def load(cls, cache_dir: str = WARM_CACHE_DIR, index_version: str = None,
+             embedding_model: str = EMBEDDING_MODEL) -> Optional["WarmCache"]:
+        """Load the current artefact for an index version, or None if there is none.
+
+        Args:
+            cache_dir (str): Directory written by `build_warm_cache`
+            index_version (str): Index version served (default: the one PINECONE_INDEX_NAME points at)
+            embedding_model (str): Model the artefact must have been built with
+
+        Returns:
+            WarmCache: The loaded cache, or None
+        """
+        index_version = index_version or current_version(PINECONE_INDEX_NAME)[0]
+        pointer_path = os.path.join(cache_dir, pointer_name(index_version))
+        if not os.path.exists(pointer_path):
+            logger.info(f"No warm cache artefact for {index_version}")
+            return None
+        try:
+            with open(pointer_path, encoding="utf-8") as f:
+                artefact = json.load(f)["artefact"]
+            with open(os.path.join(cache_dir, artefact), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read warm cache: {e}")
+            return None
+
+        metadata = data["metadata"]
+        if metadata["embedding_model"] != embedding_model or metadata["index_version"] != index_version:
+            logger.warning(f"Ignoring warm cache {data['version']}: built for another model or index version")
+            return None
+
+        logger.info(f"Loaded warm cache {data['version']} with {len(data['entries'])} entries")
+        return cls(data["entries"], data["version"], metadata)
+
+def build_warm_cache(ai: AgrivannaAI, catalogue: List[dict] = SYMPTOM_CATALOGUE, include_analysis: bool = False,
+                     cache_dir: str = WARM_CACHE_DIR, index_version: str = None) -> str:
+    """Precompute context for every catalogue entry and publish a new artefact.
+
+    Args:
+        ai (AgrivannaAI): Assistant whose knowledge base and router are used
+        catalogue (List[dict]): Entries with "name" and "symptoms"
+        include_analysis (bool): Also generate and store the full analysis
+        cache_dir (str): Directory for artefacts and the per-version pointers
+        index_version (str): Index version the knowledge base searches (default: the one it serves)
+
+    Returns:
+        str: Path of the written artefact
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index_version = index_version or ai.knowledge_base.version
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{catalogue_version(catalogue, index_version)}"
+    start = time.time()
+
+    entries = {}
+    for entry in catalogue:
+        symptoms = entry["symptoms"]
+        context, top_score = ai.retrieve_context(analysis_query(symptoms), filter=ANALYSIS_FILTER)
+        if top_score is None:
+            logger.warning(f"Skipping {entry['name']}: retrieval failed")
+            continue
+        cached = {"name": entry["name"], "symptoms": symptoms, "context": context, "top_score": top_score}
+        if include_analysis:
+            try:
+                cached["analysis"] = ai.generate_analysis(symptoms, context, top_score=top_score)
+            except Exception as e:
+                logger.warning(f"No analysis cached for {entry['name']}: {e}")
+        entries[symptom_key(symptoms)] = cached
+
+    artefact = f"warm_cache-{version}.json"
+    write_json_atomic(os.path.join(cache_dir, artefact), {
+        "version": version,
+        "metadata": {
+            "embedding_model": EMBEDDING_MODEL,
+            "index_version": index_version,
+            "include_analysis": include_analysis,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "entries": entries,
+    })
+    # Readers only ever see a complete artefact
+    write_json_atomic(os.path.join(cache_dir, pointer_name(index_version)),
+                      {"artefact": artefact, "version": version, "index_version": index_version})
+    collect_garbage(cache_dir, keep_versions=known_versions() | {index_version})
+
+    logger.info(f"✅ Warm cache {version} for {index_version}: {len(entries)}/{len(catalogue)} entries "
+                f"in {time.time() - start:.2f}s")
+    return os.path.join(cache_dir, artefact)
+
+def collect_garbage(cache_dir: str, keep_versions: set) -> None:
+    """Drop pointers of deleted index versions, and unreferenced artefacts beyond WARM_CACHE_KEEP."""
+    referenced = set()
+    for name in os.listdir(cache_dir):
+        if not (name.startswith("current-") and name.endswith(".json")):
+            continue
+        if name[len("current-"):-len(".json")] not in keep_versions:
+            os.remove(os.path.join(cache_dir, name))
+            continue
+        with open(os.path.join(cache_dir, name), encoding="utf-8") as f:
+            referenced.add(json.load(f)["artefact"])
+    old = sorted(name for name in os.listdir(cache_dir)
+                 if name.startswith("warm_cache-") and name.endswith(".json") and name not in referenced)
+    for name in old[:max(0, len(old) - WARM_CACHE_KEEP)]:
+        os.remove(os.path.join(cache_dir, name))
+
+def main():
+    """Rebuild the warm cache for the version the alias serves."""
+    parser = argparse.ArgumentParser(description="Precompute context for common symptom sets")
+    parser.add_argument("--catalogue", help="JSON file of {\"name\", \"symptoms\"} entries (default: built-in)")
+    parser.add_argument("--analyses", action="store_true", help="Also generate and cache full analyses")
+    args = parser.parse_args()
+
+    catalogue = SYMPTOM_CATALOGUE
+    if args.catalogue:
+        with open(args.catalogue, encoding="utf-8") as f:
+            catalogue = json.load(f)
+    build_warm_cache(AgrivannaAI("warm-cache"), catalogue, include_analysis=args.analyses)
+
+if __name__ == "__main__":
+    main()